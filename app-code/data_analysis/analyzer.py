@@ -1,5 +1,6 @@
 import sys
 import os
+import math
 import pandas as pd
 import numpy as np
 import json
@@ -17,12 +18,55 @@ from utils import get_logger, load_config
 logger = get_logger("data_analyzer")
 config = load_config()
 
+# Trading days per year, for the calendar span of a number of daily rows
+TRADING_DAYS_PER_YEAR = 252
+
 class Analyzer:
     """Analyzes financial data."""
     
     def __init__(self):
         self.logger = logger
         self.storage_service_url = f"http://{config['db']['host']}:{config['services']['data_storage']['port']}"
+        self.lake_path = config["storage"]["lake"]["path"]
+    
+    def read_lake(self, table, symbol, start=None, end=None, columns=None):
+        """
+        Read a symbol's rows from the Parquet data lake written by the
+        storage service's exporter.
+        
+        The symbol, start and end are pushed down as filters, so only the
+        symbol's files of the months in range are read. A row exported more
+        than once, because it was updated after an export or a run was
+        retried, is returned as its copy with the newest updated_at.
+        
+        Args:
+            table (str): "historical_data" or "realtime_data"
+            symbol (str): Stock symbol
+            start (datetime, optional): Earliest time to include
+            end (datetime, optional): Time before which to stop (exclusive)
+            columns (list, optional): Columns to read (default: all)
+        
+        Returns:
+            pandas.DataFrame: Rows sorted by time
+        """
+        import pyarrow.dataset as ds
+        
+        time_column = "date" if table == "historical_data" else "timestamp"
+        condition = ds.field("symbol") == symbol
+        if start is not None:
+            condition &= (ds.field("year") > start.year) | ((ds.field("year") == start.year) & (ds.field("month") >= start.month))
+            condition &= ds.field(time_column) >= start
+        if end is not None:
+            condition &= (ds.field("year") < end.year) | ((ds.field("year") == end.year) & (ds.field("month") <= end.month))
+            condition &= ds.field(time_column) < end
+        
+        read_columns = None if columns is None else list(dict.fromkeys([*columns, time_column, "updated_at"]))
+        dataset = ds.dataset(os.path.join(self.lake_path, table), format="parquet", partitioning="hive")
+        df = dataset.to_table(columns=read_columns, filter=condition).to_pandas()
+        df = df.sort_values([time_column, "updated_at"]).drop_duplicates(time_column, keep="last")
+        if columns is not None:
+            df = df[columns]
+        return df.drop(columns=["year", "month"], errors="ignore").reset_index(drop=True)
     
     def get_historical_data(self, symbol, limit=100):
         """
@@ -36,6 +80,17 @@ class Analyzer:
             pandas.DataFrame: Historical data
         """
         try:
+            if self.lake_path and os.path.isdir(os.path.join(self.lake_path, "historical_data")):
+                # Only the months that can hold the last limit trading days
+                # are read, with slack for holidays
+                start = datetime.now() - timedelta(days=math.ceil(limit * 365 / TRADING_DAYS_PER_YEAR) + 10)
+                df = self.read_lake("historical_data", symbol, start=start)
+                if len(df) < limit:
+                    # The symbol's recent history is shorter than asked for
+                    df = self.read_lake("historical_data", symbol)
+                if not df.empty:
+                    return df.tail(limit).reset_index(drop=True)
+                self.logger.warning(f"No historical data for {symbol} in the data lake, using the storage service")
             
             url = f"{self.storage_service_url}/api/v1/historical/{symbol}?limit={limit}"
             
@@ -123,20 +178,30 @@ class Analyzer:
         try:
             df = df.copy()
             
-            df["ma5"] = df["close"].rolling(window=5).mean()
-            df["ma20"] = df["close"].rolling(window=20).mean()
-            
-            df["daily_return"] = df["close"].pct_change()
-            
-            df["volatility"] = df["daily_return"].rolling(window=20).std()
-            
-            delta = df["close"].diff()
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
-            avg_gain = gain.rolling(window=14).mean()
-            avg_loss = loss.rolling(window=14).mean()
-            rs = avg_gain / avg_loss
-            df["rsi"] = 100 - (100 / (1 + rs))
+            # The storage service materializes these on write; only fill the
+            # ones that came without values
+            def missing(column):
+                return column not in df or df[column].isna().all()
+            
+            if missing("ma5"):
+                df["ma5"] = df["close"].rolling(window=5).mean()
+            if missing("ma20"):
+                df["ma20"] = df["close"].rolling(window=20).mean()
+            
+            if missing("daily_return"):
+                df["daily_return"] = df["close"].pct_change()
+            
+            if missing("volatility"):
+                df["volatility"] = df["daily_return"].rolling(window=20).std()
+            
+            if missing("rsi"):
+                delta = df["close"].diff()
+                gain = delta.where(delta > 0, 0)
+                loss = -delta.where(delta < 0, 0)
+                avg_gain = gain.rolling(window=14).mean()
+                avg_loss = loss.rolling(window=14).mean()
+                rs = avg_gain / avg_loss
+                df["rsi"] = 100 - (100 / (1 + rs))
             
             df["bb_middle"] = df["close"].rolling(window=20).mean()
             df["bb_upper"] = df["bb_middle"] + 2 * df["close"].rolling(window=20).std()
@@ -31,18 +31,22 @@ def get_historical_data():
         symbol (str): Stock symbol (e.g., 'AAPL', 'MSFT')
         period (str, optional): Period to fetch data for (default: '1mo')
         interval (str, optional): Data interval (default: '1d')
+        start (str, optional): First date to fetch; replaces period
+        end (str, optional): Date to stop before (exclusive)
         publish (bool, optional): Whether to publish data to RabbitMQ (default: False)
     """
     try:
         symbol = request.args.get("symbol")
         period = request.args.get("period", "1mo")
         interval = request.args.get("interval", "1d")
+        start = request.args.get("start")
+        end = request.args.get("end")
         publish = request.args.get("publish", "false").lower() == "true"
         
         if not symbol:
             return jsonify({"error": "Symbol is required"}), 400
         
-        data = fetcher.fetch_historical_data(symbol, period, interval)
+        data = fetcher.fetch_historical_data(symbol, period, interval, start, end)
         
         if publish:
             publisher.publish_historical_data(symbol, data)
@@ -102,10 +106,11 @@ def batch_fetch():
         interval = data.get("interval", "1d")
         publish = data.get("publish", False)
         
-        result = fetcher.fetch_multiple_symbols(symbols, period, interval)
-        
-        if publish:
-            for symbol, symbol_data in result.items():
+        # Symbols are published as their fetches complete
+        result = {symbol: [] for symbol in symbols}
+        for symbol, symbol_data in fetcher.iter_multiple_symbols(symbols, period, interval):
+            result[symbol] = symbol_data
+            if publish:
                 publisher.publish_historical_data(symbol, symbol_data)
         
         return jsonify(result)
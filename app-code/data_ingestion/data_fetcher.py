@@ -1,25 +1,135 @@
 import sys
 import os
 import time
+import random
+import threading
 import requests
 import yfinance as yf
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import get_logger, load_config
 
+from rate_limiter import TokenBucket
+
 logger = get_logger("data_fetcher")
 config = load_config()
 
+class TimeoutSession(requests.Session):
+    """HTTP session that applies a timeout to every request."""
+    
+    def __init__(self, timeout_s):
+        super().__init__()
+        self.timeout_s = timeout_s
+    
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout_s)
+        response = super().request(method, url, **kwargs)
+        # yfinance reads error responses as missing data; raising makes
+        # throttled and failed requests retryable
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        return response
+
 class YahooFinanceFetcher:
     """Fetches financial data from Yahoo Finance API."""
     
-    def __init__(self):
+    def __init__(self, base_url=None, requests_per_s=None, concurrency=None, timeout_s=None, retries=None, backoff_s=None):
+        """
+        Initialize the fetcher.
+        
+        Settings not given come from the yahoo_finance configuration.
+        
+        Args:
+            base_url (str, optional): Yahoo Finance API host
+            requests_per_s (float, optional): Most requests per second, shared by all threads
+            concurrency (int, optional): Symbols fetched at once by fetch_multiple_symbols
+            timeout_s (float, optional): Timeout of each request
+            retries (int, optional): Retries of a failed fetch
+            backoff_s (float, optional): Base delay of the jittered exponential backoff
+        """
+        settings = config["yahoo_finance"]
+        
         self.logger = logger
+        self.base_url = base_url or settings["base_url"]
+        self.concurrency = concurrency or settings["concurrency"]
+        self.timeout_s = timeout_s or settings["timeout_s"]
+        self.retries = settings["retries"] if retries is None else retries
+        self.backoff_s = settings["backoff_s"] if backoff_s is None else backoff_s
+        self.rate_limiter = TokenBucket(requests_per_s or settings["requests_per_s"])
+        
+        self._sessions = threading.local()
+    
+    def _ticker(self, symbol):
+        """
+        Get a yfinance ticker that goes through this thread's session.
+        
+        Sessions are kept per thread because requests sessions are not
+        thread-safe.
+        """
+        session = getattr(self._sessions, "session", None)
+        if session is None:
+            session = self._sessions.session = TimeoutSession(self.timeout_s)
+        
+        ticker = yf.Ticker(symbol, session=session)
+        # yfinance has no setting for the API host
+        ticker._base_url = self.base_url
+        return ticker
+    
+    def _fetch_history(self, symbol, period, interval, start, end):
+        """
+        Fetch historical data for a symbol with one rate-limited request.
         
-    def fetch_historical_data(self, symbol, period="1mo", interval="1d"):
+        Raises:
+            requests.RequestException: If the request fails or times out
+        """
+        self.rate_limiter.acquire()
+        
+        ticker = self._ticker(symbol)
+        if start:
+            data = ticker.history(start=start, end=end, interval=interval)
+        else:
+            data = ticker.history(period=period, interval=interval)
+        
+        data = data.reset_index()
+        
+        result = []
+        for _, row in data.iterrows():
+            result.append({
+                "symbol": symbol,
+                "date": row["Date"].isoformat(),
+                "open": float(row["Open"]),
+                "high": float(row["High"]),
+                "low": float(row["Low"]),
+                "close": float(row["Close"]),
+                "volume": int(row["Volume"]),
+            })
+        return result
+    
+    def _fetch_with_retries(self, symbol, period, interval, start, end):
+        """
+        Fetch historical data for a symbol, retrying failed requests.
+        
+        Retries wait a random time of up to backoff_s * 2^attempt (full
+        jitter), so symbols throttled together do not retry together.
+        
+        Raises:
+            requests.RequestException: If the last attempt fails
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return self._fetch_history(symbol, period, interval, start, end)
+            except (requests.RequestException, RuntimeError, ValueError) as e:
+                if attempt == self.retries:
+                    raise
+                delay = random.uniform(0, self.backoff_s * 2 ** attempt)
+                self.logger.warning(f"Error fetching historical data for {symbol}, retrying in {delay:.2f}s: {e}")
+                time.sleep(delay)
+    
+    def fetch_historical_data(self, symbol, period="1mo", interval="1d", start=None, end=None):
         """
         Fetch historical data for a given symbol.
         
@@ -27,28 +137,19 @@ class YahooFinanceFetcher:
             symbol (str): Stock symbol (e.g., 'AAPL', 'MSFT')
             period (str): Period to fetch data for (e.g., '1d', '1mo', '1y')
             interval (str): Data interval (e.g., '1m', '1h', '1d')
+            start (str, optional): First date to fetch (e.g., '2023-01-03'); replaces period
+            end (str, optional): Date to stop before (exclusive)
             
         Returns:
             pandas.DataFrame: Historical data
         """
         try:
-            self.logger.info(f"Fetching historical data for {symbol} with period={period}, interval={interval}")
-            ticker = yf.Ticker(symbol)
-            data = ticker.history(period=period, interval=interval)
-            
-            data = data.reset_index()
+            if start:
+                self.logger.info(f"Fetching historical data for {symbol} from {start} to {end}, interval={interval}")
+            else:
+                self.logger.info(f"Fetching historical data for {symbol} with period={period}, interval={interval}")
             
-            result = []
-            for _, row in data.iterrows():
-                result.append({
-                    "symbol": symbol,
-                    "date": row["Date"].isoformat(),
-                    "open": float(row["Open"]),
-                    "high": float(row["High"]),
-                    "low": float(row["Low"]),
-                    "close": float(row["Close"]),
-                    "volume": int(row["Volume"]),
-                })
+            result = self._fetch_with_retries(symbol, period, interval, start, end)
             
             self.logger.info(f"Successfully fetched {len(result)} records for {symbol}")
             return result
@@ -68,7 +169,8 @@ class YahooFinanceFetcher:
         """
         try:
             self.logger.info(f"Fetching real-time data for {symbol}")
-            ticker = yf.Ticker(symbol)
+            self.rate_limiter.acquire()
+            ticker = self._ticker(symbol)
             data = ticker.info
             
             result = {
@@ -89,6 +191,34 @@ class YahooFinanceFetcher:
             self.logger.error(f"Error fetching real-time data for {symbol}: {e}")
             return {}
     
+    def iter_multiple_symbols(self, symbols, period="1mo", interval="1d"):
+        """
+        Fetch historical data for multiple symbols concurrently.
+        
+        Up to concurrency symbols are fetched at once by a thread pool,
+        with all requests going through the shared rate limiter.
+        
+        Args:
+            symbols (list): List of stock symbols
+            period (str): Period to fetch data for
+            interval (str): Data interval
+            
+        Yields:
+            tuple: Symbol and its historical data (empty if the fetch
+                failed), in order of completion
+        """
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="yahoo_fetch")
+        try:
+            futures = {
+                executor.submit(self.fetch_historical_data, symbol, period, interval): symbol
+                for symbol in dict.fromkeys(symbols)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # Symbols not started yet are dropped if the caller stops early
+            executor.shutdown(wait=True, cancel_futures=True)
+    
     def fetch_multiple_symbols(self, symbols, period="1mo", interval="1d"):
         """
         Fetch historical data for multiple symbols.
@@ -99,13 +229,14 @@ class YahooFinanceFetcher:
             interval (str): Data interval
             
         Returns:
-            dict: Historical data for each symbol
+            dict: Historical data for each symbol, empty for symbols whose fetch failed
         """
-        result = {}
-        for symbol in symbols:
-            result[symbol] = self.fetch_historical_data(symbol, period, interval)
-            
-            time.sleep(0.5)
+        start = time.monotonic()
+        result = {symbol: [] for symbol in symbols}
+        for symbol, data in self.iter_multiple_symbols(symbols, period, interval):
+            result[symbol] = data
+        
+        self.logger.info(f"Fetched historical data for {len(result)} symbols in {time.monotonic() - start:.1f}s")
         return result
 
 # Example usage
@@ -0,0 +1,83 @@
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger
+
+
+logger = get_logger("rate_limiter")
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the rate of requests."""
+    
+    def __init__(self, rate, capacity=None):
+        """
+        Initialize the bucket, full.
+        
+        Args:
+            rate (float): Tokens added per second
+            capacity (float, optional): Most tokens held, i.e. the largest
+                burst (default: one second's worth, at least 1)
+        """
+        if rate <= 0:
+            raise ValueError(f"Invalid rate: {rate}")
+        
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        
+        self.waits = 0
+        self.waited_s = 0.0
+    
+    def _refill(self, now):
+        """Add the tokens accrued since the last refill."""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def acquire(self, tokens=1):
+        """
+        Take tokens, waiting until they are available.
+        
+        Waiting threads each reserve their tokens up front, so they are
+        served in order of arrival at the configured rate.
+        
+        Args:
+            tokens (float, optional): Tokens to take
+        
+        Returns:
+            float: Seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if wait:
+                self.waits += 1
+                self.waited_s += wait
+        
+        if wait:
+            time.sleep(wait)
+        return wait
+    
+    def get_stats(self):
+        """
+        Get limiter statistics.
+        
+        Returns:
+            dict: Rate, capacity, tokens available and waits
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "tokens": self._tokens,
+                "waits": self.waits,
+                "waited_s": self.waited_s
+            }
@@ -1,11 +1,16 @@
 import sys
 import os
 import time
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import get_logger
 
 from data_fetcher import YahooFinanceFetcher
+from rate_limiter import TokenBucket
 from message_publisher import MessagePublisher
 
 logger = get_logger("data_ingestion_test")
@@ -42,6 +47,176 @@ def test_data_fetcher():
     
     logger.info("Data fetcher tests completed")
 
+class FakeYahooHandler(BaseHTTPRequestHandler):
+    """
+    Serves the Yahoo Finance chart API for tests.
+    
+    THROTTLED_* symbols are throttled (429) on their first two requests,
+    SLOW_* symbols respond after the client timeout and DOWN_* symbols fail
+    with 500; any other symbol gets five daily bars.
+    """
+    
+    def do_GET(self):
+        server = self.server
+        symbol = self.path.split("?")[0].rsplit("/", 1)[-1]
+        
+        # Slow requests keep running here after the client gave up on them,
+        # so they do not count as in flight
+        active = 0 if symbol.startswith("SLOW_") else 1
+        with server.lock:
+            server.requests.append((time.monotonic(), symbol))
+            server.active += active
+            server.max_active = max(server.max_active, server.active)
+            attempts = sum(1 for _, requested in server.requests if requested == symbol)
+        
+        try:
+            time.sleep(0.05)
+            if symbol.startswith("SLOW_"):
+                time.sleep(1)
+            
+            if symbol.startswith("DOWN_") or (symbol.startswith("THROTTLED_") and attempts <= 2):
+                self.send_response(500 if symbol.startswith("DOWN_") else 429)
+                self.end_headers()
+                return
+            
+            start = int(datetime(2023, 1, 2, 14, 30).timestamp())
+            closes = [100.0 + day for day in range(5)]
+            body = json.dumps({"chart": {"error": None, "result": [{
+                "meta": {"exchangeTimezoneName": "America/New_York", "priceHint": 2},
+                "timestamp": [start + day * 86400 for day in range(5)],
+                "indicators": {
+                    "quote": [{"open": closes, "high": closes, "low": closes, "close": closes, "volume": [1000] * 5}],
+                    "adjclose": [{"adjclose": closes}]
+                }
+            }]}}).encode()
+            
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with server.lock:
+                server.active -= active
+    
+    def log_message(self, format, *args):
+        pass
+
+def test_concurrent_fetch():
+    """Test concurrent, rate-limited fetching against a fake Yahoo Finance backend."""
+    logger.info("Testing concurrent fetch_multiple_symbols...")
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeYahooHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.active = 0
+    server.max_active = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    try:
+        fetcher = YahooFinanceFetcher(
+            base_url=f"http://127.0.0.1:{server.server_port}",
+            requests_per_s=10,
+            concurrency=4,
+            timeout_s=0.5,
+            retries=2,
+            backoff_s=0.05
+        )
+        symbols = [f"OK_{i}" for i in range(12)] + ["THROTTLED_A", "SLOW_A", "DOWN_A"]
+        
+        completed = []
+        for symbol, data in fetcher.iter_multiple_symbols(symbols, period="5d"):
+            completed.append(symbol)
+        if sorted(completed) != sorted(symbols):
+            logger.error(f"Every symbol should complete once: {completed}")
+            return False
+        
+        with server.lock:
+            server.requests.clear()
+            server.max_active = 0
+        
+        started = time.monotonic()
+        result = fetcher.fetch_multiple_symbols(symbols, period="5d")
+        elapsed = time.monotonic() - started
+        
+        if list(result) != symbols:
+            logger.error(f"Results should be keyed by the requested symbols: {list(result)}")
+            return False
+        
+        closes = [item["close"] for item in result["OK_0"]]
+        if closes != [100.0, 101.0, 102.0, 103.0, 104.0] or result["OK_0"][0]["date"][:10] != "2023-01-02":
+            logger.error(f"Unexpected fetched data: {result['OK_0']}")
+            return False
+        
+        if len(result["THROTTLED_A"]) != 5:
+            logger.error("Throttled requests should be retried")
+            return False
+        
+        if result["SLOW_A"] or result["DOWN_A"]:
+            logger.error("Timed out and failed symbols should have no data")
+            return False
+        
+        with server.lock:
+            requests = sorted(requested for requested, _ in server.requests)
+            max_active = server.max_active
+        
+        # 12 + 3 + 3 + 3 requests, at most 4 at once
+        if len(requests) != 21 or max_active > 4:
+            logger.error(f"Unexpected requests: {len(requests)} made, {max_active} at once")
+            return False
+        
+        # No more requests in any period than the burst of 10 plus 10/s
+        for first in range(len(requests)):
+            for last in range(first + 10, len(requests)):
+                if last - first + 1 > 10 + 10 * (requests[last] - requests[first]) + 1:
+                    logger.error(f"Requests exceeded the rate limit: {last - first + 1} in {requests[last] - requests[first]:.2f}s")
+                    return False
+        
+        # Fetched serially with the old 0.5s pause this took over 7 seconds
+        if elapsed > 5:
+            logger.error(f"Fetching {len(symbols)} symbols took {elapsed:.1f}s")
+            return False
+        
+        logger.info(f"Fetched {len(symbols)} symbols in {elapsed:.2f}s, rate limiter: {fetcher.rate_limiter.get_stats()}")
+    finally:
+        server.shutdown()
+        server.server_close()
+    
+    logger.info("Concurrent fetch tests completed successfully")
+    return True
+
+def test_rate_limiter():
+    """Test the token bucket rate limiter."""
+    logger.info("Testing TokenBucket...")
+    
+    bucket = TokenBucket(rate=50, capacity=5)
+    
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    if time.monotonic() - started > 0.05:
+        logger.error("A full bucket should serve a burst of its capacity without waiting")
+        return False
+    
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(10)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    
+    # 10 tokens at 50/s after the burst
+    if not 0.15 <= elapsed <= 0.5 or bucket.get_stats()["waits"] != 10:
+        logger.error(f"Unexpected rate limiting: 10 tokens in {elapsed:.2f}s, {bucket.get_stats()}")
+        return False
+    
+    logger.info("TokenBucket tests completed successfully")
+    return True
+
 def test_message_publisher():
     """Test the message publisher functionality."""
     logger.info("Testing message publisher...")
@@ -79,6 +254,12 @@ def run_tests():
     
     test_data_fetcher()
     
+    if not test_rate_limiter():
+        logger.error("Rate limiter tests failed")
+    
+    if not test_concurrent_fetch():
+        logger.error("Concurrent fetch tests failed")
+    
     test_message_publisher()
     
     logger.info("All tests completed")
@@ -1,19 +1,77 @@
 import sys
 import os
+import io
 import json
-from flask import Flask, request, jsonify
+import hashlib
+from datetime import date, datetime
+from flask import Flask, Response, request, jsonify
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import get_logger, load_config
 
-from repository import Repository
+from repository import HISTORICAL_FIELDS, Repository, decode_cursor
+from response_cache import ResponseCache
 
 app = Flask(__name__)
 
 logger = get_logger("data_storage_api")
 config = load_config()
 
-repository = Repository()
+# Largest number of symbols accepted by one multi-symbol historical request
+MAX_HISTORY_SYMBOLS = 1000
+
+# Largest number of lookups accepted by one batch as-of request
+MAX_ASOF_QUERIES = 10000
+
+repository = Repository(partition_maintenance=True)
+
+cache_settings = config["storage"]["response_cache"]
+response_cache = ResponseCache(cache_settings["max_entries"], cache_settings["ttl_s"]) if cache_settings["enabled"] else None
+
+def cached_response(kind, symbol, build):
+    """
+    Serve a read response from the response cache with an ETag header for
+    conditional requests.
+    
+    Cache keys include the symbol's data version, so a write through this
+    process makes earlier entries unreachable; writes by other processes
+    show up once entries expire. The ETag is a hash of the body, so it
+    changes exactly when the data served does. No Last-Modified is sent:
+    this process does not see the writes of other workers and jobs, so a
+    time it gave could stay older than the data indefinitely.
+    
+    Args:
+        kind (str): Data the response depends on, "historical" or "realtime"
+        symbol (str): Stock symbol
+        build (callable): Builds the response on a cache miss
+    
+    Returns:
+        Response: Cached or built response, or an empty 304 response
+    """
+    version, _ = repository.get_data_version(kind, symbol)
+    key = (request.path, tuple(sorted(request.args.items(multi=True))), version)
+    
+    entry = response_cache.get(key) if response_cache else None
+    if entry is None:
+        response = app.make_response(build())
+        if response.status_code != 200 or response.is_streamed:
+            return response
+        
+        body = response.get_data()
+        entry = {
+            "body": body,
+            "mimetype": response.mimetype,
+            "etag": hashlib.sha1(body).hexdigest()
+        }
+        if response_cache:
+            response_cache.put(key, entry)
+    
+    not_modified = request.if_none_match.contains(entry["etag"])
+    
+    response = Response(status=304) if not_modified else Response(entry["body"], mimetype=entry["mimetype"])
+    response.set_etag(entry["etag"])
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 @app.route("/health", methods=["GET"])
 def health_check():
@@ -43,8 +101,13 @@ def store_historical_data():
                     "rsi": 65.0
                 },
                 ...
-            ]
+            ],
+            "bulk": false
         }
+    
+    With "bulk": true the records are written with set-based
+    INSERT ... ON CONFLICT upserts and the response includes
+    inserted/updated counts per batch.
     """
     try:
         data = request.json
@@ -55,6 +118,14 @@ def store_historical_data():
         symbol = data.get("symbol")
         historical_data = data.get("data", [])
         
+        if data.get("bulk"):
+            result = repository.bulk_upsert_historical_data(symbol, historical_data)
+            
+            if result is not None:
+                return jsonify({"status": "success", **result})
+            else:
+                return jsonify({"error": "Failed to store historical data"}), 500
+        
         success = repository.store_historical_data(symbol, historical_data)
         
         if success:
@@ -108,6 +179,200 @@ def store_realtime_data():
         logger.error(f"Error storing real-time data: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/v1/realtime/batch", methods=["POST"])
+def store_realtime_batch():
+    """
+    Store a batch of real-time data for many symbols in one transaction.
+    
+    Request body:
+        {
+            "data": [
+                {
+                    "symbol": "AAPL",
+                    "timestamp": "2023-01-01T12:34:56",
+                    "price": 153.0,
+                    "change": 3.0,
+                    "volume": 1000000,
+                    ...
+                },
+                ...
+            ]
+        }
+    
+    Invalid items are listed in "rejected" with their index and do not
+    prevent the rest of the batch from being stored.
+    """
+    try:
+        data = request.json
+        
+        if not data or not isinstance(data.get("data"), list):
+            return jsonify({"error": "Data list is required"}), 400
+        
+        result = repository.store_realtime_batch(data["data"])
+        
+        if result is not None:
+            return jsonify({"status": "success", **result})
+        else:
+            return jsonify({"error": "Failed to store real-time batch"}), 500
+    except Exception as e:
+        logger.error(f"Error storing real-time batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def parse_time_range_args():
+    """
+    Parse the start, end and order query parameters of historical reads.
+    
+    Returns:
+        dict: start, end and order
+    
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    args = {}
+    
+    for name in ("start", "end"):
+        value = request.args.get(name)
+        try:
+            args[name] = datetime.fromisoformat(value) if value else None
+        except ValueError:
+            raise ValueError(f"Invalid {name}: {value}")
+    
+    args["order"] = request.args.get("order", "desc").lower()
+    if args["order"] not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+    
+    return args
+
+def parse_fields_arg():
+    """
+    Parse the fields query parameter of historical reads.
+    
+    Returns:
+        list: Requested fields besides symbol and date, or None for all
+    
+    Raises:
+        ValueError: If a field is unknown
+    """
+    value = request.args.get("fields")
+    if not value:
+        return None
+    
+    # symbol and date are always returned
+    fields = [name.strip() for name in value.split(",") if name.strip() not in ("", "symbol", "date")]
+    unknown = [name for name in fields if name not in HISTORICAL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    return list(dict.fromkeys(fields))
+
+def parse_history_args(fields=True):
+    """
+    Parse the time range, pagination and field query parameters of historical reads.
+    
+    Args:
+        fields (bool, optional): Parse the fields parameter; without it the
+            arguments also fit Repository.get_bars_page
+    
+    Returns:
+        dict: Keyword arguments for Repository.get_historical_page
+    
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    args = {"limit": request.args.get("limit", 100, type=int)}
+    
+    if args["limit"] < 1:
+        raise ValueError("limit must be positive")
+    
+    args.update(parse_time_range_args())
+    
+    cursor = request.args.get("after")
+    args["after"] = decode_cursor(cursor) if cursor else None
+    
+    if fields:
+        args["fields"] = parse_fields_arg()
+    
+    return args
+
+def historical_table_response(symbol, args, output_format):
+    """
+    Build an Arrow IPC stream or Parquet response of historical data.
+    
+    Args:
+        symbol (str): Stock symbol
+        args (dict): Keyword arguments for Repository.get_historical_table
+        output_format (str): "arrow" or "parquet"
+    
+    Returns:
+        Response: Columnar historical data
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return jsonify({"error": "pyarrow is required for columnar formats"}), 501
+    
+    table = repository.get_historical_table(symbol, **args)
+    
+    if table is None:
+        return jsonify({"error": "Failed to get historical data"}), 500
+    
+    buffer = io.BytesIO()
+    if output_format == "arrow":
+        with pa.ipc.new_stream(buffer, table.schema) as writer:
+            writer.write_table(table)
+        mimetype = "application/vnd.apache.arrow.stream"
+    else:
+        pq.write_table(table, buffer)
+        mimetype = "application/vnd.apache.parquet"
+    
+    return Response(buffer.getvalue(), mimetype=mimetype)
+
+@app.route("/api/v1/historical", methods=["GET"])
+def get_historical_data_multi():
+    """
+    Get historical data for many symbols in one request.
+    
+    Query parameters:
+        symbols (str): Comma-separated symbols
+        limit (int, optional): Maximum number of records per symbol (default: all)
+        start (str, optional): ISO date of the first record to include
+        end (str, optional): ISO date before which to stop (exclusive)
+        order (str, optional): "desc" (newest first, default) or "asc"
+        fields (str, optional): Comma-separated fields to return besides
+            symbol and date (default: all)
+    
+    The records are grouped by symbol in "data"; unknown symbols map to an
+    empty list.
+    """
+    try:
+        symbols = [symbol.strip() for symbol in request.args.get("symbols", "").split(",") if symbol.strip()]
+        
+        if not symbols:
+            return jsonify({"error": "symbols is required"}), 400
+        if len(symbols) > MAX_HISTORY_SYMBOLS:
+            return jsonify({"error": f"At most {MAX_HISTORY_SYMBOLS} symbols are allowed"}), 400
+        
+        try:
+            args = parse_time_range_args()
+            args["fields"] = parse_fields_arg()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        args["limit"] = request.args.get("limit", type=int)
+        if args["limit"] is not None and args["limit"] < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+        
+        data = repository.get_historical_data_multi(symbols, **args)
+        
+        if data is None:
+            return jsonify({"error": "Failed to get historical data"}), 500
+        
+        return jsonify({"data": data})
+    except Exception as e:
+        logger.error(f"Error getting historical data: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/v1/historical/<symbol>", methods=["GET"])
 def get_historical_data(symbol):
     """
@@ -115,43 +380,362 @@ def get_historical_data(symbol):
     
     Query parameters:
         limit (int, optional): Maximum number of records to return (default: 100)
+        start (str, optional): ISO date of the first record to include
+        end (str, optional): ISO date before which to stop (exclusive)
+        after (str, optional): Cursor returned as next_cursor by the previous page
+        order (str, optional): "desc" (newest first, default) or "asc"
+        fields (str, optional): Comma-separated fields to return besides
+            symbol and date, e.g. "close,volume" (default: all)
+    
+        format (str, optional): "json" (default), "arrow" (Arrow IPC stream) or "parquet"
+        indicators (str, optional): "stored" (default) returns the indicator
+            columns as stored; "computed" computes them in the database from
+            the stored closes (JSON pages only)
+    
+    JSON pages are served from the response cache and support conditional
+    requests with If-None-Match and If-Modified-Since.
+    
+    With "Accept: application/x-ndjson" the records are streamed as one JSON
+    object per line straight from a server-side cursor. In that mode and for
+    the columnar formats limit defaults to no limit.
     """
     try:
-        limit = request.args.get("limit", 100, type=int)
+        try:
+            args = parse_history_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        data = repository.get_historical_data(symbol, limit)
+        indicators = request.args.get("indicators", "stored").lower()
+        if indicators not in ("stored", "computed"):
+            return jsonify({"error": "indicators must be 'stored' or 'computed'"}), 400
         
-        return jsonify({
-            "symbol": symbol,
-            "data": data
-        })
+        output_format = request.args.get("format", "json").lower()
+        if indicators == "computed" and (
+            output_format != "json"
+            or request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson"
+        ):
+            return jsonify({"error": "Computed indicators are only available as JSON pages"}), 400
+        if output_format in ("arrow", "parquet"):
+            args["limit"] = request.args.get("limit", type=int)
+            return historical_table_response(symbol, args, output_format)
+        elif output_format != "json":
+            return jsonify({"error": f"Unsupported format: {output_format}"}), 400
+        
+        if request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"]) == "application/x-ndjson":
+            args["limit"] = request.args.get("limit", type=int)
+            
+            def generate():
+                for item in repository.iter_historical_data(symbol, **args):
+                    yield json.dumps(item) + "\n"
+            
+            return Response(generate(), mimetype="application/x-ndjson")
+        
+        def build():
+            if indicators == "computed":
+                page = repository.get_indicator_page(symbol, **args)
+            else:
+                page = repository.get_historical_page(symbol, **args)
+            
+            if page is None:
+                return jsonify({"error": "Failed to get historical data"}), 500
+            
+            return jsonify({
+                "symbol": symbol,
+                "data": page["data"],
+                "next_cursor": page["next_cursor"]
+            })
+        
+        return cached_response("historical", symbol, build)
     except Exception as e:
         logger.error(f"Error getting historical data: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/v1/coverage/<symbol>", methods=["GET"])
+def get_coverage(symbol):
+    """
+    Get the stored date range, missing trading days and backfill plan of a symbol.
+    
+    Query parameters:
+        start (str, optional): ISO date of the first day that should be stored
+        end (str, optional): ISO date of the last day that should be stored
+            (default: the last trading day before today)
+        merge_gap_days (int, optional): Gaps separated by at most this many
+            stored trading days are fetched together (default: 5)
+    
+    "fetch_plan" lists the start/end ranges (end exclusive) to fetch to
+    fill every gap.
+    """
+    try:
+        args = {"merge_gap_days": request.args.get("merge_gap_days", 5, type=int)}
+        
+        for name in ("start", "end"):
+            value = request.args.get(name)
+            try:
+                args[name] = date.fromisoformat(value) if value else None
+            except ValueError:
+                return jsonify({"error": f"Invalid {name}: {value}"}), 400
+        
+        data = repository.get_coverage(symbol, **args)
+        
+        if data is None:
+            return jsonify({"error": "Failed to get coverage"}), 500
+        if not data:
+            return jsonify({"error": f"No historical data found for {symbol}"}), 404
+        
+        return jsonify(data)
+    except Exception as e:
+        logger.error(f"Error getting coverage: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/v1/bars/<symbol>", methods=["GET"])
+def get_bars(symbol):
+    """
+    Get OHLCV bars rolled up from real-time data for a symbol.
+    
+    Query parameters:
+        interval (str, optional): Bar interval, one of storage.bars.intervals (default: 1m)
+        limit (int, optional): Maximum number of bars to return (default: 500)
+        start (str, optional): ISO timestamp of the first bucket to include
+        end (str, optional): ISO timestamp before which to stop (exclusive)
+        after (str, optional): Cursor returned as next_cursor by the previous page
+        order (str, optional): "desc" (newest first, default) or "asc"
+    """
+    try:
+        try:
+            args = parse_history_args(fields=False)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if "fields" in request.args:
+            return jsonify({"error": "fields is not supported for bars"}), 400
+        
+        args["limit"] = request.args.get("limit", 500, type=int)
+        if args["limit"] < 1:
+            return jsonify({"error": "limit must be positive"}), 400
+        
+        interval = request.args.get("interval", "1m")
+        if interval not in repository.bars.get("intervals", []):
+            return jsonify({"error": f"Unsupported interval: {interval}"}), 400
+        
+        def build():
+            page = repository.get_bars_page(symbol, interval, **args)
+            
+            if page is None:
+                return jsonify({"error": "Failed to get bars"}), 500
+            
+            return jsonify({
+                "symbol": symbol,
+                "interval": interval,
+                "data": page["data"],
+                "next_cursor": page["next_cursor"]
+            })
+        
+        return cached_response("realtime", symbol, build)
+    except Exception as e:
+        logger.error(f"Error getting bars: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/v1/realtime", methods=["GET"])
+def get_latest_quotes():
+    """
+    Get the latest real-time data for many symbols.
+    
+    Query parameters:
+        symbols (str, optional): Comma-separated symbols (default: all symbols)
+    """
+    try:
+        symbols = request.args.get("symbols")
+        if symbols is not None:
+            symbols = [symbol.strip() for symbol in symbols.split(",") if symbol.strip()]
+        
+        data = repository.get_latest_quotes(symbols)
+        
+        if data is None:
+            return jsonify({"error": "Failed to get latest quotes"}), 500
+        
+        return jsonify({"data": data})
+    except Exception as e:
+        logger.error(f"Error getting latest quotes: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route("/api/v1/realtime/<symbol>", methods=["GET"])
 def get_realtime_data(symbol):
     """Get real-time data for a symbol."""
     try:
-        data = repository.get_realtime_data(symbol)
+        def build():
+            data = repository.get_realtime_data(symbol)
+            
+            if data:
+                return jsonify(data)
+            else:
+                return jsonify({"error": f"No real-time data found for {symbol}"}), 404
+        
+        return cached_response("realtime", symbol, build)
+    except Exception as e:
+        logger.error(f"Error getting real-time data: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/v1/realtime/<symbol>/ticks", methods=["GET"])
+def get_ticks(symbol):
+    """
+    Stream the real-time data of a symbol in time order as NDJSON, archived
+    days included.
+    
+    Query parameters:
+        start (str, optional): ISO time of the first tick to include
+        end (str, optional): ISO time before which to stop (exclusive)
+    """
+    try:
+        args = {}
+        for name in ("start", "end"):
+            value = request.args.get(name)
+            try:
+                args[name] = datetime.fromisoformat(value) if value else None
+            except ValueError:
+                return jsonify({"error": f"Invalid {name}: {value}"}), 400
+        
+        def generate():
+            for tick in repository.iter_ticks(symbol, **args):
+                yield json.dumps(tick) + "\n"
+        
+        return Response(generate(), mimetype="application/x-ndjson")
+    except Exception as e:
+        logger.error(f"Error getting ticks: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/v1/realtime/<symbol>/asof", methods=["GET"])
+def get_quote_asof(symbol):
+    """
+    Get the last real-time data for a symbol at or before a point in time.
+    
+    Query parameters:
+        ts (str): ISO timestamp
+    """
+    try:
+        value = request.args.get("ts")
+        try:
+            timestamp = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return jsonify({"error": f"Invalid ts: {value}"}), 400
+        
+        data = repository.get_quote_asof(symbol, timestamp)
         
         if data:
             return jsonify(data)
         else:
-            return jsonify({"error": f"No real-time data found for {symbol}"}), 404
+            return jsonify({"error": f"No real-time data found for {symbol} at or before {value}"}), 404
     except Exception as e:
-        logger.error(f"Error getting real-time data: {e}")
+        logger.error(f"Error getting as-of quote: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/v1/realtime/asof", methods=["POST"])
+def get_quotes_asof():
+    """
+    Get the last real-time data at or before given times for many symbols.
+    
+    Request body:
+        {
+            "queries": [
+                {"symbol": "AAPL", "ts": "2023-01-03T14:31:07"},
+                ...
+            ]
+        }
+    
+    "data" holds one item per query, in order, with the matched quote or
+    null when there is none.
+    """
+    try:
+        data = request.json
+        
+        if not data or not isinstance(data.get("queries"), list):
+            return jsonify({"error": "Queries list is required"}), 400
+        if len(data["queries"]) > MAX_ASOF_QUERIES:
+            return jsonify({"error": f"At most {MAX_ASOF_QUERIES} queries are allowed"}), 400
+        
+        queries = []
+        for index, query in enumerate(data["queries"]):
+            try:
+                queries.append((query["symbol"], datetime.fromisoformat(query["ts"])))
+            except (KeyError, TypeError, ValueError):
+                return jsonify({"error": f"Invalid query at index {index}: symbol and ISO ts are required"}), 400
+        
+        quotes = repository.get_quotes_asof(queries)
+        
+        if quotes is None:
+            return jsonify({"error": "Failed to get as-of quotes"}), 500
+        
+        return jsonify({"data": [
+            {"symbol": symbol, "ts": timestamp.isoformat(), "quote": quote}
+            for (symbol, timestamp), quote in zip(queries, quotes)
+        ]})
+    except Exception as e:
+        logger.error(f"Error getting as-of quotes: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/v1/internal/registry", methods=["GET"])
+def get_stock_registry_stats():
+    """Get hit/miss statistics of the symbol to stock id registry."""
+    try:
+        return jsonify(repository.get_stock_registry_stats())
+    except Exception as e:
+        logger.error(f"Error getting stock registry stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/v1/internal/write-buffer", methods=["GET"])
+def get_write_buffer_stats():
+    """Get depth, flush latency and drop counts of the real-time write-behind buffer."""
+    try:
+        return jsonify(repository.get_write_buffer_stats())
+    except Exception as e:
+        logger.error(f"Error getting write buffer stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/v1/internal/response-cache", methods=["GET"])
+def get_response_cache_stats():
+    """Get size, hit ratio and evictions of the read response cache."""
+    try:
+        if not response_cache:
+            return jsonify({"enabled": False})
+        return jsonify({"enabled": True, **response_cache.get_stats()})
+    except Exception as e:
+        logger.error(f"Error getting response cache stats: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/v1/internal/pool", methods=["GET"])
+def get_pool_stats():
+    """Get checked-out and overflow connections and checkout wait histogram of the database pool."""
+    try:
+        return jsonify(repository.get_pool_stats())
+    except Exception as e:
+        logger.error(f"Error getting pool stats: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/v1/stocks", methods=["GET"])
 def get_stocks():
-    """Get all stocks."""
+    """
+    Get all stocks.
+    
+    Query parameters:
+        sector (str, optional): Only stocks in this sector
+        industry (str, optional): Only stocks in this industry
+    
+    The response carries an ETag; a request whose If-None-Match matches it
+    gets an empty 304 response.
+    """
     try:
-      
-        return jsonify({
-            "status": "success",
-            "message": "This endpoint would return a list of all stocks"
-        })
+        result = repository.get_stocks(request.args.get("sector"), request.args.get("industry"))
+        
+        if result is None:
+            return jsonify({"error": "Failed to get stocks"}), 500
+        
+        if request.if_none_match.contains(result["etag"]):
+            response = Response(status=304)
+        else:
+            response = jsonify({"data": result["data"], "count": len(result["data"])})
+        
+        response.set_etag(result["etag"])
+        response.headers["Cache-Control"] = "no-cache"
+        return response
     except Exception as e:
         logger.error(f"Error getting stocks: {e}")
         return jsonify({"error": str(e)}), 500
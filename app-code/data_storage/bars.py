@@ -0,0 +1,155 @@
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger, load_config
+
+
+logger = get_logger("data_storage_bars")
+
+# Bar interval name -> length in seconds. Every interval divides a day, so
+# buckets of all intervals line up on day boundaries.
+BAR_INTERVALS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "1d": 86400
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+def bucket_start(timestamp, seconds):
+    """
+    Get the start of the bar bucket containing a timestamp.
+    
+    Args:
+        timestamp (datetime): Tick timestamp
+        seconds (int): Bar length in seconds
+    
+    Returns:
+        datetime: Start of the bucket
+    """
+    elapsed = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=elapsed - elapsed % seconds)
+
+def aggregate_ticks(rows, intervals, previous_volumes=None):
+    """
+    Fold ticks into OHLCV bars.
+    
+    The volume of a tick is the cumulative session volume reported with the
+    quote. Each tick adds its increase over the previous tick with a volume,
+    which may lie in an earlier bucket, so the bars of an interval add up to
+    the volume traded over their whole span. A drop of the cumulative volume
+    starts a new session, counted from zero; a stock's first tick with no
+    earlier volume known adds nothing. Open and close are taken by tick
+    timestamp.
+    
+    Args:
+        rows (iterable): Rows with stock_id, timestamp, price and volume, in
+            timestamp order per stock
+        intervals (list): Bar interval names
+        previous_volumes (dict, optional): stock_id -> cumulative volume of
+            the last tick before the rows, looked up when the stock's first
+            row is reached
+    
+    Returns:
+        dict: (stock_id, interval, bucket) -> bar
+    """
+    bars = {}
+    previous = {}
+    for row in rows:
+        if row["stock_id"] not in previous:
+            previous[row["stock_id"]] = previous_volumes.get(row["stock_id"]) if previous_volumes is not None else None
+        
+        volume = None
+        if row["volume"] is not None:
+            last = previous[row["stock_id"]]
+            if last is None:
+                volume = 0
+            elif row["volume"] >= last:
+                volume = row["volume"] - last
+            else:
+                volume = row["volume"]
+            previous[row["stock_id"]] = row["volume"]
+        
+        for interval in intervals:
+            key = (row["stock_id"], interval, bucket_start(row["timestamp"], BAR_INTERVALS[interval]))
+            bar = bars.get(key)
+            
+            if bar is None:
+                bars[key] = {
+                    "open": row["price"],
+                    "high": row["price"],
+                    "low": row["price"],
+                    "close": row["price"],
+                    "volume": volume,
+                    "open_time": row["timestamp"],
+                    "close_time": row["timestamp"],
+                    "volume_min": row["volume"],
+                    "volume_max": row["volume"],
+                    "tick_count": 1
+                }
+                continue
+            
+            bar["high"] = max(bar["high"], row["price"])
+            bar["low"] = min(bar["low"], row["price"])
+            if row["timestamp"] < bar["open_time"]:
+                bar["open"], bar["open_time"] = row["price"], row["timestamp"]
+            if row["timestamp"] >= bar["close_time"]:
+                bar["close"], bar["close_time"] = row["price"], row["timestamp"]
+            if volume is not None:
+                bar["volume"] = volume if bar["volume"] is None else bar["volume"] + volume
+                bar["volume_min"] = row["volume"] if bar["volume_min"] is None else min(bar["volume_min"], row["volume"])
+                bar["volume_max"] = row["volume"] if bar["volume_max"] is None else max(bar["volume_max"], row["volume"])
+            bar["tick_count"] += 1
+    
+    return bars
+
+class BarRollupScheduler:
+    """Runs the bar catch-up rollup periodically in a background thread."""
+    
+    def __init__(self, run, interval_s=60):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            run (callable): Catch-up rollup to run
+            interval_s (int, optional): Seconds between runs
+        """
+        self.logger = logger
+        self.run = run
+        self.interval_s = interval_s
+        
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def _run(self):
+        """Run the rollup until stopped."""
+        while not self._stopped.wait(self.interval_s):
+            try:
+                self.run()
+            except Exception as e:
+                self.logger.error(f"Error rolling up bars: {e}")
+    
+    def start(self):
+        """Start running the rollup periodically."""
+        self._thread = threading.Thread(target=self._run, name="bar_rollup", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the rollup thread."""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+if __name__ == "__main__":
+    # One catch-up run, e.g. to roll up ticks stored before bars existed
+    from repository import Repository
+    
+    repo = Repository(bars={**load_config()["storage"]["bars"], "mode": "off"})
+    result = repo.rollup_realtime_data()
+    repo.close()
+    sys.exit(0 if result is not None else 1)
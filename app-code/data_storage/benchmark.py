@@ -0,0 +1,270 @@
+import sys
+import os
+import io
+import json
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger
+
+from sqlalchemy import desc, text
+
+from models import HistoricalData
+from repository import Repository
+
+logger = get_logger("data_storage_benchmark")
+
+def generate_historical_data(days, start=datetime(2000, 1, 3)):
+    """
+    Generate synthetic daily bars.
+    
+    Args:
+        days (int): Number of bars to generate
+        start (datetime, optional): Date of the first bar
+    
+    Returns:
+        list: Historical data
+    """
+    data = []
+    price = 100.0
+    for i in range(days):
+        price = max(1.0, price + random.gauss(0, 1))
+        data.append({
+            "date": (start + timedelta(days=i)).isoformat(),
+            "open": price,
+            "high": price + random.uniform(0, 2),
+            "low": price - random.uniform(0, 2),
+            "close": price + random.uniform(-1, 1),
+            "volume": random.randint(500000, 1500000)
+        })
+    return data
+
+def benchmark_store_historical_data(repo, days=2520):
+    """
+    Compare the per-row historical store loop with bulk upserts.
+    
+    Both paths are timed on an empty symbol (pure inserts) and again on the
+    same rows (pure updates).
+    
+    Args:
+        repo (Repository): Repository to benchmark
+        days (int, optional): Number of bars per run (default: 10 years)
+    
+    Returns:
+        dict: Elapsed seconds per path and phase
+    """
+    data = generate_historical_data(days)
+    suffix = datetime.now().strftime("%H%M%S")
+    results = {}
+    
+    for name, store in (
+        ("per_row", lambda symbol: repo.store_historical_data(symbol, data)),
+        ("bulk", lambda symbol: repo.bulk_upsert_historical_data(symbol, data)),
+    ):
+        symbol = f"BENCH_{name.upper()}_{suffix}"
+        repo.get_or_create_stock(symbol)
+        
+        for phase in ("insert", "update"):
+            start = time.perf_counter()
+            store(symbol)
+            elapsed = time.perf_counter() - start
+            results[f"{name}_{phase}"] = elapsed
+            logger.info(f"{name} {phase}: {days} rows in {elapsed:.3f}s ({days / elapsed:,.0f} rows/s)")
+    
+    for phase in ("insert", "update"):
+        speedup = results[f"per_row_{phase}"] / results[f"bulk_{phase}"]
+        logger.info(f"bulk {phase} speedup: {speedup:.1f}x")
+    
+    return results
+
+def timeit(run):
+    """Get the seconds a call takes."""
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+def benchmark_historical_read(repo, rows=100000):
+    """
+    Compare reading historical records through ORM objects with the Core
+    read path, with all fields and with a two-column projection.
+    
+    Args:
+        repo (Repository): Repository to benchmark
+        rows (int, optional): Number of records read per run
+    
+    Returns:
+        dict: Rows per second per path
+    """
+    symbol = f"BENCH_READ_{datetime.now().strftime('%H%M%S')}"
+    repo.bulk_upsert_historical_data(symbol, generate_historical_data(rows))
+    stock_id = repo.get_stock_id(symbol)
+    
+    def orm_read():
+        # The read path before the Core one: HistoricalData objects copied into dicts
+        session = repo.Session()
+        items = session.query(HistoricalData).filter(HistoricalData.stock_id == stock_id).order_by(desc(HistoricalData.date)).limit(rows).all()
+        data = [
+            {
+                "symbol": symbol,
+                "date": item.date.isoformat(),
+                "open": item.open,
+                "high": item.high,
+                "low": item.low,
+                "close": item.close,
+                "volume": item.volume,
+                "ma5": item.ma5,
+                "ma20": item.ma20,
+                "daily_return": item.daily_return,
+                "volatility": item.volatility,
+                "rsi": item.rsi
+            }
+            for item in items
+        ]
+        session.close()
+        return data
+    
+    results = {}
+    for name, read in (
+        ("orm", orm_read),
+        ("core", lambda: repo.get_historical_data(symbol, limit=rows)),
+        ("core_close_volume", lambda: repo.get_historical_data(symbol, limit=rows, fields=["close", "volume"])),
+    ):
+        # Best of three, after a warm-up run
+        read()
+        elapsed = min(timeit(read) for _ in range(3))
+        results[name] = rows / elapsed
+        logger.info(f"{name} read: {rows} rows in {elapsed:.3f}s ({rows / elapsed:,.0f} rows/s)")
+    
+    for name in ("core", "core_close_volume"):
+        logger.info(f"{name} read speedup: {results[name] / results['orm']:.1f}x")
+    
+    return results
+
+def benchmark_tick_archive(repo, days=5, ticks_per_day=23400):
+    """
+    Compare storage size and full scan time of ticks in realtime_data and
+    in the compressed tick archive.
+    
+    Args:
+        repo (Repository): Repository to benchmark
+        days (int, optional): Number of days of ticks
+        ticks_per_day (int, optional): Ticks per day (default: one per second
+            of a trading session)
+    
+    Returns:
+        dict: Bytes per tick and scan seconds before and after archiving
+    """
+    symbol = f"BENCH_TICKS_{datetime.now().strftime('%H%M%S')}"
+    start = datetime(2020, 1, 6, 14, 30)
+    
+    def heap_size():
+        # Tuples plus their 4-byte line pointers; indexes come on top
+        with repo.engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT sum(pg_column_size(r.*) + 4) FROM realtime_data r WHERE stock_id = :stock_id"
+            ), {"stock_id": repo.get_stock_id(symbol)}).scalar()
+    
+    price = 100.0
+    volume = 0
+    for day in range(days):
+        ticks = []
+        for i in range(ticks_per_day):
+            price = round(max(1.0, price + random.choice([0, 0, 0.01, -0.01])), 2)
+            volume += random.randint(0, 1000)
+            ticks.append({
+                "symbol": symbol,
+                "timestamp": (start + timedelta(days=day, seconds=i)).isoformat(),
+                "price": price,
+                "volume": volume,
+                "bid": round(price - 0.01, 2),
+                "ask": round(price + 0.01, 2)
+            })
+        for offset in range(0, len(ticks), 10000):
+            repo.store_realtime_batch(ticks[offset:offset + 10000])
+    
+    count = days * ticks_per_day
+    is_postgresql = repo.engine.dialect.name == "postgresql"
+    results = {"hot_bytes_per_tick": heap_size() / count if is_postgresql else None}
+    
+    def scan():
+        # Best of three, after a warm-up run
+        list(repo.iter_ticks(symbol))
+        return min(timeit(lambda: list(repo.iter_ticks(symbol))) for _ in range(3))
+    
+    results["hot_scan"] = scan()
+    archived = repo.archive_realtime_data(before=start + timedelta(days=days), symbols=[symbol])
+    results["archive_bytes_per_tick"] = archived["bytes"] / count
+    results["archive_scan"] = scan()
+    
+    if is_postgresql:
+        logger.info(f"realtime_data: {results['hot_bytes_per_tick']:.1f} heap bytes per tick, excluding indexes")
+    logger.info(f"tick archive: {results['archive_bytes_per_tick']:.1f} bytes per tick")
+    for name in ("hot", "archive"):
+        elapsed = results[f"{name}_scan"]
+        logger.info(f"{name} scan: {count} ticks in {elapsed:.3f}s ({count / elapsed:,.0f} ticks/s)")
+    logger.info(f"archive scan speedup: {results['hot_scan'] / results['archive_scan']:.1f}x")
+    
+    # The archive must cut storage by an order of magnitude without slowing reads down
+    if is_postgresql:
+        assert results["archive_bytes_per_tick"] * 10 <= results["hot_bytes_per_tick"], "tick archive should be 10x smaller"
+    assert results["archive_scan"] < results["hot_scan"], "scanning archived ticks should be faster than realtime_data"
+    
+    return results
+
+def benchmark_historical_decode(rows=1000000):
+    """
+    Compare client-side decode time of JSON and Arrow historical responses.
+    
+    Both payloads are built in memory the way the storage API serializes
+    them; only the client work of turning them into a DataFrame is timed.
+    
+    Args:
+        rows (int, optional): Number of records in the payload
+    
+    Returns:
+        dict: Payload sizes in bytes and decode seconds per format
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    data = generate_historical_data(rows)
+    for item in data:
+        item.update({"symbol": "BENCH", "ma5": None, "ma20": None, "daily_return": None, "volatility": None, "rsi": None})
+    
+    json_payload = json.dumps({"symbol": "BENCH", "data": data}).encode()
+    
+    table = pa.Table.from_pylist(data).drop(["symbol"])
+    table = table.set_column(0, "date", pc.strptime(table["date"], format="%Y-%m-%dT%H:%M:%S", unit="us"))
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, table.schema) as writer:
+        writer.write_table(table)
+    arrow_payload = buffer.getvalue()
+    
+    start = time.perf_counter()
+    df = pd.DataFrame(json.loads(json_payload)["data"])
+    df["date"] = pd.to_datetime(df["date"])
+    json_elapsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    pa.ipc.open_stream(arrow_payload).read_all().to_pandas(split_blocks=True, self_destruct=True)
+    arrow_elapsed = time.perf_counter() - start
+    
+    logger.info(f"json decode: {rows} rows, {len(json_payload):,} bytes in {json_elapsed:.3f}s")
+    logger.info(f"arrow decode: {rows} rows, {len(arrow_payload):,} bytes in {arrow_elapsed:.3f}s")
+    logger.info(f"arrow decode speedup: {json_elapsed / arrow_elapsed:.1f}x")
+    
+    return {
+        "json_bytes": len(json_payload),
+        "arrow_bytes": len(arrow_payload),
+        "json_decode": json_elapsed,
+        "arrow_decode": arrow_elapsed
+    }
+
+if __name__ == "__main__":
+    benchmark_store_historical_data(Repository())
+    benchmark_historical_read(Repository())
+    benchmark_tick_archive(Repository())
+    benchmark_historical_decode()
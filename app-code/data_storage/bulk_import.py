@@ -0,0 +1,234 @@
+import sys
+import os
+import csv
+import time
+import argparse
+from datetime import date, datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger
+
+# Run as "python -m data_storage.bulk_import" the sibling modules are not
+# on the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from repository import HISTORICAL_FIELDS, Repository
+
+
+logger = get_logger("data_storage_bulk_import")
+
+# Rows read, copied and merged per transaction
+IMPORT_CHUNK_SIZE = 50000
+
+# Columns every imported row needs besides the symbol
+REQUIRED_FIELDS = ["date", "open", "high", "low", "close", "volume"]
+
+# Invalid rows that are logged individually per file
+MAX_LOGGED_ERRORS = 10
+
+def read_csv_chunks(path, chunk_size):
+    """
+    Read a CSV file with a header row in chunks.
+    
+    Args:
+        path (str): File path
+        chunk_size (int): Rows per chunk
+    
+    Yields:
+        list: Rows as dicts keyed by lower-case column name
+    """
+    with open(path, newline="") as file:
+        reader = csv.DictReader(file)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def read_parquet_chunks(path, chunk_size):
+    """
+    Read a Parquet file in chunks of record batches.
+    
+    Args:
+        path (str): File path
+        chunk_size (int): Rows per chunk
+    
+    Yields:
+        list: Rows as dicts keyed by lower-case column name
+    """
+    import pyarrow.parquet as pq
+    
+    file = pq.ParquetFile(path)
+    names = [name.strip().lower() for name in file.schema_arrow.names]
+    for batch in file.iter_batches(batch_size=chunk_size):
+        yield [dict(zip(names, values)) for values in zip(*(column.to_pylist() for column in batch.columns))]
+
+def read_chunks(path, chunk_size=IMPORT_CHUNK_SIZE, file_format=None):
+    """
+    Read a CSV or Parquet file of OHLCV bars in chunks.
+    
+    Args:
+        path (str): File path
+        chunk_size (int, optional): Rows per chunk
+        file_format (str, optional): "csv" or "parquet" (default: from the extension)
+    
+    Yields:
+        list: Rows as dicts keyed by lower-case column name
+    """
+    file_format = file_format or ("parquet" if path.lower().endswith((".parquet", ".pq")) else "csv")
+    if file_format == "parquet":
+        return read_parquet_chunks(path, chunk_size)
+    if file_format == "csv":
+        return read_csv_chunks(path, chunk_size)
+    raise ValueError(f"Unsupported format: {file_format}")
+
+def parse_row(row, symbol=None):
+    """
+    Convert a row read from a file to a historical data row.
+    
+    Args:
+        row (dict): Row keyed by lower-case column name
+        symbol (str, optional): Symbol of rows without a symbol column
+    
+    Returns:
+        tuple: Symbol and the row for Repository.merge_historical_rows without stock_id
+    
+    Raises:
+        ValueError: If a required value is missing or invalid
+    """
+    symbol = row.get("symbol") or symbol
+    if not symbol:
+        raise ValueError("symbol is required")
+    
+    for field in REQUIRED_FIELDS:
+        if row.get(field) in (None, ""):
+            raise ValueError(f"{field} is required")
+    
+    value = row["date"]
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    
+    parsed = {"date": value}
+    for field in HISTORICAL_FIELDS:
+        raw = row.get(field)
+        if raw in (None, ""):
+            parsed[field] = None
+        elif field == "volume":
+            parsed[field] = int(float(raw))
+        else:
+            parsed[field] = float(raw)
+    
+    return symbol.strip(), parsed
+
+def import_files(repo, paths, chunk_size=IMPORT_CHUNK_SIZE, file_format=None, symbol=None):
+    """
+    Import CSV or Parquet files of OHLCV bars into historical_data.
+    
+    Files hold a header with symbol, date, open, high, low, close and volume
+    columns plus optionally the indicator columns; rows of any number of
+    symbols may be mixed. Each chunk is merged in one transaction (COPY into
+    a staging table on PostgreSQL), then indicators and coverage are
+    refreshed once per imported symbol.
+    
+    Args:
+        repo (Repository): Repository to import into
+        paths (list): File paths
+        chunk_size (int, optional): Rows per transaction
+        file_format (str, optional): "csv" or "parquet" (default: from each extension)
+        symbol (str, optional): Symbol of rows without a symbol column
+    
+    Returns:
+        dict: Rows read, merged, inserted, updated and rejected, symbols,
+            seconds and rows per second, or None on error
+    """
+    totals = {"read": 0, "merged": 0, "inserted": 0, "updated": 0, "rejected": 0}
+    # symbol -> earliest imported date
+    imported = {}
+    start = time.perf_counter()
+    
+    for path in paths:
+        errors = 0
+        for chunk in read_chunks(path, chunk_size, file_format):
+            rows = []
+            for row in chunk:
+                totals["read"] += 1
+                try:
+                    row_symbol, parsed = parse_row(row, symbol)
+                except (ValueError, TypeError) as e:
+                    totals["rejected"] += 1
+                    errors += 1
+                    if errors <= MAX_LOGGED_ERRORS:
+                        logger.warning(f"{path}: skipping row {row}: {e}")
+                    continue
+                
+                parsed["stock_id"] = repo.get_stock_id(row_symbol)
+                if parsed["stock_id"] is None:
+                    return None
+                rows.append(parsed)
+                imported[row_symbol] = min(imported.get(row_symbol, parsed["date"]), parsed["date"])
+            
+            if rows:
+                result = repo.merge_historical_rows(rows)
+                if result is None:
+                    return None
+                totals["merged"] += result["rows"]
+                for key in ("inserted", "updated"):
+                    totals[key] = None if totals[key] is None or result[key] is None else totals[key] + result[key]
+            
+            elapsed = time.perf_counter() - start
+            logger.info(f"{path}: {totals['read']:,} rows read, {totals['merged']:,} merged ({totals['read'] / elapsed:,.0f} rows/s)")
+    
+    for row_symbol, since in imported.items():
+        if repo.materialize_on_write:
+            repo.materialize_indicators([row_symbol], since=since)
+        repo.refresh_coverage([row_symbol], since=since)
+    
+    elapsed = time.perf_counter() - start
+    result = {
+        **totals,
+        "symbols": len(imported),
+        "seconds": elapsed,
+        "rows_per_s": totals["read"] / elapsed if elapsed else None
+    }
+    logger.info(
+        f"Imported {totals['merged']:,} historical data records of {len(imported)} symbols "
+        f"in {elapsed:.1f}s ({result['rows_per_s']:,.0f} rows/s), rejected {totals['rejected']:,}"
+    )
+    return result
+
+def main(argv=None):
+    """
+    Run the import command.
+    
+    Args:
+        argv (list, optional): Command line arguments (default: sys.argv)
+    
+    Returns:
+        int: Exit status
+    """
+    parser = argparse.ArgumentParser(description="Import CSV or Parquet files of OHLCV bars into historical_data")
+    parser.add_argument("paths", nargs="+", help="CSV or Parquet files")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="File format (default: from the extension)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Rows per transaction")
+    parser.add_argument("--symbol", help="Symbol of files without a symbol column")
+    args = parser.parse_args(argv)
+    
+    repo = Repository()
+    try:
+        result = import_files(repo, args.paths, args.chunk_size, args.format, args.symbol)
+    except Exception as e:
+        logger.error(f"Error importing historical data: {e}")
+        result = None
+    finally:
+        repo.close()
+    
+    return 0 if result is not None else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
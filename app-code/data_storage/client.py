@@ -0,0 +1,102 @@
+import sys
+import os
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger, load_config
+
+
+logger = get_logger("data_storage_client")
+config = load_config()
+
+class StorageClient:
+    """Client for the data storage service."""
+    
+    def __init__(self, base_url=None, timeout=30):
+        self.logger = logger
+        self.base_url = base_url or f"http://{config['db']['host']}:{config['services']['data_storage']['port']}"
+        self.timeout = timeout
+    
+    def get_historical_frame(self, symbol, **params):
+        """
+        Get historical data for a symbol as a pandas DataFrame.
+        
+        The data is requested as an Arrow IPC stream and converted without
+        going through JSON; numeric columns without nulls are handed to
+        pandas without copying.
+        
+        Args:
+            symbol (str): Stock symbol
+            **params: Query parameters of GET /api/v1/historical/<symbol>
+                (limit, start, end, after, order)
+        
+        Returns:
+            pandas.DataFrame: Historical data, or an empty DataFrame on error
+        """
+        import pandas as pd
+        import pyarrow as pa
+        
+        try:
+            response = requests.get(
+                f"{self.base_url}/api/v1/historical/{symbol}",
+                params={**params, "format": "arrow"},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            
+            table = pa.ipc.open_stream(response.content).read_all()
+            return table.to_pandas(split_blocks=True, self_destruct=True)
+        except Exception as e:
+            self.logger.error(f"Error getting historical data frame for {symbol}: {e}")
+            return pd.DataFrame()
+    
+    def get_historical_data_multi(self, symbols, **params):
+        """
+        Get historical data for many symbols in one request.
+        
+        Args:
+            symbols (list): Stock symbols
+            **params: Query parameters of GET /api/v1/historical
+                (limit per symbol, start, end, order)
+        
+        Returns:
+            dict: Historical data by symbol, or an empty dict on error
+        """
+        try:
+            response = requests.get(
+                f"{self.base_url}/api/v1/historical",
+                params={**params, "symbols": ",".join(symbols)},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            
+            return response.json()["data"]
+        except Exception as e:
+            self.logger.error(f"Error getting historical data for {len(symbols)} symbols: {e}")
+            return {}
+    
+    def get_indicators(self, symbol, **params):
+        """
+        Get historical data for a symbol with the indicators computed by the
+        storage service.
+        
+        Args:
+            symbol (str): Stock symbol
+            **params: Query parameters of GET /api/v1/historical/<symbol>
+                (limit, start, end, after, order)
+        
+        Returns:
+            dict: Historical data and next_cursor, or an empty dict on error
+        """
+        try:
+            response = requests.get(
+                f"{self.base_url}/api/v1/historical/{symbol}",
+                params={**params, "indicators": "computed"},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            
+            return response.json()
+        except Exception as e:
+            self.logger.error(f"Error getting indicators for {symbol}: {e}")
+            return {}
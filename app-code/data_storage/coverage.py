@@ -0,0 +1,178 @@
+import sys
+import os
+from datetime import date, timedelta
+from functools import lru_cache
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger
+
+
+logger = get_logger("data_storage_coverage")
+
+# Unscheduled full-day NYSE closures that the holiday rules cannot derive
+SPECIAL_CLOSURES = {
+    date(2001, 9, 11), date(2001, 9, 12), date(2001, 9, 13), date(2001, 9, 14),
+    date(2004, 6, 11),
+    date(2007, 1, 2),
+    date(2012, 10, 29), date(2012, 10, 30),
+    date(2018, 12, 5),
+    date(2025, 1, 9)
+}
+
+def _easter(year):
+    """Get Easter Sunday of a year (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _nth_weekday(year, month, weekday, n):
+    """Get the nth (1-based, -1 for last) given weekday of a month."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(day):
+    """Move a holiday on a weekend to the Friday before or the Monday after."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=None)
+def market_holidays(year):
+    """
+    Get the NYSE holidays of a year.
+    
+    Args:
+        year (int): Year
+    
+    Returns:
+        frozenset: Dates the market is closed on besides weekends
+    """
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),
+        _nth_weekday(year, 2, 0, 3),
+        _easter(year) - timedelta(days=2),
+        _nth_weekday(year, 5, 0, -1),
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),
+        _nth_weekday(year, 11, 3, 4),
+        _observed(date(year, 12, 25))
+    }
+    # New Year's Day on a Saturday is not observed on the Friday before
+    if date(year, 1, 1).weekday() != 5:
+        holidays.add(_observed(date(year, 1, 1)))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))
+    return frozenset(holidays)
+
+def is_trading_day(day):
+    """Check whether the market is open on a date."""
+    return day.weekday() < 5 and day not in market_holidays(day.year) and day not in SPECIAL_CLOSURES
+
+def trading_days(start, end):
+    """
+    Get the trading days in a date range.
+    
+    Args:
+        start (date): First day
+        end (date): Last day (inclusive)
+    
+    Returns:
+        list: Trading days in order
+    """
+    days = []
+    day = start
+    while day <= end:
+        if is_trading_day(day):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+def last_trading_day(day=None):
+    """Get the latest trading day on or before a date (default: today)."""
+    day = day or date.today()
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+def find_gaps(dates, start=None, end=None):
+    """
+    Find the trading days missing from a set of dates.
+    
+    Args:
+        dates (iterable): Dates present
+        start (date, optional): First day to check (default: earliest date present)
+        end (date, optional): Last day to check (default: latest date present)
+    
+    Returns:
+        list: Missing ranges as (first day, last day, trading days) tuples
+    """
+    present = set(dates)
+    if not present and (start is None or end is None):
+        return []
+    
+    gaps = []
+    current = None
+    for day in trading_days(start or min(present), end or max(present)):
+        if day in present:
+            current = None
+        elif current is None:
+            current = [day, day, 1]
+            gaps.append(current)
+        else:
+            current[1] = day
+            current[2] += 1
+    return [tuple(gap) for gap in gaps]
+
+def plan_fetches(gaps, merge_gap_days=5):
+    """
+    Turn missing ranges into as few fetch requests as sensible.
+    
+    Gaps separated by at most merge_gap_days trading days that are present
+    are fetched together, trading a few re-downloaded days for a request.
+    
+    Args:
+        gaps (list): Missing ranges as returned by find_gaps, in order
+        merge_gap_days (int, optional): Largest run of present days to re-fetch
+    
+    Returns:
+        list: Fetch ranges with start (inclusive), end (exclusive, as the
+            fetcher expects) and the number of missing trading days covered
+    """
+    plan = []
+    for first, last, days in gaps:
+        if plan and len(trading_days(plan[-1]["last"] + timedelta(days=1), first - timedelta(days=1))) <= merge_gap_days:
+            plan[-1]["last"] = last
+            plan[-1]["missing_days"] += days
+        else:
+            plan.append({"first": first, "last": last, "missing_days": days})
+    
+    return [
+        {
+            "start": item["first"].isoformat(),
+            "end": (item["last"] + timedelta(days=1)).isoformat(),
+            "missing_days": item["missing_days"]
+        }
+        for item in plan
+    ]
+
+if __name__ == "__main__":
+    # Build the coverage index for data stored before it existed
+    from repository import Repository
+    
+    repo = Repository()
+    refreshed = repo.refresh_coverage()
+    repo.close()
+    sys.exit(0 if refreshed is not None else 1)
@@ -0,0 +1,303 @@
+import sys
+import os
+import time
+import threading
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger, get_db_url, load_config
+
+
+logger = get_logger("data_storage_database")
+
+# Upper bounds in milliseconds of the checkout wait histogram buckets
+CHECKOUT_WAIT_BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, 5000]
+
+# Replication lag of a PostgreSQL standby in seconds; 0 on a primary and on
+# a standby that has replayed everything it received
+REPLICA_LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+_engine = None
+_replica_router = None
+_engine_lock = threading.Lock()
+
+class PoolMetrics:
+    """Checkout counters and wait histogram of the shared connection pool."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Clear all counters."""
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.wait_counts = [0] * (len(CHECKOUT_WAIT_BUCKETS_MS) + 1)
+    
+    def record(self, wait_ms, timed_out=False):
+        """
+        Record one checkout.
+        
+        Args:
+            wait_ms (float): Time spent waiting for a connection
+            timed_out (bool, optional): Whether the checkout gave up waiting
+        """
+        index = next((i for i, bound in enumerate(CHECKOUT_WAIT_BUCKETS_MS) if wait_ms <= bound), len(CHECKOUT_WAIT_BUCKETS_MS))
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.wait_counts[index] += 1
+    
+    def get_stats(self):
+        """
+        Get the checkout statistics.
+        
+        Returns:
+            dict: Checkout and timeout counts, wait totals in milliseconds and
+                a cumulative wait histogram keyed by bucket upper bound
+        """
+        with self._lock:
+            buckets = {}
+            total = 0
+            for bound, count in zip([str(bound) for bound in CHECKOUT_WAIT_BUCKETS_MS] + ["+Inf"], self.wait_counts):
+                total += count
+                buckets[bound] = total
+            
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": self.total_wait_ms / attempts if attempts else None,
+                "max_wait_ms": self.max_wait_ms,
+                "wait_ms_buckets": buckets
+            }
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection."""
+    
+    def __init__(self, creator, **kw):
+        super().__init__(creator, **kw)
+        self.metrics = PoolMetrics()
+    
+    def recreate(self):
+        pool = super().recreate()
+        # Keep the counters when the engine is disposed
+        pool.metrics = self.metrics
+        return pool
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.metrics.record((time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        self.metrics.record((time.perf_counter() - start) * 1000)
+        return connection
+
+def create_pooled_engine(db_url=None):
+    """
+    Create an engine with the pool settings from the configuration.
+    
+    Args:
+        db_url (str, optional): Database URL (default: from the configuration)
+    
+    Returns:
+        Engine: SQLAlchemy engine
+    """
+    db = load_config()["db"]
+    db_url = db_url or get_db_url()
+    pool = db["pool"]
+    
+    connect_args = {}
+    if db_url.startswith("postgresql"):
+        if db["statement_timeout_ms"]:
+            connect_args["options"] = f"-c statement_timeout={db['statement_timeout_ms']}"
+    elif db_url.startswith("sqlite"):
+        # Pooled connections are handed to whichever thread checks them out
+        connect_args["check_same_thread"] = False
+    
+    return create_engine(
+        db_url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool["size"],
+        max_overflow=pool["max_overflow"],
+        pool_timeout=pool["timeout"],
+        pool_pre_ping=pool["pre_ping"],
+        pool_recycle=pool["recycle"],
+        connect_args=connect_args
+    )
+
+def get_engine():
+    """
+    Get the engine shared by everything in this process.
+    
+    Returns:
+        Engine: SQLAlchemy engine
+    """
+    global _engine
+    
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_pooled_engine()
+            pool = load_config()["db"]["pool"]
+            logger.info(f"Created database engine with pool size {pool['size']} and max overflow {pool['max_overflow']}")
+        return _engine
+
+def get_pool_stats(engine=None):
+    """
+    Get the state and checkout statistics of a connection pool.
+    
+    Args:
+        engine (Engine, optional): Engine created by create_pooled_engine
+            (default: the shared engine)
+    
+    Returns:
+        dict: Pool size, checked-in, checked-out and overflow connections plus checkout statistics
+    """
+    pool = (engine or get_engine()).pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        **pool.metrics.get_stats()
+    }
+
+class ReplicaRouter:
+    """Round-robin routing of reads to healthy read replicas."""
+    
+    def __init__(self, urls, max_lag_s=30, check_interval_s=5):
+        """
+        Initialize the router.
+        
+        Args:
+            urls (list): Database URLs of the read replicas
+            max_lag_s (float, optional): Replication lag beyond which a replica is skipped
+            check_interval_s (float, optional): Seconds a health check result is reused
+        """
+        self.logger = logger
+        self.engines = [create_pooled_engine(url) for url in urls]
+        self.max_lag_s = max_lag_s
+        self.check_interval_s = check_interval_s
+        
+        self._lock = threading.Lock()
+        self._next = 0
+        self._health = [{"healthy": None, "lag_s": None, "error": None, "checked_at": None} for _ in self.engines]
+        self.routed = [0] * len(self.engines)
+        self.fallbacks = 0
+    
+    def _measure_lag(self, engine):
+        """Get the replication lag of a replica in seconds."""
+        with engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                return float(conn.execute(text(REPLICA_LAG_SQL)).scalar() or 0)
+            conn.execute(text("SELECT 1"))
+            return 0.0
+    
+    def _is_healthy(self, index):
+        """
+        Check whether a replica is reachable and recent enough, reusing a
+        result younger than check_interval_s.
+        """
+        health = self._health[index]
+        now = time.monotonic()
+        if health["checked_at"] is not None and now - health["checked_at"] < self.check_interval_s:
+            return health["healthy"]
+        
+        try:
+            lag = self._measure_lag(self.engines[index])
+            error = None if lag <= self.max_lag_s else f"Replication lag of {lag:.1f}s"
+        except Exception as e:
+            lag = None
+            error = str(e)
+        
+        healthy = error is None
+        if not healthy and health["healthy"] is not False:
+            self.logger.warning(f"Read replica {index} is unhealthy: {error}")
+        elif healthy and health["healthy"] is False:
+            self.logger.info(f"Read replica {index} is healthy again")
+        
+        self._health[index] = {"healthy": healthy, "lag_s": lag, "error": error, "checked_at": now}
+        return healthy
+    
+    def choose(self, primary):
+        """
+        Choose the engine for a read.
+        
+        Args:
+            primary (Engine): Engine to fall back to when no replica is usable
+        
+        Returns:
+            Engine: The next healthy replica in turn, or the primary
+        """
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.engines)
+        
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            if self._is_healthy(index):
+                with self._lock:
+                    self.routed[index] += 1
+                return self.engines[index]
+        
+        with self._lock:
+            self.fallbacks += 1
+        return primary
+    
+    def get_stats(self):
+        """
+        Get routing statistics and the last health check of every replica.
+        
+        Returns:
+            dict: Reads routed per replica, fallbacks to the primary and replica health
+        """
+        replicas = []
+        for index, engine in enumerate(self.engines):
+            health = self._health[index]
+            replicas.append({
+                "url": engine.url.render_as_string(hide_password=True),
+                "healthy": health["healthy"],
+                "lag_s": health["lag_s"],
+                "error": health["error"],
+                "routed": self.routed[index],
+                "pool": get_pool_stats(engine)
+            })
+        return {"fallbacks": self.fallbacks, "replicas": replicas}
+    
+    def dispose(self):
+        """Close the connections of all replica pools."""
+        for engine in self.engines:
+            engine.dispose()
+
+def get_replica_router():
+    """
+    Get the read replica router shared by everything in this process.
+    
+    Returns:
+        ReplicaRouter: Router over the configured replicas, or None without replicas
+    """
+    global _replica_router
+    
+    db = load_config()["db"]
+    if not db["replicas"]:
+        return None
+    
+    with _engine_lock:
+        if _replica_router is None:
+            _replica_router = ReplicaRouter(db["replicas"], db["replica_max_lag_s"], db["replica_check_interval_s"])
+            logger.info(f"Routing reads to {len(db['replicas'])} read replicas")
+        return _replica_router
@@ -0,0 +1,93 @@
+import sys
+import os
+import statistics
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger
+
+
+logger = get_logger("data_storage_indicators")
+
+# Trailing window lengths, in rows, of the daily indicators
+INDICATOR_WINDOWS = {"ma5": 5, "ma20": 20, "volatility": 20, "rsi": 14}
+
+# Rows before the first row to compute that the indicators need; the
+# 20-day volatility needs 20 daily returns and so 20 earlier closes
+INDICATOR_LOOKBACK_ROWS = 20
+
+class IndicatorState:
+    """
+    Rolling windows of the daily indicators of one stock.
+    
+    Indicators are the same as the ones computed with window functions on
+    reads: whose window reaches before the first close are None.
+    """
+    
+    def __init__(self, closes=()):
+        """
+        Initialize the state.
+        
+        Args:
+            closes (iterable, optional): Closes before the first one to
+                compute, oldest first; only the last INDICATOR_LOOKBACK_ROWS matter
+        """
+        self.closes = deque(maxlen=max(INDICATOR_WINDOWS["ma5"], INDICATOR_WINDOWS["ma20"]))
+        self.returns = deque(maxlen=INDICATOR_WINDOWS["volatility"])
+        self.changes = deque(maxlen=INDICATOR_WINDOWS["rsi"])
+        
+        for close in closes:
+            self.update(close)
+    
+    def _mean(self, values, window):
+        """Get the mean of the last window values, or None if there are fewer."""
+        values = list(values)[-window:]
+        return statistics.fmean(values) if len(values) == window else None
+    
+    def update(self, close):
+        """
+        Add the next close.
+        
+        Args:
+            close (float): Close of the next day
+        
+        Returns:
+            dict: ma5, ma20, daily_return, volatility and rsi of that day
+        """
+        previous = self.closes[-1] if self.closes else None
+        change = close - previous if previous is not None else None
+        daily_return = close / previous - 1 if previous else None
+        
+        self.closes.append(close)
+        self.returns.append(daily_return)
+        self.changes.append(change)
+        
+        volatility = None
+        if len(self.returns) == self.returns.maxlen and None not in self.returns:
+            volatility = statistics.stdev(self.returns)
+        
+        rsi = None
+        if len(self.changes) == self.changes.maxlen and None not in self.changes:
+            gain = statistics.fmean(max(change, 0) for change in self.changes)
+            loss = statistics.fmean(max(-change, 0) for change in self.changes)
+            if loss > 0:
+                rsi = 100 - 100 / (1 + gain / loss)
+            elif gain > 0:
+                rsi = 100.0
+        
+        return {
+            "ma5": self._mean(self.closes, INDICATOR_WINDOWS["ma5"]),
+            "ma20": self._mean(self.closes, INDICATOR_WINDOWS["ma20"]),
+            "daily_return": daily_return,
+            "volatility": volatility,
+            "rsi": rsi
+        }
+
+if __name__ == "__main__":
+    # Fill the indicator columns of data stored before they were materialized
+    from repository import Repository
+    
+    repo = Repository()
+    updated = repo.materialize_indicators()
+    repo.close()
+    sys.exit(0 if updated is not None else 1)
@@ -0,0 +1,176 @@
+import sys
+import os
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger, load_config
+
+from models import Stock, HistoricalData, RealtimeData
+from repository import Repository
+
+
+logger = get_logger("data_storage_lake_export")
+
+# Exported tables: model, columns written besides symbol, time column
+# first, and the column holding the time each row was last written. Files are
+# laid out as <table>/symbol=<symbol>/year=<year>/month=<month>/
+EXPORT_TABLES = {
+    "historical_data": (HistoricalData, [
+        "date", "open", "high", "low", "close", "volume", "ma5", "ma20", "daily_return", "volatility", "rsi"
+    ], "updated_at"),
+    # Real-time rows are never updated
+    "realtime_data": (RealtimeData, [
+        "timestamp", "price", "change", "change_percent", "volume", "market_cap", "bid", "ask",
+        "shares_outstanding", "sentiment"
+    ], "created_at")
+}
+
+# Prefix of the watermarks table entries of the export, one per table
+WATERMARK_PREFIX = "lake_export_"
+
+def _schema(model, columns):
+    """Get the Arrow schema of the exported columns of a model."""
+    import pyarrow as pa
+    
+    types = {"Integer": pa.int64(), "Float": pa.float64(), "String": pa.string(), "DateTime": pa.timestamp("us")}
+    fields = [pa.field("symbol", pa.string())]
+    fields += [pa.field(column, types[type(model.__table__.c[column].type).__name__]) for column in columns]
+    # Time the row was written, which tells readers the newest export of a row
+    fields += [pa.field("updated_at", pa.timestamp("us"))]
+    fields += [pa.field("year", pa.int16()), pa.field("month", pa.int8())]
+    return pa.schema(fields)
+
+def _write_chunk(path, schema, rows, basename):
+    """
+    Write rows to the dataset of a table, one file per symbol and month.
+    
+    Args:
+        path (str): Directory of the table's dataset
+        schema (Schema): Arrow schema of the rows
+        rows (list): Tuples in schema order without year and month
+        basename (str): File name template, with "{i}" for the file number
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    
+    # The time column follows the symbol
+    columns = [list(values) for values in zip(*rows)]
+    columns.append([value.year for value in columns[1]])
+    columns.append([value.month for value in columns[1]])
+    table = pa.Table.from_arrays([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+    
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([schema.field(name) for name in ("symbol", "year", "month")]), flavor="hive"),
+        basename_template=basename,
+        existing_data_behavior="overwrite_or_ignore",
+        max_partitions=max(len(set(zip(columns[0], columns[-2], columns[-1]))), 1024)
+    )
+
+def export_table(repo, root, table_name, now=None, lag_s=60, chunk_rows=100000):
+    """
+    Append the rows of a table written since the last export to its dataset.
+    
+    Rows are exported by the time they were last written, from the table's
+    watermark up to now less lag_s, so rows committed shortly after they
+    were written are still picked up by the next run. Each run adds new
+    files and never rewrites old ones: a row updated after its export (e.g.
+    historical data imported again) is exported again, and readers keep
+    the copy with the newest updated_at. Rows are read from a read replica
+    when one is configured.
+    
+    Args:
+        repo (Repository): Repository to export from
+        root (str): Directory of the dataset
+        table_name (str): "historical_data" or "realtime_data"
+        now (datetime, optional): Current time
+        lag_s (int, optional): Seconds of the newest rows left to the next run
+        chunk_rows (int, optional): Rows written per batch of files
+    
+    Returns:
+        dict: Rows exported and the new watermark
+    """
+    model, columns, written_column = EXPORT_TABLES[table_name]
+    table = model.__table__
+    stocks = Stock.__table__
+    name = WATERMARK_PREFIX + table_name
+    
+    watermark = repo.get_watermark(name)
+    cutoff = (now or datetime.now()) - timedelta(seconds=lag_s)
+    written = table.c[written_column]
+    if written_column != "created_at":
+        # Rows stored before updated_at was added have only created_at
+        written = func.coalesce(written, table.c.created_at)
+    query = (
+        select(stocks.c.symbol, *(table.c[column] for column in columns), written)
+        .join(stocks, stocks.c.id == table.c.stock_id)
+        .where(written < cutoff)
+        .order_by(written, table.c.id)
+    )
+    if watermark is not None:
+        query = query.where(written >= watermark)
+    
+    schema = _schema(model, columns)
+    path = os.path.join(root, table_name)
+    rows = 0
+    
+    engine = repo.replicas.choose(repo.engine) if repo.replicas else repo.engine
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(query)
+        for index, chunk in enumerate(result.partitions(chunk_rows)):
+            _write_chunk(path, schema, chunk, f"part-{cutoff:%Y%m%dT%H%M%S%f}-{index}-{{i}}.parquet")
+            rows += len(chunk)
+    
+    # Advanced only once the files are written; a failed run is exported again
+    repo.set_watermark(name, cutoff)
+    
+    logger.info(f"Exported {rows} {table_name} records written before {cutoff.isoformat()} to {path}")
+    return {"rows": rows, "watermark": cutoff.isoformat()}
+
+def export_lake(repo, root, tables=None, now=None, lag_s=60, chunk_rows=100000):
+    """
+    Export new rows of historical and real-time data to a Parquet dataset.
+    
+    The dataset is partitioned hive-style by symbol, year and month, so
+    readers such as pyarrow.dataset can prune files with filters on those
+    columns.
+    
+    Args:
+        repo (Repository): Repository to export from
+        root (str): Directory of the dataset
+        tables (list, optional): Tables to export (default: EXPORT_TABLES)
+        now (datetime, optional): Current time
+        lag_s (int, optional): Seconds of the newest rows left to the next run
+        chunk_rows (int, optional): Rows written per batch of files
+    
+    Returns:
+        dict: Result of export_table per table, or None on error
+    """
+    try:
+        return {
+            table_name: export_table(repo, root, table_name, now, lag_s, chunk_rows)
+            for table_name in tables or EXPORT_TABLES
+        }
+    except Exception as e:
+        logger.error(f"Error exporting data lake: {e}")
+        return None
+
+if __name__ == "__main__":
+    settings = load_config()["storage"]["lake"]
+    
+    parser = argparse.ArgumentParser(description="Export new historical and real-time data to a Parquet dataset")
+    parser.add_argument("--path", default=settings["path"], help="Directory of the dataset (default: STORAGE_LAKE_PATH)")
+    parser.add_argument("--table", action="append", choices=list(EXPORT_TABLES), help="Table to export (default: all)")
+    args = parser.parse_args()
+    
+    if not args.path:
+        parser.error("no dataset directory given and STORAGE_LAKE_PATH is not set")
+    
+    repo = Repository()
+    result = export_lake(repo, args.path, args.table, lag_s=settings["export_lag_s"], chunk_rows=settings["chunk_rows"])
+    repo.close()
+    sys.exit(0 if result is not None else 1)
@@ -0,0 +1,235 @@
+import sys
+import os
+from sqlalchemy import create_engine, inspect, text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger, get_db_url
+
+from models import Base
+
+
+logger = get_logger("data_storage_migrate")
+
+# Columns declared on the models that tables created before they existed
+# are missing. They are added without a default, which PostgreSQL does
+# without rewriting the table, so existing rows hold NULL.
+COLUMNS = [
+    {"table": "historical_data", "name": "updated_at", "type": "TIMESTAMP"}
+]
+
+# Indexes declared on the models that databases created before they existed
+# are missing. Unique indexes are promoted to the constraint of the same name.
+INDEXES = [
+    {
+        "table": "historical_data",
+        "name": "uq_historical_data_stock_id_date",
+        "columns": "stock_id, date",
+        "unique": True,
+        "dedupe_on": ["stock_id", "date"]
+    },
+    {
+        "table": "realtime_data",
+        "name": "ix_realtime_data_stock_id_timestamp",
+        "columns": "stock_id, timestamp DESC",
+        "unique": False
+    }
+]
+
+# Derived tables filled from existing rows while they are empty, i.e. right
+# after they were created. Filled tables are kept up to date by writes, so
+# the full scan of the source table is not repeated on later runs.
+BACKFILLS = [
+    {
+        "table": "latest_quotes",
+        "sql": (
+            "INSERT INTO latest_quotes (stock_id, timestamp, price, change, change_percent, volume, "
+            "market_cap, bid, ask, shares_outstanding, sentiment, updated_at) "
+            "SELECT stock_id, timestamp, price, change, change_percent, volume, "
+            "market_cap, bid, ask, shares_outstanding, sentiment, CURRENT_TIMESTAMP FROM ("
+            "SELECT r.*, ROW_NUMBER() OVER (PARTITION BY stock_id ORDER BY timestamp DESC, id DESC) AS position "
+            "FROM realtime_data r"
+            ") latest WHERE position = 1 "
+            "ON CONFLICT (stock_id) DO NOTHING"
+        )
+    }
+]
+
+# A concurrent build fails and leaves an INVALID index behind if a conflicting
+# row is written while it runs; such builds are dropped and retried.
+MAX_BUILD_ATTEMPTS = 3
+
+def _index_state(conn, name):
+    """
+    Get the state of an index on PostgreSQL.
+    
+    Args:
+        conn (Connection): Database connection
+        name (str): Index name
+    
+    Returns:
+        str: "missing", "invalid" or "valid"
+    """
+    valid = conn.execute(
+        text(
+            "SELECT i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND pg_catalog.pg_table_is_visible(c.oid)"
+        ),
+        {"name": name}
+    ).scalar()
+    
+    if valid is None:
+        return "missing"
+    return "valid" if valid else "invalid"
+
+def _has_constraint(conn, table, name):
+    """Check whether a table constraint exists on PostgreSQL."""
+    return conn.execute(
+        text(
+            "SELECT 1 FROM pg_constraint "
+            "WHERE conname = :name AND conrelid = CAST(:table AS regclass)"
+        ),
+        {"name": name, "table": table}
+    ).scalar() is not None
+
+def _delete_duplicates(conn, table, columns):
+    """
+    Delete duplicate rows that would violate a unique index.
+    
+    The row with the highest id (the most recent write) is kept.
+    
+    Args:
+        conn (Connection): Database connection
+        table (str): Table name
+        columns (list): Columns of the unique key
+    
+    Returns:
+        int: Number of deleted rows
+    """
+    if conn.dialect.name == "postgresql":
+        match = " AND ".join(f"a.{column} = b.{column}" for column in columns)
+        result = conn.execute(text(f"DELETE FROM {table} a USING {table} b WHERE {match} AND a.id < b.id"))
+    else:
+        group_by = ", ".join(columns)
+        result = conn.execute(text(f"DELETE FROM {table} WHERE id NOT IN (SELECT MAX(id) FROM {table} GROUP BY {group_by})"))
+    return result.rowcount
+
+def _build_index_postgresql(conn, index):
+    """
+    Build an index on PostgreSQL without blocking writers.
+    
+    Args:
+        conn (Connection): Connection in autocommit mode
+        index (dict): Index definition from INDEXES
+    
+    Returns:
+        bool: True if the index exists and is valid, False otherwise
+    """
+    name = index["name"]
+    table = index["table"]
+    unique = "UNIQUE " if index["unique"] else ""
+    
+    relkind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}).scalar()
+    if relkind == "p":
+        # Partitioned tables do not support CONCURRENTLY; their indexes are
+        # created with the table and only missing ones are added here.
+        conn.execute(text(f"CREATE {unique}INDEX IF NOT EXISTS {name} ON {table} ({index['columns']})"))
+        return True
+    
+    for attempt in range(1, MAX_BUILD_ATTEMPTS + 1):
+        state = _index_state(conn, name)
+        
+        if state == "valid":
+            break
+        
+        if state == "invalid":
+            logger.warning(f"Dropping invalid index {name}")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        
+        if index.get("dedupe_on"):
+            deleted = _delete_duplicates(conn, table, index["dedupe_on"])
+            if deleted:
+                logger.info(f"Deleted {deleted} duplicate rows from {table}")
+        
+        logger.info(f"Building index {name} on {table} (attempt {attempt})")
+        try:
+            conn.execute(text(f"CREATE {unique}INDEX CONCURRENTLY {name} ON {table} ({index['columns']})"))
+        except Exception as e:
+            logger.warning(f"Error building index {name}: {e}")
+    else:
+        if _index_state(conn, name) != "valid":
+            logger.error(f"Failed to build index {name} after {MAX_BUILD_ATTEMPTS} attempts")
+            return False
+    
+    if index["unique"] and not _has_constraint(conn, table, name):
+        # Only needs a brief lock; give up instead of queueing behind long transactions
+        conn.execute(text("SET lock_timeout = '5s'"))
+        conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}"))
+        conn.execute(text("RESET lock_timeout"))
+        logger.info(f"Attached index {name} as a unique constraint")
+    
+    return True
+
+def migrate(db_url=None):
+    """
+    Create missing tables, columns and indexes on an existing database.
+    
+    On PostgreSQL indexes are built with CREATE INDEX CONCURRENTLY so that
+    ingestion keeps writing while they are built.
+    
+    Args:
+        db_url (str, optional): Database URL (default: configured database)
+    
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        engine = create_engine(db_url or get_db_url(), isolation_level="AUTOCOMMIT")
+        
+        Base.metadata.create_all(engine)
+        
+        success = True
+        with engine.connect() as conn:
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("SET statement_timeout = 0"))
+            
+            for column in COLUMNS:
+                if column["name"] not in {existing["name"] for existing in inspect(conn).get_columns(column["table"])}:
+                    if engine.dialect.name == "postgresql":
+                        # Only needs a brief lock; give up instead of queueing behind long transactions
+                        conn.execute(text("SET lock_timeout = '5s'"))
+                    conn.execute(text(f"ALTER TABLE {column['table']} ADD COLUMN {column['name']} {column['type']}"))
+                    if engine.dialect.name == "postgresql":
+                        conn.execute(text("RESET lock_timeout"))
+                    logger.info(f"Added column {column['name']} to {column['table']}")
+            
+            for index in INDEXES:
+                if engine.dialect.name == "postgresql":
+                    success = _build_index_postgresql(conn, index) and success
+                else:
+                    unique = "UNIQUE " if index["unique"] else ""
+                    if index.get("dedupe_on"):
+                        _delete_duplicates(conn, index["table"], index["dedupe_on"])
+                    conn.execute(text(
+                        f"CREATE {unique}INDEX IF NOT EXISTS {index['name']} "
+                        f"ON {index['table']} ({index['columns']})"
+                    ))
+        
+            for backfill in BACKFILLS:
+                if conn.execute(text(f"SELECT 1 FROM {backfill['table']} LIMIT 1")).first() is not None:
+                    continue
+                result = conn.execute(text(backfill["sql"]))
+                if result.rowcount:
+                    logger.info(f"Backfilled {result.rowcount} rows into {backfill['table']}")
+        
+        engine.dispose()
+        
+        if success:
+            logger.info("Database migrated successfully")
+        return success
+    except Exception as e:
+        logger.error(f"Error migrating database: {e}")
+        return False
+
+if __name__ == "__main__":
+    sys.exit(0 if migrate() else 1)
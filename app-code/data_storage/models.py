@@ -1,13 +1,15 @@
 import sys
 import os
 from datetime import datetime
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, create_engine
+from sqlalchemy import Column, Integer, Float, String, Date, DateTime, LargeBinary, ForeignKey, Index, UniqueConstraint, desc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import get_logger, get_db_url
+from utils import get_logger, load_config
+
+from database import get_engine
 
 
 logger = get_logger("data_storage_models")
@@ -30,6 +32,7 @@ class Stock(Base):
     
     historical_data = relationship("HistoricalData", back_populates="stock")
     realtime_data = relationship("RealtimeData", back_populates="stock")
+    latest_quote = relationship("LatestQuote", back_populates="stock", uselist=False)
     
     def __repr__(self):
         return f"<Stock(symbol='{self.symbol}', name='{self.name}')>"
@@ -38,6 +41,9 @@ class HistoricalData(Base):
     """Historical data model."""
     
     __tablename__ = "historical_data"
+    __table_args__ = (
+        UniqueConstraint("stock_id", "date", name="uq_historical_data_stock_id_date"),
+    )
     
     id = Column(Integer, primary_key=True)
     stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False)
@@ -55,6 +61,9 @@ class HistoricalData(Base):
     rsi = Column(Float, nullable=True)
     
     created_at = Column(DateTime, default=datetime.now)
+    # Set on every write of the row, including upserts of an existing date.
+    # Rows stored before the column was added have none.
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
     stock = relationship("Stock", back_populates="historical_data")
     
@@ -65,6 +74,9 @@ class RealtimeData(Base):
     """Real-time data model."""
     
     __tablename__ = "realtime_data"
+    __table_args__ = (
+        Index("ix_realtime_data_stock_id_timestamp", "stock_id", desc("timestamp")),
+    )
     
     id = Column(Integer, primary_key=True)
     stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False)
@@ -87,10 +99,144 @@ class RealtimeData(Base):
     def __repr__(self):
         return f"<RealtimeData(stock='{self.stock.symbol}', timestamp='{self.timestamp}', price='{self.price}')>"
 
+class LatestQuote(Base):
+    """Latest real-time data per stock, maintained on every tick write."""
+    
+    __tablename__ = "latest_quotes"
+    
+    stock_id = Column(Integer, ForeignKey("stocks.id"), primary_key=True)
+    timestamp = Column(DateTime, nullable=False)
+    price = Column(Float, nullable=False)
+    change = Column(Float, nullable=True)
+    change_percent = Column(Float, nullable=True)
+    volume = Column(Integer, nullable=True)
+    market_cap = Column(Float, nullable=True)
+    bid = Column(Float, nullable=True)
+    ask = Column(Float, nullable=True)
+    
+    shares_outstanding = Column(Float, nullable=True)
+    sentiment = Column(String, nullable=True)
+    
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    stock = relationship("Stock", back_populates="latest_quote")
+    
+    def __repr__(self):
+        return f"<LatestQuote(stock='{self.stock.symbol}', timestamp='{self.timestamp}', price='{self.price}')>"
+
+class HistoricalCoverage(Base):
+    """Date range of the historical data stored per stock."""
+    
+    __tablename__ = "historical_coverage"
+    
+    stock_id = Column(Integer, ForeignKey("stocks.id"), primary_key=True)
+    first_date = Column(Date, nullable=False)
+    last_date = Column(Date, nullable=False)
+    rows = Column(Integer, nullable=False)
+    missing_days = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    stock = relationship("Stock")
+    
+    def __repr__(self):
+        return f"<HistoricalCoverage(stock='{self.stock.symbol}', first_date='{self.first_date}', last_date='{self.last_date}')>"
+
+class HistoricalGap(Base):
+    """Range of trading days missing from the historical data of a stock."""
+    
+    __tablename__ = "historical_gaps"
+    __table_args__ = (
+        Index("ix_historical_gaps_stock_id_start_date", "stock_id", "start_date"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    missing_days = Column(Integer, nullable=False)
+    
+    stock = relationship("Stock")
+    
+    def __repr__(self):
+        return f"<HistoricalGap(stock='{self.stock.symbol}', start_date='{self.start_date}', end_date='{self.end_date}')>"
+
+class OhlcvBar(Base):
+    """OHLCV bar rolled up from real-time data."""
+    
+    __tablename__ = "ohlcv_bars"
+    __table_args__ = (
+        UniqueConstraint("stock_id", "interval", "bucket", name="uq_ohlcv_bars_stock_id_interval_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False)
+    interval = Column(String, nullable=False)
+    bucket = Column(DateTime, nullable=False)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Integer, nullable=True)
+    
+    # Needed to merge further ticks into the bar
+    open_time = Column(DateTime, nullable=False)
+    close_time = Column(DateTime, nullable=False)
+    volume_min = Column(Integer, nullable=True)
+    volume_max = Column(Integer, nullable=True)
+    tick_count = Column(Integer, nullable=False)
+    
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    stock = relationship("Stock")
+    
+    def __repr__(self):
+        return f"<OhlcvBar(stock='{self.stock.symbol}', interval='{self.interval}', bucket='{self.bucket}', close='{self.close}')>"
+
+class Watermark(Base):
+    """Progress marker of an incremental background job."""
+    
+    __tablename__ = "watermarks"
+    
+    name = Column(String, primary_key=True)
+    value = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f"<Watermark(name='{self.name}', value='{self.value}')>"
+
+class TickArchive(Base):
+    """Compressed real-time data of one stock and day."""
+    
+    __tablename__ = "tick_archive"
+    __table_args__ = (
+        UniqueConstraint("stock_id", "day", name="uq_tick_archive_stock_id_day"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    tick_count = Column(Integer, nullable=False)
+    
+    # Ticks encoded by tick_archive.encode_ticks
+    data = Column(LargeBinary, nullable=False)
+    
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    stock = relationship("Stock")
+    
+    def __repr__(self):
+        return f"<TickArchive(stock='{self.stock.symbol}', day='{self.day}', tick_count='{self.tick_count}')>"
+
 def init_db():
     """Initialize the database."""
     try:
-        engine = create_engine(get_db_url())
+        engine = get_engine()
+        
+        if load_config()["storage"]["realtime_partitioning"]["enabled"] and engine.dialect.name == "postgresql":
+            from partitioning import create_partitioned_table
+            create_partitioned_table(engine)
         
         Base.metadata.create_all(engine)
         
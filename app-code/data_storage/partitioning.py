@@ -0,0 +1,414 @@
+import sys
+import os
+import re
+import argparse
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+from sqlalchemy.schema import CreateTable
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger, load_config
+
+from database import get_engine
+from models import Base, Stock, RealtimeData
+
+
+logger = get_logger("data_storage_partitioning")
+
+INTERVALS = ("day", "week", "month")
+
+DEFAULT_PARTITION = "realtime_data_default"
+
+# SQLSTATEs of creating a table another transaction created first:
+# duplicate_table once it committed, unique_violation on the catalog if
+# both created it at the same time
+DUPLICATE_TABLE_CODES = ("42P07", "23505")
+
+def period_start(timestamp, interval):
+    """
+    Get the start of the partition period containing a timestamp.
+    
+    Args:
+        timestamp (datetime): Timestamp
+        interval (str): "day", "week" (starting Monday) or "month"
+    
+    Returns:
+        datetime: Start of the period
+    """
+    day = datetime(timestamp.year, timestamp.month, timestamp.day)
+    if interval == "day":
+        return day
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    return datetime(timestamp.year, timestamp.month, 1)
+
+def next_period(start, interval):
+    """
+    Get the start of the partition period following the one starting at start.
+    
+    Args:
+        start (datetime): Start of a period
+        interval (str): "day", "week" or "month"
+    
+    Returns:
+        datetime: Start of the next period
+    """
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(days=7)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+def is_partitioned(conn):
+    """Check whether realtime_data exists as a partitioned table."""
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass('realtime_data')")
+    ).scalar() == "p"
+
+def _table_exists(conn):
+    """Check whether realtime_data exists."""
+    return conn.execute(text("SELECT to_regclass('realtime_data')")).scalar() is not None
+
+def _create_partitioned_table(conn):
+    """
+    Create realtime_data as a table partitioned by timestamp range.
+    
+    The columns and indexes come from the RealtimeData model. The primary key
+    is widened to (id, timestamp) because unique keys of a partitioned table
+    must contain the partition key.
+    """
+    table = RealtimeData.__table__
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    ddl = ddl.replace("PRIMARY KEY (id)", "PRIMARY KEY (id, timestamp)")
+    conn.execute(text(f"{ddl} PARTITION BY RANGE (timestamp)"))
+    
+    for index in table.indexes:
+        index.create(conn)
+    
+    # Catches ticks outside the premade partitions instead of rejecting them
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF realtime_data DEFAULT"))
+    
+    logger.info("Created partitioned realtime_data table")
+
+def create_partitioned_table(engine):
+    """
+    Create realtime_data as a partitioned table if it does not exist yet.
+    
+    Must run before Base.metadata.create_all, which would otherwise create
+    a regular table.
+    
+    Args:
+        engine (Engine): PostgreSQL engine
+    
+    Returns:
+        bool: True if realtime_data is partitioned, False otherwise
+    """
+    Base.metadata.create_all(engine, tables=[Stock.__table__])
+    
+    with engine.begin() as conn:
+        if not _table_exists(conn):
+            _create_partitioned_table(conn)
+            return True
+        
+        if not is_partitioned(conn):
+            logger.warning("realtime_data is not partitioned; run 'python partitioning.py convert' to convert it")
+            return False
+        return True
+
+def _default_partition_exists(conn):
+    """Check whether realtime_data has its default partition."""
+    return conn.execute(text(f"SELECT to_regclass('{DEFAULT_PARTITION}')")).scalar() is not None
+
+def _create_partition(conn, name, start, end):
+    """
+    Create the partition of a period, moving its ticks out of the default partition.
+    
+    PostgreSQL refuses to create a partition whose range holds rows of the
+    default partition, so the default partition is detached while they are
+    moved and attached again afterwards.
+    """
+    create = f"CREATE TABLE {name} PARTITION OF realtime_data FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    in_range = "timestamp >= :start AND timestamp < :end"
+    bounds = {"start": start, "end": end}
+    
+    if not _default_partition_exists(conn) or not conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})"), bounds
+    ).scalar():
+        conn.execute(text(create))
+        return
+    
+    conn.execute(text(f"ALTER TABLE realtime_data DETACH PARTITION {DEFAULT_PARTITION}"))
+    conn.execute(text(create))
+    moved = conn.execute(text(f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds).rowcount
+    conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds)
+    conn.execute(text(f"ALTER TABLE realtime_data ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    
+    logger.info(f"Moved {moved} ticks from {DEFAULT_PARTITION} to {name}")
+
+def list_partitions(conn):
+    """
+    List the range partitions of realtime_data.
+    
+    Returns:
+        list: (name, lower bound, upper bound) tuples; bounds are None for MINVALUE/MAXVALUE
+    """
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('realtime_data') ORDER BY c.relname"
+    )).fetchall()
+    
+    partitions = []
+    for name, bound in rows:
+        if bound == "DEFAULT":
+            continue
+        lower, upper = re.match(r"FOR VALUES FROM \((.+)\) TO \((.+)\)", bound).groups()
+        partitions.append(tuple(
+            [name] + [datetime.fromisoformat(value.strip("'")) if value.startswith("'") else None for value in (lower, upper)]
+        ))
+    return partitions
+
+def ensure_partitions(conn, interval="month", premake=3, now=None):
+    """
+    Create the partitions for the current and the next premake periods.
+    
+    Args:
+        conn (Connection): PostgreSQL connection
+        interval (str, optional): Partition period
+        premake (int, optional): Number of future periods to create ahead
+        now (datetime, optional): Current time
+    
+    Returns:
+        list: Names of the created partitions
+    """
+    start = period_start(now or datetime.now(), interval)
+    existing = list_partitions(conn)
+    created = []
+    
+    for _ in range(premake + 1):
+        end = next_period(start, interval)
+        name = f"realtime_data_p{start:%Y%m%d}"
+        
+        overlaps = any(
+            (lower is None or lower < end) and (upper is None or upper > start)
+            for _, lower, upper in existing
+        )
+        if not overlaps:
+            try:
+                with conn.begin_nested():
+                    _create_partition(conn, name, start, end)
+                created.append(name)
+                logger.info(f"Created partition {name}")
+            except (IntegrityError, ProgrammingError) as e:
+                # Another process maintaining partitions created it since the listing
+                if getattr(e.orig, "pgcode", None) not in DUPLICATE_TABLE_CODES or name not in (
+                    partition for partition, _, _ in list_partitions(conn)
+                ):
+                    raise
+                logger.info(f"Partition {name} was created concurrently")
+        
+        start = end
+    
+    return created
+
+def apply_retention(conn, retention_days, now=None):
+    """
+    Drop partitions whose rows are all older than the retention period.
+    
+    Whole partitions are dropped instead of deleting rows, so expiring data
+    leaves no dead tuples behind. Ticks that landed in the default partition
+    have no partition to drop and are deleted instead.
+    
+    Args:
+        conn (Connection): PostgreSQL connection
+        retention_days (int): Number of days of ticks to keep
+        now (datetime, optional): Current time
+    
+    Returns:
+        list: Names of the dropped partitions
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    dropped = []
+    
+    for name, _, upper_bound in list_partitions(conn):
+        if upper_bound is not None and upper_bound <= cutoff:
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+            logger.info(f"Dropped partition {name} (ticks before {upper_bound.isoformat()})")
+    
+    if _default_partition_exists(conn):
+        deleted = conn.execute(
+            text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"), {"cutoff": cutoff}
+        ).rowcount
+        if deleted:
+            logger.info(f"Deleted {deleted} ticks before {cutoff.isoformat()} from {DEFAULT_PARTITION}")
+    
+    return dropped
+
+def convert_realtime_table(engine, interval="month"):
+    """
+    Convert an existing regular realtime_data table into a partitioned one.
+    
+    The old table is renamed and attached as a single partition covering
+    everything before the current period, so no rows are copied. Its CHECK
+    constraint is validated first, which lets ATTACH PARTITION skip the scan
+    under an exclusive lock.
+    
+    Args:
+        engine (Engine): PostgreSQL engine
+        interval (str, optional): Partition period
+    
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        legacy = "realtime_data_legacy"
+        boundary = period_start(datetime.now(), interval)
+        
+        with engine.begin() as conn:
+            if not _table_exists(conn) or is_partitioned(conn):
+                logger.info("realtime_data does not need to be converted")
+                return True
+            
+            newest = conn.execute(text("SELECT max(timestamp) FROM realtime_data")).scalar()
+            if newest is not None and newest >= boundary:
+                boundary = next_period(period_start(newest, interval), interval)
+            
+            conn.execute(text(
+                f"ALTER TABLE realtime_data ADD CONSTRAINT {legacy}_range "
+                f"CHECK (timestamp < '{boundary.isoformat()}') NOT VALID"
+            ))
+        
+        # Built up front so that attaching does not build the partition's
+        # copy of the (id, timestamp) primary key under an exclusive lock
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"ALTER TABLE realtime_data VALIDATE CONSTRAINT {legacy}_range"))
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {legacy}_id_timestamp "
+                "ON realtime_data (id, timestamp)"
+            ))
+        
+        with engine.begin() as conn:
+            max_id = conn.execute(text("SELECT coalesce(max(id), 0) FROM realtime_data")).scalar()
+            
+            conn.execute(text(f"ALTER TABLE realtime_data RENAME TO {legacy}"))
+            for index in RealtimeData.__table__.indexes:
+                conn.execute(text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {legacy}_{index.name}"))
+            # The partition's primary key must match the parent's (id, timestamp)
+            conn.execute(text(f"ALTER TABLE {legacy} DROP CONSTRAINT realtime_data_pkey"))
+            conn.execute(text(f"ALTER TABLE {legacy} ADD CONSTRAINT {legacy}_pkey PRIMARY KEY USING INDEX {legacy}_id_timestamp"))
+            
+            _create_partitioned_table(conn)
+            conn.execute(text(
+                f"ALTER TABLE realtime_data ATTACH PARTITION {legacy} "
+                f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat()}')"
+            ))
+            conn.execute(text(
+                "SELECT setval(pg_get_serial_sequence('realtime_data', 'id'), :max_id + 1, false)"
+            ), {"max_id": max_id})
+        
+        logger.info(f"Converted realtime_data into a partitioned table; older ticks are in {legacy}")
+        return True
+    except Exception as e:
+        logger.error(f"Error converting realtime_data: {e}")
+        return False
+
+class PartitionManager:
+    """Keeps realtime_data partitions ahead of time and expires old ones."""
+    
+    def __init__(self, engine, interval="month", premake=3, retention_days=None, maintenance_interval_s=3600):
+        """
+        Initialize the partition manager.
+        
+        Args:
+            engine (Engine): PostgreSQL engine
+            interval (str, optional): Partition period: "day", "week" or "month"
+            premake (int, optional): Number of future periods to create ahead
+            retention_days (int, optional): Days of ticks to keep (default: keep everything)
+            maintenance_interval_s (int, optional): Seconds between maintenance runs
+        """
+        if interval not in INTERVALS:
+            raise ValueError(f"Invalid partition interval: {interval}")
+        
+        self.logger = logger
+        self.engine = engine
+        self.interval = interval
+        self.premake = premake
+        self.retention_days = retention_days
+        self.maintenance_interval_s = maintenance_interval_s
+        
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def run_maintenance(self, now=None):
+        """
+        Create upcoming partitions and drop expired ones.
+        
+        Retention runs even if creating partitions fails, so a failure there
+        does not let old ticks pile up.
+        
+        Args:
+            now (datetime, optional): Current time
+        
+        Returns:
+            dict: Created and dropped partition names, or None if either step failed
+        """
+        created = dropped = None
+        
+        try:
+            with self.engine.begin() as conn:
+                created = ensure_partitions(conn, self.interval, self.premake, now)
+        except Exception as e:
+            self.logger.error(f"Error creating realtime_data partitions: {e}")
+        
+        try:
+            dropped = []
+            if self.retention_days:
+                with self.engine.begin() as conn:
+                    dropped = apply_retention(conn, self.retention_days, now)
+        except Exception as e:
+            self.logger.error(f"Error expiring realtime_data partitions: {e}")
+            dropped = None
+        
+        if created is None or dropped is None:
+            return None
+        return {"created": created, "dropped": dropped}
+    
+    def _run(self):
+        """Run maintenance until stopped."""
+        while not self._stopped.wait(self.maintenance_interval_s):
+            self.run_maintenance()
+    
+    def start(self):
+        """Run maintenance now and then periodically in a background thread."""
+        self.run_maintenance()
+        
+        self._thread = threading.Thread(target=self._run, name="realtime_partition_maintenance", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the maintenance thread."""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain realtime_data partitions")
+    parser.add_argument("command", nargs="?", choices=["maintain", "convert"], default="maintain")
+    args = parser.parse_args()
+    
+    settings = load_config()["storage"]["realtime_partitioning"]
+    engine = get_engine()
+    
+    if args.command == "convert" and not convert_realtime_table(engine, settings["interval"]):
+        sys.exit(1)
+    
+    manager = PartitionManager(
+        engine,
+        interval=settings["interval"],
+        premake=settings["premake"],
+        retention_days=settings["retention_days"]
+    )
+    sys.exit(0 if manager.run_maintenance() is not None else 1)
@@ -1,36 +1,271 @@
 import sys
 import os
-from datetime import datetime
-from sqlalchemy import create_engine, desc
+import io
+import csv
+import json
+import time
+import base64
+import hashlib
+import atexit
+import bisect
+import heapq
+import threading
+from datetime import date, datetime, timedelta
+from sqlalchemy import desc, func, select, case, text, literal_column, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import IntegrityError
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import get_logger, get_db_url
+from utils import get_logger, load_config
 
 
-from models import Base, Stock, HistoricalData, RealtimeData
+from database import ReplicaRouter, get_engine, get_pool_stats, get_replica_router
+from models import Base, Stock, HistoricalData, HistoricalCoverage, HistoricalGap, RealtimeData, LatestQuote, OhlcvBar, Watermark, TickArchive
+from write_buffer import WriteBehindBuffer
+from partitioning import PartitionManager, create_partitioned_table
+from bars import BAR_INTERVALS, BarRollupScheduler, aggregate_ticks, bucket_start
+from coverage import find_gaps, last_trading_day, plan_fetches, trading_days
+from indicators import INDICATOR_LOOKBACK_ROWS, INDICATOR_WINDOWS, IndicatorState
+from tick_archive import decode_ticks, encode_ticks
 
 
 logger = get_logger("data_storage_repository")
 
+# Rows per INSERT ... ON CONFLICT statement in bulk upserts. Each historical
+# row binds 12 parameters, which keeps a chunk well below driver limits.
+HISTORICAL_UPSERT_CHUNK_SIZE = 1000
+
+# Real-time writes of at least this many rows go through COPY on PostgreSQL.
+REALTIME_COPY_MIN_ROWS = 50
+
+# Columns shared by realtime_data and latest_quotes
+QUOTE_COLUMNS = [
+    "timestamp", "price", "change", "change_percent", "volume", "market_cap",
+    "bid", "ask", "shares_outstanding", "sentiment"
+]
+
+# Point-in-time quote per (index, stock_id, ts) triple. Each row of the
+# unnested arrays is answered by a backward index seek on
+# (stock_id, timestamp).
+QUOTE_ASOF_SQL = text(
+    "SELECT q.idx, " + ", ".join(f"r.{column}" for column in QUOTE_COLUMNS) + " "
+    "FROM unnest(CAST(:indexes AS integer[]), CAST(:stock_ids AS integer[]), CAST(:timestamps AS timestamp[])) "
+    "AS q(idx, stock_id, ts) "
+    "JOIN LATERAL ("
+    "SELECT " + ", ".join(QUOTE_COLUMNS) + " FROM realtime_data "
+    "WHERE stock_id = q.stock_id AND timestamp <= q.ts "
+    "ORDER BY timestamp DESC LIMIT 1"
+    ") r ON true"
+)
+
+# Latest archived day per (index, stock_id, ts) triple that has a tick at
+# or before the time, found by a backward index seek on (stock_id, day).
+TICK_ARCHIVE_ASOF_SQL = text(
+    "SELECT q.idx, a.id, a.last_timestamp "
+    "FROM unnest(CAST(:indexes AS integer[]), CAST(:stock_ids AS integer[]), CAST(:timestamps AS timestamp[])) "
+    "AS q(idx, stock_id, ts) "
+    "JOIN LATERAL ("
+    "SELECT id, last_timestamp FROM tick_archive "
+    "WHERE stock_id = q.stock_id AND day <= CAST(q.ts AS date) AND first_timestamp <= q.ts "
+    "ORDER BY day DESC LIMIT 1"
+    ") a ON true"
+)
+
+# Stored indicators of historical_data
+INDICATOR_COLUMNS = ["ma5", "ma20", "daily_return", "volatility", "rsi"]
+
+# Indicator update of one stock from parallel arrays, in one statement
+# rather than a round trip per row.
+INDICATOR_UPDATE_SQL = text(
+    "UPDATE historical_data AS h SET " + ", ".join(f"{column} = v.{column}" for column in INDICATOR_COLUMNS) + " "
+    ", updated_at = :updated_at "
+    "FROM unnest(CAST(:dates AS timestamp[]), " + ", ".join(f"CAST(:{column} AS double precision[])" for column in INDICATOR_COLUMNS) + ") "
+    "AS v(date, " + ", ".join(INDICATOR_COLUMNS) + ") "
+    "WHERE h.stock_id = :stock_id AND h.date = v.date "
+    # Rows whose indicators are unchanged are left alone, and so are not exported again
+    "AND (" + ", ".join(f"h.{column}" for column in INDICATOR_COLUMNS) + ") "
+    "IS DISTINCT FROM (" + ", ".join(f"v.{column}" for column in INDICATOR_COLUMNS) + ")"
+)
+
+# Rows per indicator UPDATE statement, bounding the size of its arrays.
+INDICATOR_UPDATE_CHUNK_SIZE = 10000
+
+# Fields of historical records besides symbol and date, in output order
+HISTORICAL_FIELDS = [
+    "open", "high", "low", "close", "volume",
+    "ma5", "ma20", "daily_return", "volatility", "rsi"
+]
+
+# Columns of ohlcv_bars besides its key
+BAR_COLUMNS = [
+    "open", "high", "low", "close", "volume",
+    "open_time", "close_time", "volume_min", "volume_max", "tick_count"
+]
+
+# Rows per INSERT ... ON CONFLICT statement when writing rolled up bars.
+BAR_UPSERT_CHUNK_SIZE = 1000
+
+# Watermarks table entry of the bar catch-up rollup.
+BARS_WATERMARK = "ohlcv_bars"
+
+# Transaction-level advisory locks serializing the bar roll-up of each
+# stock, taken in stock id order so that writers of overlapping stocks
+# cannot deadlock. The first key, "bars" in ASCII, keeps them apart from
+# other advisory locks; the stock id is the second.
+BARS_LOCK_SQL = text(
+    "SELECT pg_advisory_xact_lock(1650553459, stock_id) "
+    "FROM (SELECT DISTINCT unnest(CAST(:stock_ids AS integer[])) AS stock_id ORDER BY 1) AS stocks"
+)
+
+def encode_cursor(date):
+    """
+    Encode the date of the last returned record as an opaque page cursor.
+    
+    Args:
+        date (datetime): Date of the last record of a page
+    
+    Returns:
+        str: URL-safe cursor
+    """
+    payload = json.dumps({"date": date.isoformat()}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    Decode a page cursor created by encode_cursor.
+    
+    Args:
+        cursor (str): URL-safe cursor
+    
+    Returns:
+        datetime: Date of the last record of the previous page
+    
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return datetime.fromisoformat(json.loads(payload)["date"])
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
 class Repository:
     """Repository for data storage."""
     
-    def __init__(self):
+    def __init__(self, write_behind=None, partitioning=None, bars=None, replicas=None, materialize_indicators=None,
+                 partition_maintenance=False):
+        """
+        Initialize the repository.
+        
+        Args:
+            write_behind (dict, optional): Write-behind settings for real-time
+                data (default: storage.write_behind from the configuration)
+            partitioning (dict, optional): Time partitioning settings for
+                realtime_data on PostgreSQL (default:
+                storage.realtime_partitioning from the configuration)
+            bars (dict, optional): OHLCV bar rollup settings (default:
+                storage.bars from the configuration)
+            replicas (list, optional): Read replica URLs for read-only methods
+                (default: db.replicas from the configuration)
+            materialize_indicators (bool, optional): Whether historical writes
+                recompute the indicator columns (default:
+                storage.materialize_indicators from the configuration)
+            partition_maintenance (bool, optional): Whether to create and
+                expire realtime_data partitions in a background thread. Only
+                the long-running API service does; other processes leave it
+                to that service or to 'python partitioning.py'
+        """
         self.logger = logger
         self.engine = None
         self.Session = None
+        self.write_buffer = None
+        self.partition_manager = None
+        self.partition_maintenance = partition_maintenance
+        self.partitioning = partitioning if partitioning is not None else load_config()["storage"]["realtime_partitioning"]
+        self.bars = bars if bars is not None else load_config()["storage"]["bars"]
+        self.bar_scheduler = None
+        
+        # The engine and the configured replica router are shared by every
+        # repository in the process; only a router made here is disposed on close
+        self._owns_replicas = bool(replicas)
+        if replicas is None:
+            self.replicas = get_replica_router()
+        elif replicas:
+            db = load_config()["db"]
+            self.replicas = ReplicaRouter(replicas, db["replica_max_lag_s"], db["replica_check_interval_s"])
+        else:
+            self.replicas = None
+        
+        for interval in self.bars.get("intervals", []):
+            if interval not in BAR_INTERVALS:
+                raise ValueError(f"Invalid bar interval: {interval}")
+        
+        # symbol -> stocks.id, shared by all request threads
+        self._stock_ids = {}
+        self._stock_ids_lock = threading.Lock()
+        self.stock_id_hits = 0
+        self.stock_id_misses = 0
+        
+        # Cached stock universe for get_stocks; the generation is bumped
+        # whenever a stock is inserted
+        self._stocks = None
+        self._stocks_loaded_at = None
+        self._stocks_generation = 0
+        self._stocks_lock = threading.Lock()
+        self.stocks_cache_ttl_s = load_config()["storage"]["stocks_cache_ttl_s"]
+        self.tick_archive_after_days = load_config()["storage"]["tick_archive_after_days"]
+        self.materialize_on_write = materialize_indicators if materialize_indicators is not None else load_config()["storage"]["materialize_indicators"]
+        
+        # (kind, symbol) -> (version, time of the last write), bumped after
+        # every committed write so that cached reads can tell they are stale
+        self._data_versions = {}
+        self._data_versions_lock = threading.Lock()
+        
         self.init_db()
+        
+        if write_behind is None:
+            write_behind = load_config()["storage"]["write_behind"]
+        if write_behind.get("enabled"):
+            self.write_buffer = WriteBehindBuffer(
+                self._flush_realtime_rows,
+                flush_interval_ms=write_behind.get("flush_interval_ms", 200),
+                flush_rows=write_behind.get("flush_rows", 1000),
+                max_rows=write_behind.get("max_rows", 100000),
+                max_retries=write_behind.get("max_retries", 5),
+                retry_backoff_ms=write_behind.get("retry_backoff_ms", 100),
+                name="realtime_write_behind"
+            )
+            atexit.register(self.close)
+            self.logger.info("Write-behind enabled for real-time data")
+        
+        if self.bars.get("mode") == "catchup":
+            self.bar_scheduler = BarRollupScheduler(self.rollup_realtime_data, self.bars.get("catchup_interval_s", 60))
+            self.bar_scheduler.start()
     
     def init_db(self):
         """Initialize the database."""
         try:
-            self.engine = create_engine(get_db_url())
+            self.engine = get_engine()
+            
+            if self.partitioning.get("enabled") and self.engine.dialect.name == "postgresql":
+                if create_partitioned_table(self.engine) and self.partition_maintenance:
+                    self.partition_manager = PartitionManager(
+                        self.engine,
+                        interval=self.partitioning.get("interval", "month"),
+                        premake=self.partitioning.get("premake", 3),
+                        retention_days=self.partitioning.get("retention_days"),
+                        maintenance_interval_s=self.partitioning.get("maintenance_interval_s", 3600)
+                    )
             
             Base.metadata.create_all(self.engine)
             
-            self.Session = sessionmaker(bind=self.engine)
+            if self.partition_manager:
+                self.partition_manager.start()
+            
+            self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+            
+            self._load_stock_ids()
             
             self.logger.info("Database initialized successfully")
             return True
@@ -38,6 +273,86 @@ class Repository:
             self.logger.error(f"Error initializing database: {e}")
             return False
     
+    def _insert(self, table):
+        """
+        Get a dialect-specific INSERT construct supporting ON CONFLICT.
+        
+        Args:
+            table (Table): Target table
+        
+        Returns:
+            Insert: INSERT statement for the table
+        """
+        if self.engine.dialect.name == "postgresql":
+            return postgresql.insert(table)
+        return sqlite.insert(table)
+    
+    def _load_stock_ids(self):
+        """Preload the symbol to stock id registry from the stocks table."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(Stock.__table__.c.symbol, Stock.__table__.c.id)).fetchall()
+        
+        with self._stock_ids_lock:
+            self._stock_ids.update({symbol: stock_id for symbol, stock_id in rows})
+        
+        self.logger.info(f"Loaded {len(rows)} stocks into the registry")
+    
+    def get_stock_id(self, symbol, create=True):
+        """
+        Get the stock id for a symbol from the in-process registry.
+        
+        The stocks table is only queried the first time a symbol is seen.
+        New symbols are inserted with INSERT ... ON CONFLICT DO NOTHING
+        followed by a SELECT, so concurrent writers agree on one row.
+        
+        Args:
+            symbol (str): Stock symbol
+            create (bool, optional): Create the stock if it does not exist
+        
+        Returns:
+            int: Stock id, or None if the stock does not exist
+        """
+        with self._stock_ids_lock:
+            stock_id = self._stock_ids.get(symbol)
+            if stock_id is not None:
+                self.stock_id_hits += 1
+                return stock_id
+            self.stock_id_misses += 1
+        
+        table = Stock.__table__
+        with self.engine.begin() as conn:
+            if create:
+                inserted = conn.execute(
+                    self._insert(table).values(symbol=symbol).on_conflict_do_nothing(index_elements=[table.c.symbol])
+                )
+                if inserted.rowcount:
+                    self.logger.info(f"Created new stock: {symbol}")
+                    self._invalidate_stocks()
+            
+            stock_id = conn.execute(select(table.c.id).where(table.c.symbol == symbol)).scalar()
+        
+        if stock_id is None:
+            return None
+        
+        with self._stock_ids_lock:
+            return self._stock_ids.setdefault(symbol, stock_id)
+    
+    def get_stock_registry_stats(self):
+        """
+        Get statistics of the symbol to stock id registry.
+        
+        Returns:
+            dict: Registry size, hits, misses and hit ratio
+        """
+        with self._stock_ids_lock:
+            lookups = self.stock_id_hits + self.stock_id_misses
+            return {
+                "size": len(self._stock_ids),
+                "hits": self.stock_id_hits,
+                "misses": self.stock_id_misses,
+                "hit_ratio": self.stock_id_hits / lookups if lookups else None
+            }
+    
     def get_or_create_stock(self, symbol, name=None, sector=None, industry=None):
         """
         Get or create a stock.
@@ -66,9 +381,13 @@ class Repository:
                 session.add(stock)
                 session.commit()
                 self.logger.info(f"Created new stock: {symbol}")
+                self._invalidate_stocks()
             
             session.close()
             
+            with self._stock_ids_lock:
+                self._stock_ids.setdefault(symbol, stock.id)
+            
             return stock
         except Exception as e:
             self.logger.error(f"Error getting or creating stock: {e}")
@@ -77,6 +396,101 @@ class Repository:
                 session.close()
             return None
     
+    def _touch_symbols(self, kind, symbols):
+        """
+        Record committed writes for symbols.
+        
+        Args:
+            kind (str): "historical" or "realtime" (ticks, quotes and bars)
+            symbols (list): Stock symbols written to
+        """
+        now = datetime.now()
+        with self._data_versions_lock:
+            for symbol in set(symbols):
+                version, _ = self._data_versions.get((kind, symbol), (0, None))
+                self._data_versions[(kind, symbol)] = (version + 1, now)
+    
+    def get_data_version(self, kind, symbol):
+        """
+        Get the version of a symbol's data as seen by this process.
+        
+        The version grows with every write committed through this
+        repository, so it can key cached reads of the symbol.
+        
+        Args:
+            kind (str): "historical" or "realtime" (ticks, quotes and bars)
+            symbol (str): Stock symbol
+        
+        Returns:
+            tuple: Version and time of the last write (None before the first write)
+        """
+        with self._data_versions_lock:
+            return self._data_versions.get((kind, symbol), (0, None))
+    
+    def _invalidate_stocks(self):
+        """Drop the cached stock universe after a stock was inserted."""
+        with self._stocks_lock:
+            self._stocks = None
+            self._stocks_generation += 1
+    
+    def _load_stocks(self):
+        """
+        Get the cached stock universe, reloading it from the primary when it
+        was invalidated or is older than the cache TTL.
+        
+        The TTL picks up stocks inserted by other processes.
+        
+        Returns:
+            tuple: Stocks ordered by symbol and a hash of their content
+        """
+        with self._stocks_lock:
+            if self._stocks is not None and time.monotonic() - self._stocks_loaded_at < self.stocks_cache_ttl_s:
+                return self._stocks
+            generation = self._stocks_generation
+        
+        table = Stock.__table__
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.symbol, table.c.name, table.c.sector, table.c.industry).order_by(table.c.symbol)
+            ).fetchall()
+        
+        stocks = [dict(row._mapping) for row in rows]
+        digest = hashlib.sha1(json.dumps(stocks).encode()).hexdigest()
+        
+        with self._stocks_lock:
+            # Not cached if a stock was inserted while loading
+            if generation == self._stocks_generation:
+                self._stocks = (stocks, digest)
+                self._stocks_loaded_at = time.monotonic()
+        
+        return stocks, digest
+    
+    def get_stocks(self, sector=None, industry=None):
+        """
+        Get the stock universe.
+        
+        Args:
+            sector (str, optional): Only stocks in this sector (case-insensitive)
+            industry (str, optional): Only stocks in this industry (case-insensitive)
+        
+        Returns:
+            dict: Stocks ordered by symbol and an ETag of the result, or None on error
+        """
+        try:
+            stocks, digest = self._load_stocks()
+            
+            if sector:
+                stocks = [stock for stock in stocks if (stock["sector"] or "").lower() == sector.lower()]
+            if industry:
+                stocks = [stock for stock in stocks if (stock["industry"] or "").lower() == industry.lower()]
+            
+            etag = hashlib.sha1(f"{digest}:{(sector or '').lower()}:{(industry or '').lower()}".encode()).hexdigest()
+            
+            return {"data": stocks, "etag": etag}
+        except Exception as e:
+            self.logger.error(f"Error getting stocks: {e}")
+            return None
+    
     def store_historical_data(self, symbol, data):
         """
         Store historical data.
@@ -91,15 +505,17 @@ class Repository:
         try:
             session = self.Session()
             
-            stock = self.get_or_create_stock(symbol)
-            if not stock:
+            stock_id = self.get_stock_id(symbol)
+            if stock_id is None:
                 return False
             
+            dates = []
             for item in data:
                 date = datetime.fromisoformat(item["date"]) if isinstance(item["date"], str) else item["date"]
+                dates.append(date)
                 
                 existing = session.query(HistoricalData).filter_by(
-                    stock_id=stock.id,
+                    stock_id=stock_id,
                     date=date
                 ).first()
                 
@@ -122,7 +538,7 @@ class Repository:
                         existing.rsi = item["rsi"]
                 else:
                     historical_data = HistoricalData(
-                        stock_id=stock.id,
+                        stock_id=stock_id,
                         date=date,
                         open=item["open"],
                         high=item["high"],
@@ -141,6 +557,12 @@ class Repository:
             
             session.close()
             
+            if self.materialize_on_write and dates:
+                self.materialize_indicators([symbol], since=min(dates))
+            self._touch_symbols("historical", [symbol])
+            if dates:
+                self.refresh_coverage([symbol], since=min(dates))
+            
             self.logger.info(f"Stored {len(data)} historical data records for {symbol}")
             return True
         except Exception as e:
@@ -150,139 +572,1743 @@ class Repository:
                 session.close()
             return False
     
-    def store_realtime_data(self, data):
+    def _historical_upsert(self, rows):
         """
-        Store real-time data.
+        Build an INSERT ... ON CONFLICT (stock_id, date) DO UPDATE of historical rows.
+        
+        Indicator columns that are None in a row keep their stored values.
         
         Args:
-            data (dict): Real-time data
+            rows (list): Rows for the historical_data table including
+                updated_at, at most one per (stock_id, date)
         
         Returns:
-            bool: True if successful, False otherwise
+            Insert: Upsert statement
+        """
+        table = HistoricalData.__table__
+        stmt = self._insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.stock_id, table.c.date],
+            set_={
+                "open": stmt.excluded.open,
+                "high": stmt.excluded.high,
+                "low": stmt.excluded.low,
+                "close": stmt.excluded.close,
+                "volume": stmt.excluded.volume,
+                "ma5": func.coalesce(stmt.excluded.ma5, table.c.ma5),
+                "ma20": func.coalesce(stmt.excluded.ma20, table.c.ma20),
+                "daily_return": func.coalesce(stmt.excluded.daily_return, table.c.daily_return),
+                "volatility": func.coalesce(stmt.excluded.volatility, table.c.volatility),
+                "rsi": func.coalesce(stmt.excluded.rsi, table.c.rsi),
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+    
+    def bulk_upsert_historical_data(self, symbol, data, chunk_size=HISTORICAL_UPSERT_CHUNK_SIZE):
+        """
+        Store historical data with set-based upserts.
+        
+        Each chunk of rows is sent as a single
+        INSERT ... ON CONFLICT (stock_id, date) DO UPDATE statement and all
+        chunks are committed in one transaction. Indicator columns that are
+        missing or None in the input keep their stored values, unless they
+        are materialized on write.
+        
+        Args:
+            symbol (str): Stock symbol
+            data (list): Historical data
+            chunk_size (int, optional): Maximum number of rows per statement
+        
+        Returns:
+            dict: Per-batch and total inserted/updated counts, or None on error
         """
         try:
-            session = self.Session()
+            stock_id = self.get_stock_id(symbol)
+            if stock_id is None:
+                return None
             
-            symbol = data.get("symbol")
-            if not symbol:
-                self.logger.error("Symbol is required for real-time data")
-                return False
+            # ON CONFLICT cannot touch the same row twice in one statement,
+            # so duplicate dates collapse to the last occurrence.
+            now = datetime.now()
+            rows = {}
+            for item in data:
+                date = datetime.fromisoformat(item["date"]) if isinstance(item["date"], str) else item["date"]
+                rows[date] = {
+                    "stock_id": stock_id,
+                    "date": date,
+                    "open": item["open"],
+                    "high": item["high"],
+                    "low": item["low"],
+                    "close": item["close"],
+                    "volume": item["volume"],
+                    "ma5": item.get("ma5"),
+                    "ma20": item.get("ma20"),
+                    "daily_return": item.get("daily_return"),
+                    "volatility": item.get("volatility"),
+                    "rsi": item.get("rsi"),
+                    "created_at": now,
+                    "updated_at": now
+                }
+            rows = list(rows.values())
             
-            stock = self.get_or_create_stock(symbol)
-            if not stock:
-                return False
+            table = HistoricalData.__table__
+            is_postgresql = self.engine.dialect.name == "postgresql"
+            batches = []
             
-            timestamp = datetime.fromisoformat(data["timestamp"]) if isinstance(data["timestamp"], str) else data["timestamp"]
-            
-            realtime_data = RealtimeData(
-                stock_id=stock.id,
-                timestamp=timestamp,
-                price=data["price"],
-                change=data.get("change"),
-                change_percent=data.get("change_percent"),
-                volume=data.get("volume"),
-                market_cap=data.get("market_cap"),
-                bid=data.get("bid"),
-                ask=data.get("ask"),
-                shares_outstanding=data.get("shares_outstanding"),
-                sentiment=data.get("sentiment")
-            )
-            session.add(realtime_data)
+            with self.engine.begin() as conn:
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    
+                    stmt = self._historical_upsert(chunk)
+                    
+                    if is_postgresql:
+                        # xmax is 0 only for tuples created by this statement
+                        stmt = stmt.returning(literal_column("xmax = 0").label("inserted"))
+                        inserted = sum(1 for row in conn.execute(stmt) if row.inserted)
+                    else:
+                        existing = conn.execute(
+                            select(func.count()).select_from(table).where(
+                                table.c.stock_id == stock_id,
+                                table.c.date.in_([row["date"] for row in chunk])
+                            )
+                        ).scalar()
+                        conn.execute(stmt)
+                        inserted = len(chunk) - existing
+                    
+                    batches.append({
+                        "rows": len(chunk),
+                        "inserted": inserted,
+                        "updated": len(chunk) - inserted
+                    })
             
-            session.commit()
+            result = {
+                "symbol": symbol,
+                "rows": len(rows),
+                "inserted": sum(batch["inserted"] for batch in batches),
+                "updated": sum(batch["updated"] for batch in batches),
+                "batches": batches
+            }
             
-            session.close()
+            if self.materialize_on_write and rows:
+                self.materialize_indicators([symbol], since=min(row["date"] for row in rows))
+            self._touch_symbols("historical", [symbol])
+            if rows:
+                self.refresh_coverage([symbol], since=min(row["date"] for row in rows))
             
-            self.logger.info(f"Stored real-time data for {symbol}")
-            return True
+            self.logger.info(f"Bulk upserted {len(rows)} historical data records for {symbol} in {len(batches)} batches")
+            return result
         except Exception as e:
-            self.logger.error(f"Error storing real-time data: {e}")
-            if session:
-                session.rollback()
-                session.close()
-            return False
+            self.logger.error(f"Error bulk upserting historical data: {e}")
+            return None
     
-    def get_historical_data(self, symbol, limit=100):
+    def merge_historical_rows(self, rows):
         """
-        Get historical data for a symbol.
+        Upsert historical rows of any number of stocks in one transaction.
+        
+        On PostgreSQL the rows are copied into a temporary staging table
+        with COPY and merged with a single INSERT ... SELECT ... ON CONFLICT;
+        elsewhere they go through chunked upserts. Duplicate (stock_id, date)
+        rows collapse to the last one. Unlike bulk_upsert_historical_data
+        this neither materializes indicators nor refreshes coverage, so a
+        caller importing many chunks does that once at the end.
         
         Args:
-            symbol (str): Stock symbol
-            limit (int, optional): Maximum number of records to return
+            rows (list): Rows with stock_id, date (datetime), open, high, low,
+                close, volume and optionally the indicator columns
         
         Returns:
-            list: Historical data
+            dict: Rows merged and inserted/updated counts (None where the
+                database cannot tell them apart), or None on error
         """
         try:
-            session = self.Session()
+            columns = ["stock_id", "date", *HISTORICAL_FIELDS]
             
-            stock = session.query(Stock).filter_by(symbol=symbol).first()
-            if not stock:
-                self.logger.error(f"Stock not found: {symbol}")
-                return []
+            if self.engine.dialect.name != "postgresql":
+                unique = {}
+                for row in rows:
+                    unique[(row["stock_id"], row["date"])] = {column: row.get(column) for column in columns}
+                now = datetime.now()
+                unique = [{**row, "created_at": now, "updated_at": now} for row in unique.values()]
+                
+                with self.engine.begin() as conn:
+                    for start in range(0, len(unique), HISTORICAL_UPSERT_CHUNK_SIZE):
+                        conn.execute(self._historical_upsert(unique[start:start + HISTORICAL_UPSERT_CHUNK_SIZE]))
+                return {"rows": len(unique), "inserted": None, "updated": None}
             
-            query = session.query(HistoricalData).filter_by(stock_id=stock.id).order_by(desc(HistoricalData.date)).limit(limit)
-            data = query.all()
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for line, row in enumerate(rows):
+                writer.writerow([row.get(column) for column in columns] + [line])
+            buffer.seek(0)
             
-            result = []
-            for item in data:
-                result.append({
-                    "symbol": symbol,
-                    "date": item.date.isoformat(),
-                    "open": item.open,
-                    "high": item.high,
-                    "low": item.low,
-                    "close": item.close,
-                    "volume": item.volume,
-                    "ma5": item.ma5,
-                    "ma20": item.ma20,
-                    "daily_return": item.daily_return,
-                    "volatility": item.volatility,
-                    "rsi": item.rsi
+            indicators = ("ma5", "ma20", "daily_return", "volatility", "rsi")
+            updates = [f"{column} = EXCLUDED.{column}" for column in ("open", "high", "low", "close", "volume")]
+            updates += [f"{column} = coalesce(EXCLUDED.{column}, historical_data.{column})" for column in indicators]
+            updates.append("updated_at = EXCLUDED.updated_at")
+            
+            # Stamped by the application clock like bulk_upsert_historical_data
+            now = datetime.now()
+            
+            with self.engine.begin() as conn:
+                conn.execute(text(
+                    "CREATE TEMP TABLE historical_import ("
+                    "stock_id integer, date timestamp, open double precision, high double precision, "
+                    "low double precision, close double precision, volume bigint, "
+                    + ", ".join(f"{column} double precision" for column in indicators)
+                    + ", line bigint) ON COMMIT DROP"
+                ))
+                
+                cursor = conn.connection.cursor()
+                try:
+                    cursor.copy_expert(
+                        f"COPY historical_import ({', '.join(columns)}, line) FROM STDIN WITH (FORMAT csv)",
+                        buffer
+                    )
+                finally:
+                    cursor.close()
+                
+                inserted, merged = conn.execute(text(
+                    f"WITH merged AS ("
+                    f"INSERT INTO historical_data ({', '.join(columns)}, created_at, updated_at) "
+                    f"SELECT DISTINCT ON (stock_id, date) {', '.join(columns)}, CAST(:now AS timestamp), CAST(:now AS timestamp) "
+                    f"FROM historical_import ORDER BY stock_id, date, line DESC "
+                    f"ON CONFLICT (stock_id, date) DO UPDATE SET {', '.join(updates)} "
+                    f"RETURNING xmax = 0 AS inserted"
+                    f") SELECT count(*) FILTER (WHERE inserted), count(*) FROM merged"
+                ), {"now": now}).one()
+            
+            return {"rows": merged, "inserted": inserted, "updated": merged - inserted}
+        except Exception as e:
+            self.logger.error(f"Error merging historical data: {e}")
+            return None
+    
+    def _refresh_stock_coverage(self, conn, stock_id, since=None):
+        """
+        Refresh the coverage row and gaps of a stock within an open transaction.
+        
+        With since, only the gaps from the trading day before since (or the
+        stored last date, if earlier) on are recomputed and the coverage row
+        is updated from its stored totals; writes never delete rows, so the
+        gaps before that day are unchanged. Otherwise, or if the stock has
+        no coverage row yet, everything is rebuilt from all stored dates.
+        
+        Args:
+            conn (Connection): Connection with an open transaction
+            stock_id (int): Stock id
+            since (datetime, optional): Earliest date written since the last refresh
+        """
+        table = HistoricalData.__table__
+        coverage = HistoricalCoverage.__table__
+        gaps_table = HistoricalGap.__table__
+        
+        stored = None
+        if since is not None:
+            stored = conn.execute(select(coverage).where(coverage.c.stock_id == stock_id)).first()
+            since = since.date() if isinstance(since, datetime) else since
+        
+        start = None
+        if stored is not None:
+            start = min(last_trading_day(since - timedelta(days=1)), stored.last_date)
+            if start <= stored.first_date:
+                start = None
+        
+        if start is None:
+            dates = {value.date() for value in conn.execute(select(table.c.date).where(table.c.stock_id == stock_id)).scalars()}
+            
+            conn.execute(gaps_table.delete().where(gaps_table.c.stock_id == stock_id))
+            if not dates:
+                conn.execute(coverage.delete().where(coverage.c.stock_id == stock_id))
+                return
+            
+            gaps = find_gaps(dates)
+            first_date, rows, missing_days = min(dates), len(dates), 0
+        else:
+            # A gap running into the window is recomputed as a whole
+            replaced = conn.execute(
+                select(gaps_table.c.start_date, gaps_table.c.missing_days)
+                .where(gaps_table.c.stock_id == stock_id, gaps_table.c.end_date >= start)
+            ).fetchall()
+            start = min([start] + [gap.start_date for gap in replaced])
+            boundary = datetime.combine(start, datetime.min.time())
+            
+            dates = {
+                value.date() for value in conn.execute(
+                    select(table.c.date).where(table.c.stock_id == stock_id, table.c.date >= boundary)
+                ).scalars()
+            }
+            before = conn.execute(
+                select(func.count()).select_from(table).where(table.c.stock_id == stock_id, table.c.date < boundary)
+            ).scalar()
+            
+            conn.execute(gaps_table.delete().where(gaps_table.c.stock_id == stock_id, gaps_table.c.end_date >= start))
+            
+            gaps = find_gaps(dates, start=start, end=max(dates))
+            first_date = stored.first_date
+            rows = before + len(dates)
+            missing_days = stored.missing_days - sum(gap.missing_days for gap in replaced)
+        
+        if gaps:
+            conn.execute(gaps_table.insert(), [
+                {"stock_id": stock_id, "start_date": first, "end_date": last, "missing_days": days}
+                for first, last, days in gaps
+            ])
+        
+        stmt = self._insert(coverage).values(
+            stock_id=stock_id,
+            first_date=first_date,
+            last_date=max(dates),
+            rows=rows,
+            missing_days=missing_days + sum(days for _, _, days in gaps),
+            updated_at=datetime.now()
+        )
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[coverage.c.stock_id],
+            set_={column: stmt.excluded[column] for column in ("first_date", "last_date", "rows", "missing_days", "updated_at")}
+        ))
+    
+    def refresh_coverage(self, symbols=None, since=None):
+        """
+        Refresh the coverage index of historical data.
+        
+        Historical writes refresh the symbols they touch from the earliest
+        date they wrote; without since the index is rebuilt from all stored
+        dates, which is also the way to build it for data stored before it
+        existed.
+        
+        Args:
+            symbols (list, optional): Stock symbols (default: every stock with historical data)
+            since (datetime, optional): Earliest date written (default: rebuild everything)
+        
+        Returns:
+            int: Number of stocks refreshed, or None on error
+        """
+        try:
+            if symbols is None:
+                with self.engine.connect() as conn:
+                    stock_ids = conn.execute(select(HistoricalData.__table__.c.stock_id).distinct()).scalars().all()
+            else:
+                stock_ids = [self.get_stock_id(symbol, create=False) for symbol in symbols]
+            
+            refreshed = 0
+            for stock_id in stock_ids:
+                if stock_id is None:
+                    continue
+                with self.engine.begin() as conn:
+                    self._refresh_stock_coverage(conn, stock_id, since)
+                refreshed += 1
+            
+            if symbols is None:
+                self.logger.info(f"Refreshed historical coverage of {refreshed} stocks")
+            return refreshed
+        except Exception as e:
+            self.logger.error(f"Error refreshing historical coverage: {e}")
+            return None
+    
+    def _materialize_stock_indicators(self, conn, stock_id, since=None):
+        """
+        Recompute the stored indicators of a stock from a date on within an
+        open transaction.
+        
+        The rolling windows are seeded with the INDICATOR_LOOKBACK_ROWS
+        closes before since, so only rows from since on are read and updated.
+        
+        Args:
+            conn (Connection): Connection with an open transaction
+            stock_id (int): Stock id
+            since (datetime, optional): First date to recompute (default: all)
+        
+        Returns:
+            int: Number of rows recomputed
+        """
+        table = HistoricalData.__table__
+        query = select(
+            table.c.date, table.c.close, *(table.c[name] for name in INDICATOR_COLUMNS)
+        ).where(table.c.stock_id == stock_id)
+        
+        lookback = []
+        if since is not None:
+            lookback = conn.execute(
+                select(table.c.close)
+                .where(table.c.stock_id == stock_id, table.c.date < since)
+                .order_by(desc(table.c.date))
+                .limit(INDICATOR_LOOKBACK_ROWS)
+            ).scalars().all()
+            query = query.where(table.c.date >= since)
+        
+        state = IndicatorState(reversed(lookback))
+        stored = conn.execute(query.order_by(table.c.date)).fetchall()
+        rows = []
+        for date, close, *current in stored:
+            values = state.update(close)
+            # Rows whose indicators are unchanged keep their updated_at
+            if [values[name] for name in INDICATOR_COLUMNS] != current:
+                rows.append({"row_stock_id": stock_id, "row_date": date, **values})
+        
+        if rows and conn.dialect.name == "postgresql":
+            for start in range(0, len(rows), INDICATOR_UPDATE_CHUNK_SIZE):
+                chunk = rows[start:start + INDICATOR_UPDATE_CHUNK_SIZE]
+                conn.execute(INDICATOR_UPDATE_SQL, {
+                    "stock_id": stock_id,
+                    "updated_at": datetime.now(),
+                    "dates": [row["row_date"] for row in chunk],
+                    **{column: [row[column] for row in chunk] for column in INDICATOR_COLUMNS}
                 })
+        elif rows:
+            conn.execute(
+                table.update()
+                .where(table.c.stock_id == bindparam("row_stock_id"), table.c.date == bindparam("row_date"))
+                .values({name: bindparam(name) for name in INDICATOR_COLUMNS}),
+                rows
+            )
+        return len(stored)
+    
+    def materialize_indicators(self, symbols=None, since=None):
+        """
+        Fill the indicator columns of historical data.
+        
+        Historical writes recompute the rows from the earliest date they
+        wrote on, which for appended days is just the new rows; this is also
+        the way to fill the columns of data stored before.
+        
+        Args:
+            symbols (list, optional): Stock symbols (default: every stock with historical data)
+            since (datetime, optional): First date to recompute (default: all)
+        
+        Returns:
+            int: Number of rows updated, or None on error
+        """
+        try:
+            if symbols is None:
+                with self.engine.connect() as conn:
+                    stock_ids = conn.execute(select(HistoricalData.__table__.c.stock_id).distinct()).scalars().all()
+            else:
+                stock_ids = [self.get_stock_id(symbol, create=False) for symbol in symbols]
             
-            session.close()
+            updated = 0
+            for stock_id in stock_ids:
+                if stock_id is None:
+                    continue
+                with self.engine.begin() as conn:
+                    updated += self._materialize_stock_indicators(conn, stock_id, since)
             
-            self.logger.info(f"Retrieved {len(result)} historical data records for {symbol}")
-            return result
+            if symbols is None:
+                self.logger.info(f"Materialized indicators of {updated} historical data records of {len(stock_ids)} stocks")
+            return updated
         except Exception as e:
-            self.logger.error(f"Error getting historical data: {e}")
-            if session:
-                session.close()
-            return []
+            self.logger.error(f"Error materializing indicators: {e}")
+            return None
     
-    def get_realtime_data(self, symbol):
+    def get_coverage(self, symbol, start=None, end=None, merge_gap_days=5):
         """
-        Get the latest real-time data for a symbol.
+        Get the stored date range and missing trading days of a symbol,
+        plus the fetches needed to fill them.
+        
+        The fetch plan covers missing trading days between start and end:
+        days before the first stored date, gaps in the stored range and days
+        after the last stored date.
         
         Args:
             symbol (str): Stock symbol
+            start (date, optional): First day that should be stored (default: first stored date)
+            end (date, optional): Last day that should be stored (default:
+                the last trading day before today)
+            merge_gap_days (int, optional): Gaps separated by at most this
+                many stored trading days are fetched together
         
         Returns:
-            dict: Real-time data
+            dict: Coverage, gaps and fetch plan; empty if the symbol has no
+                historical data and no start is given; None on error
         """
         try:
-            session = self.Session()
+            session = self._read_session()
             
-            stock = session.query(Stock).filter_by(symbol=symbol).first()
-            if not stock:
-                self.logger.error(f"Stock not found: {symbol}")
-                return {}
+            coverage = None
+            gaps = []
+            stock_id = self.get_stock_id(symbol, create=False)
+            if stock_id is not None:
+                coverage = session.get(HistoricalCoverage, stock_id)
+                gaps = session.query(HistoricalGap).filter(HistoricalGap.stock_id == stock_id).order_by(HistoricalGap.start_date).all()
+                gaps = [(gap.start_date, gap.end_date, gap.missing_days) for gap in gaps]
             
-            data = session.query(RealtimeData).filter_by(stock_id=stock.id).order_by(desc(RealtimeData.timestamp)).first()
-            if not data:
-                self.logger.error(f"No real-time data found for {symbol}")
+            session.close()
+            
+            if coverage is None and start is None:
                 return {}
             
-            result = {
+            end = end or last_trading_day(date.today() - timedelta(days=1))
+            
+            if coverage is None:
+                missing = find_gaps([], start, end)
+            else:
+                start = start or coverage.first_date
+                missing = []
+                if start < coverage.first_date:
+                    missing.extend(find_gaps([], start, min(end, coverage.first_date - timedelta(days=1))))
+                for first, last, days in gaps:
+                    if last < start or first > end:
+                        continue
+                    if first < start or last > end:
+                        first, last = max(first, start), min(last, end)
+                        days = len(trading_days(first, last))
+                    missing.append((first, last, days))
+                if end > coverage.last_date:
+                    missing.extend(find_gaps([], max(start, coverage.last_date + timedelta(days=1)), end))
+            
+            return {
                 "symbol": symbol,
-                "timestamp": data.timestamp.isoformat(),
-                "price": data.price,
-                "change": data.change,
-                "change_percent": data.change_percent,
-                "volume": data.volume,
-                "market_cap": data.market_cap,
-                "bid": data.bid,
+                "first_date": coverage.first_date.isoformat() if coverage else None,
+                "last_date": coverage.last_date.isoformat() if coverage else None,
+                "rows": coverage.rows if coverage else 0,
+                "missing_days": coverage.missing_days if coverage else 0,
+                "gaps": [
+                    {"start": first.isoformat(), "end": last.isoformat(), "missing_days": days}
+                    for first, last, days in gaps
+                ],
+                "fetch_plan": plan_fetches(missing, merge_gap_days),
+                "updated_at": coverage.updated_at.isoformat() if coverage else None
+            }
+        except Exception as e:
+            self.logger.error(f"Error getting historical coverage: {e}")
+            if session:
+                session.close()
+            return None
+    
+    def store_realtime_data(self, data):
+        """
+        Store real-time data.
+        
+        With write-behind enabled the tick is validated and buffered, and
+        written by the next group commit of the buffer.
+        
+        Args:
+            data (dict): Real-time data
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if self.write_buffer:
+            return self._buffer_realtime_data(data)
+        
+        try:
+            row = self._parse_realtime_tick(data)
+            
+            row["stock_id"] = self.get_stock_id(row["symbol"])
+            if row["stock_id"] is None:
+                return False
+            
+            with self.engine.begin() as conn:
+                self._write_realtime_rows(conn, [row])
+            
+            self._touch_symbols("realtime", [row["symbol"]])
+            
+            self.logger.info(f"Stored real-time data for {row['symbol']}")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error storing real-time data: {e}")
+            return False
+    
+    def _parse_realtime_tick(self, tick):
+        """
+        Validate a real-time tick and convert it to a realtime_data row.
+        
+        Args:
+            tick (dict): Real-time data including its symbol
+        
+        Returns:
+            dict: Row for the realtime_data table
+        
+        Raises:
+            ValueError: If the tick is invalid
+        """
+        if not isinstance(tick, dict):
+            raise ValueError("Tick must be an object")
+        
+        symbol = tick.get("symbol")
+        if not symbol:
+            raise ValueError("Symbol is required")
+        
+        if tick.get("timestamp") is None:
+            raise ValueError("Timestamp is required")
+        if tick.get("price") is None:
+            raise ValueError("Price is required")
+        
+        def optional(key, type_):
+            value = tick.get(key)
+            return None if value is None else type_(value)
+        
+        try:
+            timestamp = datetime.fromisoformat(tick["timestamp"]) if isinstance(tick["timestamp"], str) else tick["timestamp"]
+            if not isinstance(timestamp, datetime):
+                raise ValueError(f"Invalid timestamp: {tick['timestamp']!r}")
+            
+            return {
+                "symbol": symbol,
+                "timestamp": timestamp,
+                "price": float(tick["price"]),
+                "change": optional("change", float),
+                "change_percent": optional("change_percent", float),
+                "volume": optional("volume", int),
+                "market_cap": optional("market_cap", float),
+                "bid": optional("bid", float),
+                "ask": optional("ask", float),
+                "shares_outstanding": optional("shares_outstanding", float),
+                "sentiment": optional("sentiment", str),
+                "created_at": datetime.now()
+            }
+        except (TypeError, ValueError) as e:
+            raise ValueError(str(e))
+    
+    def _write_realtime_rows(self, conn, rows):
+        """
+        Insert realtime_data rows and update latest_quotes and bars within an open transaction.
+        
+        Large batches reach PostgreSQL through COPY; everything else is a
+        single executemany INSERT.
+        
+        Args:
+            conn (Connection): Connection with an open transaction
+            rows (list): Rows for the realtime_data table including stock_id
+        """
+        table = RealtimeData.__table__
+        columns = [column.name for column in table.columns if column.name != "id"]
+        
+        roll_up = self.bars.get("mode") == "write" and self.bars.get("intervals")
+        if roll_up:
+            stock_ids = sorted({row["stock_id"] for row in rows})
+            if conn.dialect.name == "postgresql":
+                # Held until commit, so a concurrent writer of the stock
+                # reads the last tick after this batch's
+                conn.execute(BARS_LOCK_SQL, {"stock_ids": stock_ids})
+            # Read before the insert so that the batch's own ticks are not seen
+            stored = self._last_ticks(conn, stock_ids)
+        
+        if conn.dialect.name == "postgresql" and len(rows) >= REALTIME_COPY_MIN_ROWS:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([row[column] for column in columns])
+            buffer.seek(0)
+            
+            cursor = conn.connection.cursor()
+            try:
+                cursor.copy_expert(
+                    f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+            finally:
+                cursor.close()
+        else:
+            conn.execute(table.insert(), [{column: row[column] for column in columns} for row in rows])
+        
+        self._upsert_latest_quotes(conn, rows)
+        
+        if roll_up:
+            self._roll_up_rows(conn, rows, stored)
+    
+    def _last_ticks(self, conn, stock_ids=None, before=None):
+        """
+        Get the timestamp and the last known volume of the newest tick per stock.
+        
+        Ticks moved to tick_archive count as well.
+        
+        Args:
+            conn (Connection): Connection
+            stock_ids (iterable, optional): Stock ids (default: all stocks)
+            before (datetime, optional): Only consider ticks before this time
+        
+        Returns:
+            dict: stock_id -> (timestamp, volume) of stocks with ticks
+        """
+        ticks = self._last_hot_ticks(conn, stock_ids, before)
+        for stock_id, day in self._archived_days(conn, stock_ids, before).items():
+            self._seed_from_archive(conn, ticks, stock_id, day, before)
+        return ticks
+    
+    def _last_hot_ticks(self, conn, stock_ids=None, before=None):
+        """Get _last_ticks of the ticks still in realtime_data."""
+        table = RealtimeData.__table__
+        stocks = Stock.__table__
+        
+        def latest(column, *conditions):
+            query = select(column).where(table.c.stock_id == stocks.c.id, *conditions)
+            if before is not None:
+                query = query.where(table.c.timestamp < before)
+            return query.order_by(desc(table.c.timestamp)).limit(1).scalar_subquery()
+        
+        query = select(stocks.c.id, latest(table.c.timestamp), latest(table.c.volume, table.c.volume.isnot(None)))
+        if stock_ids is not None:
+            query = query.where(stocks.c.id.in_(list(stock_ids)))
+        
+        return {stock_id: (timestamp, volume) for stock_id, timestamp, volume in conn.execute(query) if timestamp is not None}
+    
+    def _archived_days(self, conn, stock_ids=None, before=None):
+        """
+        Get the newest archived day per stock with ticks before a time.
+        
+        Args:
+            conn (Connection): Connection
+            stock_ids (iterable, optional): Stock ids (default: all stocks)
+            before (datetime, optional): Time the day's first tick must precede
+        
+        Returns:
+            dict: stock_id -> day
+        """
+        archive = TickArchive.__table__
+        query = select(archive.c.stock_id, func.max(archive.c.day)).group_by(archive.c.stock_id)
+        if stock_ids is not None:
+            query = query.where(archive.c.stock_id.in_(list(stock_ids)))
+        if before is not None:
+            query = query.where(archive.c.first_timestamp < before)
+        
+        # SQLite returns the day as text
+        return {stock_id: date.fromisoformat(day) if isinstance(day, str) else day for stock_id, day in conn.execute(query)}
+    
+    def _seed_from_archive(self, conn, ticks, stock_id, day, before=None):
+        """
+        Update a stock's entry of _last_ticks with its ticks of an archived day.
+        
+        The blob is only decoded if the day may hold a tick newer than the entry.
+        
+        Args:
+            conn (Connection): Connection
+            ticks (dict): stock_id -> (timestamp, volume), updated in place
+            stock_id (int): Stock id
+            day (date): Archived day from _archived_days
+            before (datetime, optional): Only consider ticks before this time
+        """
+        timestamp, volume = ticks.get(stock_id, (None, None))
+        if timestamp is not None and timestamp >= datetime.combine(day, datetime.min.time()) + timedelta(days=1):
+            return
+        
+        archive = TickArchive.__table__
+        blob = conn.execute(select(archive.c.data).where(archive.c.stock_id == stock_id, archive.c.day == day)).scalar()
+        archived = [tick for tick in decode_ticks(blob) if before is None or tick["timestamp"] < before]
+        if not archived or (timestamp is not None and archived[-1]["timestamp"] <= timestamp):
+            return
+        
+        volumes = [tick["volume"] for tick in archived if tick["volume"] is not None]
+        ticks[stock_id] = (archived[-1]["timestamp"], volumes[-1] if volumes else volume)
+    
+    def _roll_up_rows(self, conn, rows, stored):
+        """
+        Fold newly written ticks into their bars within an open transaction.
+        
+        Ticks newer than everything stored for their stock are merged into
+        the stored bars. A tick older than a stored one changes the volume
+        of the ticks after it, so the bars of such a stock are rebuilt from
+        realtime_data instead, from the start of the late tick's bucket of
+        the longest interval on.
+        
+        Args:
+            conn (Connection): Connection with an open transaction
+            rows (list): Rows written to realtime_data including stock_id
+            stored (dict): _last_ticks of the rows' stocks before the write
+        """
+        intervals = self.bars["intervals"]
+        
+        firsts = {}
+        for row in rows:
+            firsts[row["stock_id"]] = min(firsts.get(row["stock_id"], row["timestamp"]), row["timestamp"])
+        late = {stock_id: first for stock_id, first in firsts.items() if stock_id in stored and stored[stock_id][0] >= first}
+        
+        in_order = sorted((row for row in rows if row["stock_id"] not in late), key=lambda row: (row["stock_id"], row["timestamp"]))
+        previous = {stock_id: volume for stock_id, (_, volume) in stored.items()}
+        self._upsert_bars(conn, aggregate_ticks(in_order, intervals, previous))
+        
+        longest = max(BAR_INTERVALS[interval] for interval in intervals)
+        for stock_id, first in late.items():
+            self._rebuild_bars(conn, intervals, start=bucket_start(first, longest), stock_ids=[stock_id])
+    
+    def _rebuild_bars(self, conn, intervals, start=None, end=None, stock_ids=None):
+        """
+        Recompute bars from the stored ticks and replace the stored bars within an open transaction.
+        
+        Ticks of archived days are decoded and merged with realtime_data, so
+        bars of days that receive late ticks after being archived keep the
+        archived ones.
+        
+        Args:
+            conn (Connection): Connection with an open transaction
+            intervals (list): Bar interval names
+            start (datetime, optional): First tick to read; a bucket boundary
+                of the longest interval, so every rebuilt bar sees all its ticks
+            end (datetime, optional): Time before which to stop (exclusive)
+            stock_ids (list, optional): Stock ids (default: all stocks)
+        
+        Returns:
+            dict: Bars written, as built by aggregate_ticks
+        """
+        table = RealtimeData.__table__
+        archive = TickArchive.__table__
+        
+        # Descending stock ids let the (stock_id, timestamp DESC) index be scanned backwards
+        hot = select(table.c.stock_id, table.c.timestamp, table.c.price, table.c.volume).order_by(
+            desc(table.c.stock_id), table.c.timestamp
+        )
+        days = select(archive.c.stock_id, archive.c.data).order_by(desc(archive.c.stock_id), archive.c.day)
+        if start is not None:
+            hot = hot.where(table.c.timestamp >= start)
+            days = days.where(archive.c.day >= start.date(), archive.c.last_timestamp >= start)
+        if end is not None:
+            hot = hot.where(table.c.timestamp < end)
+            days = days.where(archive.c.first_timestamp < end)
+        if stock_ids is not None:
+            hot = hot.where(table.c.stock_id.in_(stock_ids))
+            days = days.where(archive.c.stock_id.in_(stock_ids))
+        
+        def archived():
+            for stock_id, blob in conn.execution_options(stream_results=True).execute(days):
+                for tick in decode_ticks(blob):
+                    if (start is None or tick["timestamp"] >= start) and (end is None or tick["timestamp"] < end):
+                        yield {"stock_id": stock_id, **tick}
+        
+        rows = heapq.merge(
+            archived(),
+            (row._mapping for row in conn.execution_options(stream_results=True).execute(hot)),
+            key=lambda row: (-row["stock_id"], row["timestamp"])
+        )
+        
+        previous = {}
+        if start is not None:
+            ticks = self._last_hot_ticks(conn, stock_ids, before=start)
+            archived_days = self._archived_days(conn, stock_ids, before=start)
+            
+            def seeded(rows):
+                # Archived baselines are only decoded for stocks that have
+                # ticks to roll up, and only when newer than realtime_data's
+                for row in rows:
+                    stock_id = row["stock_id"]
+                    if stock_id not in previous:
+                        if stock_id in archived_days:
+                            self._seed_from_archive(conn, ticks, stock_id, archived_days[stock_id], before=start)
+                        previous[stock_id] = ticks.get(stock_id, (None, None))[1]
+                    yield row
+            
+            rows = seeded(rows)
+        
+        bars = aggregate_ticks(rows, intervals, previous)
+        
+        self._upsert_bars(conn, bars, merge=False)
+        return bars
+    
+    def _upsert_latest_quotes(self, conn, rows):
+        """
+        Move latest_quotes forward to the newest of the given ticks per stock.
+        
+        Ticks older than the stored latest quote leave it unchanged, so
+        out-of-order writes cannot move a quote back in time.
+        
+        Args:
+            conn (Connection): Connection with an open transaction
+            rows (list): Rows for the realtime_data table including stock_id
+        """
+        latest = {}
+        for row in rows:
+            current = latest.get(row["stock_id"])
+            if current is None or row["timestamp"] >= current["timestamp"]:
+                latest[row["stock_id"]] = row
+        
+        table = LatestQuote.__table__
+        now = datetime.now()
+        # Sorted so that concurrent writers lock quote rows in the same order
+        stmt = self._insert(table).values([
+            {"stock_id": stock_id, "updated_at": now, **{column: row[column] for column in QUOTE_COLUMNS}}
+            for stock_id, row in sorted(latest.items())
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.stock_id],
+            set_={
+                "updated_at": stmt.excluded.updated_at,
+                **{column: stmt.excluded[column] for column in QUOTE_COLUMNS}
+            },
+            where=table.c.timestamp <= stmt.excluded.timestamp
+        )
+        conn.execute(stmt)
+    
+    def _greatest(self, a, b):
+        """Get the larger of two SQL expressions, ignoring NULL."""
+        greatest = func.greatest if self.engine.dialect.name == "postgresql" else func.max
+        return greatest(func.coalesce(a, b), func.coalesce(b, a))
+    
+    def _least(self, a, b):
+        """Get the smaller of two SQL expressions, ignoring NULL."""
+        least = func.least if self.engine.dialect.name == "postgresql" else func.min
+        return least(func.coalesce(a, b), func.coalesce(b, a))
+    
+    def _rolling_stddev(self, column, window):
+        """Get the sample standard deviation of a column over a window."""
+        if self.engine.dialect.name == "postgresql":
+            return func.stddev_samp(column).over(**window)
+        # SQLite has no STDDEV aggregate
+        count = func.count(column).over(**window)
+        total = func.sum(column).over(**window)
+        variance = (func.sum(column * column).over(**window) - total * total / count) / (count - 1)
+        return func.sqrt(self._greatest(variance, 0.0))
+    
+    def _upsert_bars(self, conn, bars, merge=True):
+        """
+        Write OHLCV bars within an open transaction.
+        
+        Args:
+            conn (Connection): Connection with an open transaction
+            bars (dict): (stock_id, interval, bucket) -> bar, as built by aggregate_ticks
+            merge (bool, optional): Merge the bars into existing ones (True) or
+                replace existing ones (False)
+        """
+        table = OhlcvBar.__table__
+        now = datetime.now()
+        # Sorted so that concurrent writers lock bar rows in the same order
+        values = [
+            {"stock_id": stock_id, "interval": interval, "bucket": bucket, "updated_at": now, **bar}
+            for (stock_id, interval, bucket), bar in sorted(bars.items())
+        ]
+        
+        for offset in range(0, len(values), BAR_UPSERT_CHUNK_SIZE):
+            stmt = self._insert(table).values(values[offset:offset + BAR_UPSERT_CHUNK_SIZE])
+            excluded = stmt.excluded
+            
+            if merge:
+                set_ = {
+                    "open": case((excluded.open_time < table.c.open_time, excluded.open), else_=table.c.open),
+                    "high": self._greatest(table.c.high, excluded.high),
+                    "low": self._least(table.c.low, excluded.low),
+                    "close": case((excluded.close_time >= table.c.close_time, excluded.close), else_=table.c.close),
+                    # Volumes of newer ticks add to the bar's
+                    "volume": func.coalesce(table.c.volume + excluded.volume, table.c.volume, excluded.volume),
+                    "open_time": self._least(table.c.open_time, excluded.open_time),
+                    "close_time": self._greatest(table.c.close_time, excluded.close_time),
+                    "volume_min": self._least(table.c.volume_min, excluded.volume_min),
+                    "volume_max": self._greatest(table.c.volume_max, excluded.volume_max),
+                    "tick_count": table.c.tick_count + excluded.tick_count
+                }
+            else:
+                set_ = {column: excluded[column] for column in BAR_COLUMNS}
+            set_["updated_at"] = excluded.updated_at
+            
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.stock_id, table.c.interval, table.c.bucket],
+                set_=set_
+            ))
+    
+    def get_watermark(self, name):
+        """
+        Get the progress marker of an incremental job.
+        
+        Args:
+            name (str): Watermarks table entry
+        
+        Returns:
+            datetime: Watermark, or None if the job has not run yet
+        """
+        watermarks = Watermark.__table__
+        with self.engine.connect() as conn:
+            return conn.execute(select(watermarks.c.value).where(watermarks.c.name == name)).scalar()
+    
+    def set_watermark(self, name, value, conn=None):
+        """
+        Store the progress marker of an incremental job.
+        
+        Args:
+            name (str): Watermarks table entry
+            value (datetime): Watermark
+            conn (Connection, optional): Connection with an open transaction
+                to store it in (default: a transaction of its own)
+        """
+        watermarks = Watermark.__table__
+        stmt = self._insert(watermarks).values(name=name, value=value, updated_at=datetime.now())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[watermarks.c.name],
+            set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at}
+        )
+        
+        if conn is not None:
+            conn.execute(stmt)
+            return
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+    
+    def rollup_realtime_data(self, now=None):
+        """
+        Catch OHLCV bars up with the real-time data stored since the last run.
+        
+        Bars are recomputed from the ticks of every bucket at or after the
+        watermark (less the configured lag, to pick up ticks committed late)
+        and replace the stored ones, so running it again is harmless. The
+        first run rolls up all of realtime_data.
+        
+        Args:
+            now (datetime, optional): Only roll up ticks before this time
+        
+        Returns:
+            dict: Ticks read, bars written and the new watermark, or None on error
+        """
+        try:
+            intervals = self.bars.get("intervals", [])
+            if not intervals:
+                return {"ticks": 0, "bars": 0, "watermark": None}
+            
+            watermarks = Watermark.__table__
+            
+            with self.engine.begin() as conn:
+                watermark = conn.execute(
+                    select(watermarks.c.value).where(watermarks.c.name == BARS_WATERMARK)
+                ).scalar()
+                
+                start = None
+                if watermark is not None:
+                    # Start at a bucket boundary of the longest interval so
+                    # that every recomputed bar sees all of its ticks
+                    lag = timedelta(seconds=self.bars.get("catchup_lag_s", 60))
+                    longest = max(BAR_INTERVALS[interval] for interval in intervals)
+                    start = bucket_start(watermark - lag, longest)
+                
+                bars = self._rebuild_bars(conn, intervals, start=start, end=now)
+                
+                ticks = sum(bar["tick_count"] for (_, interval, _), bar in bars.items() if interval == intervals[0])
+                if bars:
+                    watermark = max(watermark or datetime.min, *(bar["close_time"] for bar in bars.values()))
+                    self.set_watermark(BARS_WATERMARK, watermark, conn)
+            
+            if bars:
+                with self._stock_ids_lock:
+                    symbols = {stock_id: symbol for symbol, stock_id in self._stock_ids.items()}
+                self._touch_symbols("realtime", [symbols[stock_id] for stock_id, _, _ in bars if stock_id in symbols])
+            
+            self.logger.info(f"Rolled up {ticks} real-time data records into {len(bars)} bars")
+            return {
+                "ticks": ticks,
+                "bars": len(bars),
+                "watermark": watermark.isoformat() if watermark else None
+            }
+        except Exception as e:
+            self.logger.error(f"Error rolling up real-time data: {e}")
+            return None
+    
+    def _archive_stock_day(self, conn, stock_id, day):
+        """
+        Move the real-time data of a stock and day into tick_archive within
+        an open transaction.
+        
+        Ticks of a day archived before are merged into its blob.
+        
+        Args:
+            conn (Connection): Connection with an open transaction
+            stock_id (int): Stock id
+            day (date): Day to archive
+        
+        Returns:
+            tuple: Number of ticks moved and size of the day's blob in bytes
+        """
+        table = RealtimeData.__table__
+        archive = TickArchive.__table__
+        
+        start = datetime.combine(day, datetime.min.time())
+        in_day = (table.c.stock_id == stock_id, table.c.timestamp >= start, table.c.timestamp < start + timedelta(days=1))
+        columns = [table.c[column] for column in QUOTE_COLUMNS]
+        
+        if conn.dialect.name == "postgresql":
+            # Archives exactly the rows deleted, even if ticks arrive meanwhile
+            rows = conn.execute(table.delete().where(*in_day).returning(*columns)).fetchall()
+        else:
+            rows = conn.execute(select(*columns).where(*in_day)).fetchall()
+            conn.execute(table.delete().where(*in_day))
+        if not rows:
+            return 0, 0
+        
+        ticks = [dict(row._mapping) for row in rows]
+        existing = conn.execute(
+            select(archive.c.data).where(archive.c.stock_id == stock_id, archive.c.day == day)
+        ).scalar()
+        if existing is not None:
+            ticks = decode_ticks(existing) + ticks
+        ticks.sort(key=lambda tick: tick["timestamp"])
+        
+        blob = encode_ticks(ticks)
+        stmt = self._insert(archive).values(
+            stock_id=stock_id,
+            day=day,
+            first_timestamp=ticks[0]["timestamp"],
+            last_timestamp=ticks[-1]["timestamp"],
+            tick_count=len(ticks),
+            data=blob,
+            updated_at=datetime.now()
+        )
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[archive.c.stock_id, archive.c.day],
+            set_={column: stmt.excluded[column] for column in ("first_timestamp", "last_timestamp", "tick_count", "data", "updated_at")}
+        ))
+        return len(rows), len(blob)
+    
+    def archive_realtime_data(self, before=None, symbols=None):
+        """
+        Move old real-time data into the compressed tick archive.
+        
+        The ticks of every stock and day are packed into one tick_archive
+        blob and deleted from realtime_data, one transaction per stock and
+        day. Read methods merge archived ticks back in.
+        
+        Args:
+            before (datetime, optional): Archive the days before this one
+                (default: storage.tick_archive_after_days days ago)
+            symbols (list, optional): Stock symbols (default: all)
+        
+        Returns:
+            dict: Days and ticks archived and the size of their blobs in bytes, or None on error
+        """
+        try:
+            cutoff = (before or datetime.now() - timedelta(days=self.tick_archive_after_days)).date()
+            table = RealtimeData.__table__
+            
+            query = (
+                select(table.c.stock_id, func.date(table.c.timestamp).label("day"))
+                .where(table.c.timestamp < datetime.combine(cutoff, datetime.min.time()))
+                .distinct()
+            )
+            if symbols is not None:
+                query = query.where(table.c.stock_id.in_([self.get_stock_id(symbol, create=False) for symbol in symbols]))
+            
+            with self.engine.connect() as conn:
+                days = conn.execute(query).fetchall()
+            
+            ticks = 0
+            size = 0
+            for stock_id, day in days:
+                # SQLite returns the day as text
+                day = date.fromisoformat(day) if isinstance(day, str) else day
+                with self.engine.begin() as conn:
+                    moved, blob_size = self._archive_stock_day(conn, stock_id, day)
+                ticks += moved
+                size += blob_size
+            
+            self.logger.info(f"Archived {ticks} real-time data records of {len(days)} stock days into {size} bytes")
+            return {"days": len(days), "ticks": ticks, "bytes": size}
+        except Exception as e:
+            self.logger.error(f"Error archiving real-time data: {e}")
+            return None
+    
+    def store_realtime_batch(self, ticks):
+        """
+        Store a batch of real-time ticks for any number of symbols.
+        
+        Valid ticks are written in one transaction; invalid ticks are
+        reported back instead of failing the whole batch.
+        
+        Args:
+            ticks (list): Real-time data, each including its symbol
+        
+        Returns:
+            dict: Received and stored counts plus per-item rejects, or None on error
+        """
+        try:
+            rows = []
+            rejected = []
+            
+            for index, tick in enumerate(ticks):
+                try:
+                    row = self._parse_realtime_tick(tick)
+                    
+                    row["stock_id"] = self.get_stock_id(row["symbol"])
+                    if row["stock_id"] is None:
+                        raise ValueError(f"Unknown stock: {row['symbol']}")
+                    
+                    rows.append(row)
+                except ValueError as e:
+                    rejected.append({"index": index, "error": str(e)})
+            
+            if rows:
+                with self.engine.begin() as conn:
+                    self._write_realtime_rows(conn, rows)
+                
+                self._touch_symbols("realtime", [row["symbol"] for row in rows])
+            
+            self.logger.info(f"Stored {len(rows)} real-time data records, rejected {len(rejected)}")
+            return {
+                "received": len(ticks),
+                "stored": len(rows),
+                "rejected": rejected
+            }
+        except Exception as e:
+            self.logger.error(f"Error storing real-time batch: {e}")
+            return None
+    
+    def _buffer_realtime_data(self, data):
+        """
+        Validate real-time data and add it to the write-behind buffer.
+        
+        Args:
+            data (dict): Real-time data
+        
+        Returns:
+            bool: True if buffered, False if invalid or dropped
+        """
+        try:
+            row = self._parse_realtime_tick(data)
+            
+            row["stock_id"] = self.get_stock_id(row["symbol"])
+            if row["stock_id"] is None:
+                return False
+            
+            if not self.write_buffer.put(row):
+                self.logger.warning(f"Write-behind buffer full, dropped real-time data for {row['symbol']}")
+                return False
+            
+            return True
+        except Exception as e:
+            self.logger.error(f"Error buffering real-time data: {e}")
+            return False
+    
+    def _flush_realtime_rows(self, rows):
+        """
+        Write buffered real-time rows in one transaction.
+        
+        Args:
+            rows (list): Rows for the realtime_data table including stock_id
+        """
+        with self.engine.begin() as conn:
+            self._write_realtime_rows(conn, rows)
+        
+        self._touch_symbols("realtime", [row["symbol"] for row in rows])
+    
+    def get_write_buffer_stats(self):
+        """
+        Get statistics of the real-time write-behind buffer.
+        
+        Returns:
+            dict: Buffer statistics, or {"enabled": False} without write-behind
+        """
+        if not self.write_buffer:
+            return {"enabled": False}
+        return {"enabled": True, **self.write_buffer.get_stats()}
+    
+    def _read_session(self):
+        """
+        Open a session for read-only queries.
+        
+        Reads go to the next healthy read replica when replicas are
+        configured and to the primary otherwise.
+        
+        Returns:
+            Session: Database session
+        """
+        if self.replicas:
+            return self.Session(bind=self.replicas.choose(self.engine))
+        return self.Session()
+    
+    def get_pool_stats(self):
+        """
+        Get statistics of the database connection pools.
+        
+        Returns:
+            dict: Pool state and checkout statistics of the primary, plus
+                routing statistics when read replicas are configured
+        """
+        stats = get_pool_stats(self.engine)
+        if self.replicas:
+            stats["read_replicas"] = self.replicas.get_stats()
+        return stats
+    
+    def close(self):
+        """
+        Flush pending writes, stop background threads and release the
+        database connections of this repository.
+        
+        The shared engine and replica router stay open for the other
+        repositories of the process.
+        """
+        if self.write_buffer:
+            self.write_buffer.close()
+        if self.partition_manager:
+            self.partition_manager.stop()
+        if self.bar_scheduler:
+            self.bar_scheduler.stop()
+        if self.replicas and self._owns_replicas:
+            self.replicas.dispose()
+    
+    def _historical_query(self, session, stock_id, start=None, end=None, after=None, order="desc", columns=None):
+        """
+        Build the historical data query for a stock.
+        
+        Args:
+            session (Session): Database session
+            stock_id (int): Stock id
+            start (datetime, optional): Earliest date to include
+            end (datetime, optional): Date before which to stop (exclusive)
+            after (datetime, optional): Keyset cursor; only dates past it in the sort order
+            order (str, optional): "desc" (newest first) or "asc"
+            columns (list, optional): Columns to select instead of HistoricalData objects
+        
+        Returns:
+            Query: Historical data query ordered by date
+        """
+        query = session.query(*columns) if columns else session.query(HistoricalData)
+        query = query.filter(HistoricalData.stock_id == stock_id)
+        
+        if start is not None:
+            query = query.filter(HistoricalData.date >= start)
+        if end is not None:
+            query = query.filter(HistoricalData.date < end)
+        
+        if order == "asc":
+            if after is not None:
+                query = query.filter(HistoricalData.date > after)
+            return query.order_by(HistoricalData.date)
+        
+        if after is not None:
+            query = query.filter(HistoricalData.date < after)
+        return query.order_by(desc(HistoricalData.date))
+    
+    def _historical_columns(self, fields=None):
+        """
+        Get the columns selected for historical records with the given fields.
+        
+        Args:
+            fields (list, optional): Fields besides date (default: HISTORICAL_FIELDS)
+        
+        Returns:
+            tuple: Record keys and the matching columns, date first
+        """
+        fields = HISTORICAL_FIELDS if fields is None else fields
+        return ("date", *fields), [getattr(HistoricalData, name) for name in ("date", *fields)]
+    
+    def get_historical_page(self, symbol, limit=100, start=None, end=None, after=None, order="desc", fields=None):
+        """
+        Get a page of historical data for a symbol.
+        
+        Pages are addressed by a keyset cursor on (stock_id, date), so every
+        page is an index range scan of at most limit + 1 rows however deep
+        it is. Only the requested columns are selected and records are built
+        straight from the result tuples, without ORM objects.
+        
+        Args:
+            symbol (str): Stock symbol
+            limit (int, optional): Maximum number of records to return
+            start (datetime, optional): Earliest date to include
+            end (datetime, optional): Date before which to stop (exclusive)
+            after (datetime, optional): Date of the last record of the previous page
+            order (str, optional): "desc" (newest first) or "asc"
+            fields (list, optional): Fields to return besides symbol and date
+                (default: HISTORICAL_FIELDS)
+        
+        Returns:
+            dict: Historical data and the cursor of the next page (None on the last page), or None on error
+        """
+        try:
+            session = self._read_session()
+            
+            stock_id = self.get_stock_id(symbol, create=False)
+            if stock_id is None:
+                self.logger.error(f"Stock not found: {symbol}")
+                return {"data": [], "next_cursor": None}
+            
+            keys, columns = self._historical_columns(fields)
+            query = self._historical_query(session, stock_id, start, end, after, order, columns=columns).limit(limit + 1)
+            data = session.execute(query.statement).fetchall()
+            
+            next_cursor = None
+            if len(data) > limit:
+                data = data[:limit]
+                next_cursor = encode_cursor(data[-1][0])
+            
+            result = []
+            for row in data:
+                record = {"symbol": symbol, **dict(zip(keys, row))}
+                record["date"] = row[0].isoformat()
+                result.append(record)
+            
+            session.close()
+            
+            self.logger.info(f"Retrieved {len(result)} historical data records for {symbol}")
+            return {"data": result, "next_cursor": next_cursor}
+        except Exception as e:
+            self.logger.error(f"Error getting historical data: {e}")
+            if session:
+                session.close()
+            return None
+    
+    def iter_historical_data(self, symbol, limit=None, start=None, end=None, after=None, order="desc", batch_size=1000, fields=None):
+        """
+        Stream historical data for a symbol.
+        
+        Rows are read through a server-side cursor in batches of batch_size,
+        so memory use does not grow with the number of rows returned.
+        
+        Args:
+            symbol (str): Stock symbol
+            limit (int, optional): Maximum number of records to return (default: all)
+            start (datetime, optional): Earliest date to include
+            end (datetime, optional): Date before which to stop (exclusive)
+            after (datetime, optional): Date of the last record already received
+            order (str, optional): "desc" (newest first) or "asc"
+            batch_size (int, optional): Number of rows fetched per round trip
+            fields (list, optional): Fields to return besides symbol and date
+                (default: HISTORICAL_FIELDS)
+        
+        Yields:
+            dict: Historical data record
+        """
+        stock_id = self.get_stock_id(symbol, create=False)
+        if stock_id is None:
+            self.logger.error(f"Stock not found: {symbol}")
+            return
+        
+        session = self._read_session()
+        try:
+            keys, columns = self._historical_columns(fields)
+            query = self._historical_query(session, stock_id, start, end, after, order, columns=columns)
+            if limit is not None:
+                query = query.limit(limit)
+            
+            count = 0
+            result = session.execute(query.statement.execution_options(stream_results=True))
+            for rows in result.partitions(batch_size):
+                for row in rows:
+                    count += 1
+                    record = {"symbol": symbol, **dict(zip(keys, row))}
+                    record["date"] = row[0].isoformat()
+                    yield record
+            
+            self.logger.info(f"Streamed {count} historical data records for {symbol}")
+        finally:
+            session.close()
+    
+    def get_historical_table(self, symbol, limit=None, start=None, end=None, after=None, order="desc", batch_size=65536, fields=None):
+        """
+        Get historical data for a symbol as a columnar Arrow table.
+        
+        Result tuples are transposed into Arrow arrays batch by batch, so no
+        ORM objects or per-row dicts are built.
+        
+        Args:
+            symbol (str): Stock symbol
+            limit (int, optional): Maximum number of records to return (default: all)
+            start (datetime, optional): Earliest date to include
+            end (datetime, optional): Date before which to stop (exclusive)
+            after (datetime, optional): Date of the last record already received
+            order (str, optional): "desc" (newest first) or "asc"
+            batch_size (int, optional): Number of rows per record batch
+            fields (list, optional): Columns to return besides date
+                (default: HISTORICAL_FIELDS)
+        
+        Returns:
+            pyarrow.Table: Historical data with the symbol in the schema metadata, or None on error
+        """
+        import pyarrow as pa
+        
+        schema = pa.schema(
+            [("date", pa.timestamp("us"))]
+            + [(name, pa.float64()) for name in ("open", "high", "low", "close")]
+            + [("volume", pa.int64())]
+            + [(name, pa.float64()) for name in ("ma5", "ma20", "daily_return", "volatility", "rsi")],
+            metadata={"symbol": symbol}
+        )
+        if fields is not None:
+            schema = pa.schema([schema.field(name) for name in ("date", *fields)], metadata=schema.metadata)
+        columns = [getattr(HistoricalData, name) for name in schema.names]
+        
+        try:
+            session = self._read_session()
+            
+            batches = []
+            stock_id = self.get_stock_id(symbol, create=False)
+            
+            if stock_id is not None:
+                query = self._historical_query(session, stock_id, start, end, after, order, columns=columns)
+                if limit is not None:
+                    query = query.limit(limit)
+                
+                result = session.execute(query.statement.execution_options(stream_results=True))
+                for rows in result.partitions(batch_size):
+                    arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+                    batches.append(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            else:
+                self.logger.error(f"Stock not found: {symbol}")
+            
+            session.close()
+            
+            table = pa.Table.from_batches(batches, schema=schema)
+            self.logger.info(f"Retrieved {table.num_rows} historical data records for {symbol} as Arrow")
+            return table
+        except Exception as e:
+            self.logger.error(f"Error getting historical data table: {e}")
+            if session:
+                session.close()
+            return None
+    
+    def get_historical_data_multi(self, symbols, limit=None, start=None, end=None, order="desc", fields=None):
+        """
+        Get historical data for many symbols in one query.
+        
+        All symbols are read with a single stock_id IN (...) query. With a
+        limit, rows are ranked per stock with ROW_NUMBER() and only the
+        first limit rows of each stock are returned.
+        
+        Args:
+            symbols (list): Stock symbols
+            limit (int, optional): Maximum number of records per symbol (default: all)
+            start (datetime, optional): Earliest date to include
+            end (datetime, optional): Date before which to stop (exclusive)
+            order (str, optional): "desc" (newest first) or "asc"
+            fields (list, optional): Fields to return besides symbol and date
+                (default: HISTORICAL_FIELDS)
+        
+        Returns:
+            dict: Historical data by symbol (empty for unknown symbols), or None on error
+        """
+        try:
+            session = self._read_session()
+            
+            result = {symbol: [] for symbol in symbols}
+            symbol_by_id = {}
+            for symbol in result:
+                stock_id = self.get_stock_id(symbol, create=False)
+                if stock_id is not None:
+                    symbol_by_id[stock_id] = symbol
+            
+            if symbol_by_id:
+                table = HistoricalData.__table__
+                keys, _ = self._historical_columns(fields)
+                columns = [table.c.stock_id] + [table.c[name] for name in keys]
+                conditions = [table.c.stock_id.in_(list(symbol_by_id))]
+                if start is not None:
+                    conditions.append(table.c.date >= start)
+                if end is not None:
+                    conditions.append(table.c.date < end)
+                
+                def by_date(date):
+                    return date if order == "asc" else desc(date)
+                
+                if limit is None:
+                    query = select(*columns).where(*conditions).order_by(table.c.stock_id, by_date(table.c.date))
+                else:
+                    position = func.row_number().over(partition_by=table.c.stock_id, order_by=by_date(table.c.date))
+                    ranked = select(*columns, position.label("position")).where(*conditions).subquery()
+                    query = (
+                        select(*[ranked.c[column.name] for column in columns])
+                        .where(ranked.c.position <= limit)
+                        .order_by(ranked.c.stock_id, by_date(ranked.c.date))
+                    )
+                
+                for row in session.execute(query):
+                    symbol = symbol_by_id[row[0]]
+                    record = {"symbol": symbol, **dict(zip(keys, row[1:]))}
+                    record["date"] = row[1].isoformat()
+                    result[symbol].append(record)
+            
+            session.close()
+            
+            self.logger.info(f"Retrieved historical data for {len(symbol_by_id)} of {len(result)} symbols")
+            return result
+        except Exception as e:
+            self.logger.error(f"Error getting historical data for many symbols: {e}")
+            if session:
+                session.close()
+            return None
+    
+    def _lookback_start(self, table, stock_id, before, inclusive, rows):
+        """
+        Get the date of the earliest of the rows last rows up to a date.
+        
+        Returns:
+            ScalarSelect: That date, or before when there are no such rows
+        """
+        condition = table.c.date <= before if inclusive else table.c.date < before
+        recent = (
+            select(table.c.date)
+            .where(table.c.stock_id == stock_id, condition)
+            .order_by(desc(table.c.date))
+            .limit(rows)
+            .subquery()
+        )
+        return func.coalesce(select(func.min(recent.c.date)).scalar_subquery(), before)
+    
+    def _indicator_query(self, stock_id, limit=None, start=None, end=None, after=None, order="desc", fields=None):
+        """
+        Build a historical data query computing the indicators with window functions.
+        
+        Windows run over the requested rows plus the INDICATOR_LOOKBACK_ROWS
+        rows before them, whose range is found with an index seek, so long
+        histories are not read to fill the windows.
+        """
+        table = HistoricalData.__table__
+        
+        # The window rows end at the last returned row; they start
+        # INDICATOR_LOOKBACK_ROWS before the first returned row
+        conditions = [table.c.stock_id == stock_id]
+        if end is not None:
+            conditions.append(table.c.date < end)
+        if order == "asc":
+            if after is not None:
+                conditions.append(table.c.date >= self._lookback_start(table, stock_id, after, True, INDICATOR_LOOKBACK_ROWS))
+            elif start is not None:
+                conditions.append(table.c.date >= self._lookback_start(table, stock_id, start, False, INDICATOR_LOOKBACK_ROWS))
+        else:
+            if after is not None:
+                conditions.append(table.c.date < after)
+            if limit is not None:
+                conditions.append(table.c.date >= self._lookback_start(
+                    table, stock_id, after or end or datetime.max, False, limit + INDICATOR_LOOKBACK_ROWS
+                ))
+            elif start is not None:
+                conditions.append(table.c.date >= self._lookback_start(table, stock_id, start, False, INDICATOR_LOOKBACK_ROWS))
+        
+        previous_close = func.lag(table.c.close).over(order_by=table.c.date)
+        changes = (
+            select(
+                table.c.date, table.c.open, table.c.high, table.c.low, table.c.close, table.c.volume,
+                (table.c.close / previous_close - 1).label("daily_return"),
+                (table.c.close - previous_close).label("change")
+            )
+            .where(*conditions)
+            .subquery()
+        )
+        
+        def trailing(name):
+            return {"order_by": changes.c.date, "rows": (1 - INDICATOR_WINDOWS[name], 0)}
+        
+        def when_full(name, column, value):
+            # Partial windows at the start of the history have no value
+            return case((func.count(column).over(**trailing(name)) == INDICATOR_WINDOWS[name], value))
+        
+        gain = case((changes.c.change > 0, changes.c.change), else_=0.0)
+        loss = case((changes.c.change < 0, -changes.c.change), else_=0.0)
+        windows = select(
+            changes,
+            when_full("ma5", changes.c.close, func.avg(changes.c.close).over(**trailing("ma5"))).label("ma5"),
+            when_full("ma20", changes.c.close, func.avg(changes.c.close).over(**trailing("ma20"))).label("ma20"),
+            when_full("volatility", changes.c.daily_return, self._rolling_stddev(changes.c.daily_return, trailing("volatility"))).label("volatility"),
+            when_full("rsi", changes.c.change, func.avg(gain).over(**trailing("rsi"))).label("avg_gain"),
+            when_full("rsi", changes.c.change, func.avg(loss).over(**trailing("rsi"))).label("avg_loss")
+        ).subquery()
+        
+        rsi = case(
+            (windows.c.avg_loss > 0, 100 - 100 / (1 + windows.c.avg_gain / windows.c.avg_loss)),
+            (windows.c.avg_gain > 0, 100.0)
+        )
+        outputs = {name: windows.c[name] for name in HISTORICAL_FIELDS if name != "rsi"}
+        outputs["rsi"] = rsi.label("rsi")
+        query = select(windows.c.date, *[outputs[name] for name in (HISTORICAL_FIELDS if fields is None else fields)])
+        
+        if start is not None:
+            query = query.where(windows.c.date >= start)
+        if order == "asc":
+            if after is not None:
+                query = query.where(windows.c.date > after)
+            query = query.order_by(windows.c.date)
+        else:
+            query = query.order_by(desc(windows.c.date))
+        
+        return query.limit(limit) if limit is not None else query
+    
+    def get_indicator_page(self, symbol, limit=100, start=None, end=None, after=None, order="desc", fields=None):
+        """
+        Get a page of historical data for a symbol with the indicators
+        computed in the database.
+        
+        MA5, MA20, the daily return, the 20-day volatility of daily returns
+        and the 14-day RSI are computed with window functions from the
+        stored closes instead of being read from their columns. Indicators
+        whose window reaches before the first stored day are None.
+        
+        Args:
+            symbol (str): Stock symbol
+            limit (int, optional): Maximum number of records to return
+            start (datetime, optional): Earliest date to include
+            end (datetime, optional): Date before which to stop (exclusive)
+            after (datetime, optional): Date of the last record of the previous page
+            order (str, optional): "desc" (newest first) or "asc"
+            fields (list, optional): Fields to return besides symbol and date
+                (default: HISTORICAL_FIELDS)
+        
+        Returns:
+            dict: Historical data and the cursor of the next page (None on the last page), or None on error
+        """
+        try:
+            session = self._read_session()
+            
+            stock_id = self.get_stock_id(symbol, create=False)
+            if stock_id is None:
+                self.logger.error(f"Stock not found: {symbol}")
+                return {"data": [], "next_cursor": None}
+            
+            keys, _ = self._historical_columns(fields)
+            data = session.execute(self._indicator_query(stock_id, limit + 1, start, end, after, order, fields)).fetchall()
+            
+            next_cursor = None
+            if len(data) > limit:
+                data = data[:limit]
+                next_cursor = encode_cursor(data[-1][0])
+            
+            result = []
+            for row in data:
+                record = {"symbol": symbol, **dict(zip(keys, row))}
+                record["date"] = row[0].isoformat()
+                result.append(record)
+            
+            session.close()
+            
+            self.logger.info(f"Computed indicators for {len(result)} historical data records for {symbol}")
+            return {"data": result, "next_cursor": next_cursor}
+        except Exception as e:
+            self.logger.error(f"Error computing indicators: {e}")
+            if session:
+                session.close()
+            return None
+    
+    def get_historical_data(self, symbol, limit=100, start=None, end=None, after=None, order="desc", fields=None):
+        """
+        Get historical data for a symbol.
+        
+        Args:
+            symbol (str): Stock symbol
+            limit (int, optional): Maximum number of records to return
+            start (datetime, optional): Earliest date to include
+            end (datetime, optional): Date before which to stop (exclusive)
+            after (datetime, optional): Date of the last record of the previous page
+            order (str, optional): "desc" (newest first) or "asc"
+            fields (list, optional): Fields to return besides symbol and date
+                (default: HISTORICAL_FIELDS)
+        
+        Returns:
+            list: Historical data
+        """
+        page = self.get_historical_page(symbol, limit, start, end, after, order, fields)
+        return page["data"] if page else []
+    
+    def get_realtime_data(self, symbol):
+        """
+        Get the latest real-time data for a symbol.
+        
+        Args:
+            symbol (str): Stock symbol
+        
+        Returns:
+            dict: Real-time data
+        """
+        try:
+            session = self._read_session()
+            
+            stock_id = self.get_stock_id(symbol, create=False)
+            if stock_id is None:
+                self.logger.error(f"Stock not found: {symbol}")
+                return {}
+            
+            data = session.get(LatestQuote, stock_id)
+            if not data:
+                # Ticks written before latest_quotes existed
+                data = session.query(RealtimeData).filter_by(stock_id=stock_id).order_by(desc(RealtimeData.timestamp)).first()
+            if not data:
+                self.logger.error(f"No real-time data found for {symbol}")
+                return {}
+            
+            result = {
+                "symbol": symbol,
+                "timestamp": data.timestamp.isoformat(),
+                "price": data.price,
+                "change": data.change,
+                "change_percent": data.change_percent,
+                "volume": data.volume,
+                "market_cap": data.market_cap,
+                "bid": data.bid,
                 "ask": data.ask,
                 "shares_outstanding": data.shares_outstanding,
                 "sentiment": data.sentiment
@@ -297,6 +2323,289 @@ class Repository:
             if session:
                 session.close()
             return {}
+    
+    def get_quotes_asof(self, queries):
+        """
+        Get the last real-time data at or before given times, for many symbols.
+        
+        On PostgreSQL all lookups are answered by one query that joins the
+        requested (stock, time) pairs laterally against realtime_data, so
+        every pair is an index seek on (stock_id, timestamp). A second one
+        finds the archived day each pair falls in; its blob is only decoded
+        if it can hold a later tick than realtime_data.
+        
+        Args:
+            queries (list): (symbol, datetime) pairs
+        
+        Returns:
+            list: Real-time data per pair in input order (None where there is
+                no quote at or before the time), or None on error
+        """
+        try:
+            session = self._read_session()
+            
+            results = [None] * len(queries)
+            lookups = []
+            for index, (symbol, timestamp) in enumerate(queries):
+                stock_id = self.get_stock_id(symbol, create=False)
+                if stock_id is not None:
+                    lookups.append((index, stock_id, timestamp))
+            
+            if lookups and session.bind.dialect.name == "postgresql":
+                indexes, stock_ids, timestamps = zip(*lookups)
+                rows = session.execute(QUOTE_ASOF_SQL, {
+                    "indexes": list(indexes),
+                    "stock_ids": list(stock_ids),
+                    "timestamps": list(timestamps)
+                }).fetchall()
+            else:
+                table = RealtimeData.__table__
+                rows = []
+                for index, stock_id, timestamp in lookups:
+                    row = session.execute(
+                        select(*[table.c[column] for column in QUOTE_COLUMNS])
+                        .where(table.c.stock_id == stock_id, table.c.timestamp <= timestamp)
+                        .order_by(desc(table.c.timestamp))
+                        .limit(1)
+                    ).first()
+                    if row:
+                        rows.append((index, *row))
+            
+            quotes = {index: dict(zip(QUOTE_COLUMNS, values)) for index, *values in rows}
+            
+            # Archived days can hold a later tick than realtime_data
+            if lookups and session.bind.dialect.name == "postgresql":
+                candidates = session.execute(TICK_ARCHIVE_ASOF_SQL, {
+                    "indexes": list(indexes),
+                    "stock_ids": list(stock_ids),
+                    "timestamps": list(timestamps)
+                }).fetchall()
+            else:
+                archive = TickArchive.__table__
+                candidates = []
+                for index, stock_id, timestamp in lookups:
+                    row = session.execute(
+                        select(archive.c.id, archive.c.last_timestamp)
+                        .where(archive.c.stock_id == stock_id, archive.c.day <= timestamp.date(), archive.c.first_timestamp <= timestamp)
+                        .order_by(desc(archive.c.day))
+                        .limit(1)
+                    ).first()
+                    if row:
+                        candidates.append((index, *row))
+            
+            archived = {}
+            for index, archive_id, last_timestamp in candidates:
+                timestamp = queries[index][1]
+                if index in quotes and quotes[index]["timestamp"] >= min(last_timestamp, timestamp):
+                    continue
+                
+                if archive_id not in archived:
+                    ticks = decode_ticks(session.execute(
+                        select(TickArchive.__table__.c.data).where(TickArchive.__table__.c.id == archive_id)
+                    ).scalar())
+                    archived[archive_id] = (ticks, [tick["timestamp"] for tick in ticks])
+                ticks, times = archived[archive_id]
+                tick = ticks[bisect.bisect_right(times, timestamp) - 1]
+                quotes[index] = {column: tick[column] for column in QUOTE_COLUMNS}
+            
+            for index, quote in quotes.items():
+                quote["timestamp"] = quote["timestamp"].isoformat()
+                results[index] = {"symbol": queries[index][0], **quote}
+            
+            session.close()
+            
+            self.logger.info(f"Found as-of quotes for {len(quotes)} of {len(queries)} lookups")
+            return results
+        except Exception as e:
+            self.logger.error(f"Error getting as-of quotes: {e}")
+            if session:
+                session.close()
+            return None
+    
+    def get_quote_asof(self, symbol, timestamp):
+        """
+        Get the last real-time data for a symbol at or before a time.
+        
+        Args:
+            symbol (str): Stock symbol
+            timestamp (datetime): Point in time
+        
+        Returns:
+            dict: Real-time data, or an empty dict if there is none or on error
+        """
+        results = self.get_quotes_asof([(symbol, timestamp)])
+        return (results[0] if results else None) or {}
+    
+    def iter_ticks(self, symbol, start=None, end=None):
+        """
+        Stream the real-time data of a symbol in time order.
+        
+        Archived days are decoded one blob at a time and merged with the
+        ticks still in realtime_data.
+        
+        Args:
+            symbol (str): Stock symbol
+            start (datetime, optional): Earliest time to include
+            end (datetime, optional): Time before which to stop (exclusive)
+        
+        Yields:
+            dict: Real-time data
+        """
+        stock_id = self.get_stock_id(symbol, create=False)
+        if stock_id is None:
+            self.logger.error(f"Stock not found: {symbol}")
+            return
+        
+        table = RealtimeData.__table__
+        archive = TickArchive.__table__
+        
+        hot = select(*[table.c[column] for column in QUOTE_COLUMNS]).where(table.c.stock_id == stock_id)
+        days = select(archive.c.data).where(archive.c.stock_id == stock_id)
+        if start is not None:
+            hot = hot.where(table.c.timestamp >= start)
+            days = days.where(archive.c.last_timestamp >= start)
+        if end is not None:
+            hot = hot.where(table.c.timestamp < end)
+            days = days.where(archive.c.first_timestamp < end)
+        
+        session = self._read_session()
+        try:
+            def archived():
+                for blob in session.execute(days.order_by(archive.c.day).execution_options(stream_results=True)).scalars():
+                    ticks = decode_ticks(blob)
+                    # Only the days at the ends of the range need filtering
+                    if (start is not None and ticks[0]["timestamp"] < start) or (end is not None and ticks[-1]["timestamp"] >= end):
+                        ticks = [tick for tick in ticks if (start is None or tick["timestamp"] >= start) and (end is None or tick["timestamp"] < end)]
+                    yield from ticks
+            
+            rows = session.execute(hot.order_by(table.c.timestamp).execution_options(stream_results=True))
+            
+            # Both sources hold the QUOTE_COLUMNS in order
+            count = 0
+            for tick in heapq.merge(archived(), (row._mapping for row in rows), key=lambda tick: tick["timestamp"]):
+                count += 1
+                yield {"symbol": symbol, **tick, "timestamp": tick["timestamp"].isoformat()}
+            
+            self.logger.info(f"Streamed {count} real-time data records for {symbol}")
+        finally:
+            session.close()
+    
+    def get_latest_quotes(self, symbols=None):
+        """
+        Get the latest real-time data for many symbols in one query.
+        
+        Args:
+            symbols (list, optional): Stock symbols (default: all stocks with quotes)
+        
+        Returns:
+            list: Latest real-time data per symbol, or None on error
+        """
+        try:
+            session = self._read_session()
+            
+            query = session.query(Stock.symbol, LatestQuote).join(Stock, Stock.id == LatestQuote.stock_id)
+            
+            if symbols is not None:
+                stock_ids = [self.get_stock_id(symbol, create=False) for symbol in symbols]
+                query = query.filter(LatestQuote.stock_id.in_([stock_id for stock_id in stock_ids if stock_id is not None]))
+            
+            result = []
+            for symbol, data in query.order_by(Stock.symbol).all():
+                result.append({
+                    "symbol": symbol,
+                    "timestamp": data.timestamp.isoformat(),
+                    "price": data.price,
+                    "change": data.change,
+                    "change_percent": data.change_percent,
+                    "volume": data.volume,
+                    "market_cap": data.market_cap,
+                    "bid": data.bid,
+                    "ask": data.ask,
+                    "shares_outstanding": data.shares_outstanding,
+                    "sentiment": data.sentiment
+                })
+            
+            session.close()
+            
+            self.logger.info(f"Retrieved latest quotes for {len(result)} symbols")
+            return result
+        except Exception as e:
+            self.logger.error(f"Error getting latest quotes: {e}")
+            if session:
+                session.close()
+            return None
+    
+    def get_bars_page(self, symbol, interval="1m", limit=500, start=None, end=None, after=None, order="desc"):
+        """
+        Get a page of OHLCV bars for a symbol.
+        
+        Bars are read from ohlcv_bars and paged by a keyset cursor on the
+        bucket start, like historical data.
+        
+        Args:
+            symbol (str): Stock symbol
+            interval (str, optional): Bar interval, e.g. "1m", "5m" or "1h"
+            limit (int, optional): Maximum number of bars to return
+            start (datetime, optional): Earliest bucket start to include
+            end (datetime, optional): Bucket start before which to stop (exclusive)
+            after (datetime, optional): Bucket start of the last bar of the previous page
+            order (str, optional): "desc" (newest first) or "asc"
+        
+        Returns:
+            dict: Bars and the cursor of the next page (None on the last page), or None on error
+        """
+        try:
+            session = self._read_session()
+            
+            stock_id = self.get_stock_id(symbol, create=False)
+            if stock_id is None:
+                self.logger.error(f"Stock not found: {symbol}")
+                return {"data": [], "next_cursor": None}
+            
+            query = session.query(OhlcvBar).filter(OhlcvBar.stock_id == stock_id, OhlcvBar.interval == interval)
+            
+            if start is not None:
+                query = query.filter(OhlcvBar.bucket >= start)
+            if end is not None:
+                query = query.filter(OhlcvBar.bucket < end)
+            
+            if order == "asc":
+                if after is not None:
+                    query = query.filter(OhlcvBar.bucket > after)
+                query = query.order_by(OhlcvBar.bucket)
+            else:
+                if after is not None:
+                    query = query.filter(OhlcvBar.bucket < after)
+                query = query.order_by(desc(OhlcvBar.bucket))
+            
+            data = query.limit(limit + 1).all()
+            
+            next_cursor = None
+            if len(data) > limit:
+                data = data[:limit]
+                next_cursor = encode_cursor(data[-1].bucket)
+            
+            result = []
+            for item in data:
+                result.append({
+                    "timestamp": item.bucket.isoformat(),
+                    "open": item.open,
+                    "high": item.high,
+                    "low": item.low,
+                    "close": item.close,
+                    "volume": item.volume,
+                    "ticks": item.tick_count
+                })
+            
+            session.close()
+            
+            self.logger.info(f"Retrieved {len(result)} {interval} bars for {symbol}")
+            return {"data": result, "next_cursor": next_cursor}
+        except Exception as e:
+            self.logger.error(f"Error getting bars: {e}")
+            if session:
+                session.close()
+            return None
 
 if __name__ == "__main__":
     repo = Repository()
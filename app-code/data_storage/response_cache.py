@@ -0,0 +1,102 @@
+import sys
+import os
+import time
+import threading
+from collections import OrderedDict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger
+
+
+logger = get_logger("data_storage_response_cache")
+
+class ResponseCache:
+    """In-process LRU cache of rendered responses whose entries expire after a TTL."""
+    
+    def __init__(self, max_entries=1024, ttl_s=60):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_entries (int, optional): Number of entries kept; the least
+                recently used entry is evicted beyond it
+            ttl_s (float, optional): Seconds an entry is served for
+        """
+        self.logger = logger
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key):
+        """
+        Get a cached entry.
+        
+        Args:
+            key: Cache key
+        
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            
+            if item is not None and time.monotonic() - item[0] >= self.ttl_s:
+                del self._entries[key]
+                self.expirations += 1
+                item = None
+            
+            if item is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+    
+    def put(self, key, value):
+        """
+        Add an entry, evicting the least recently used ones beyond max_entries.
+        
+        Args:
+            key: Cache key
+            value: Value to cache
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self):
+        """
+        Get cache statistics.
+        
+        Returns:
+            dict: Size, hit and miss counts, hit ratio, evictions and expirations
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
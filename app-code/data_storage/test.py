@@ -1,13 +1,27 @@
 import sys
 import os
 import json
-from datetime import datetime
+import shutil
+import tempfile
+import math
+import statistics
+import threading
+import time
+from datetime import date, datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import get_logger
+from utils import get_logger, get_db_url
 
-from models import Stock, HistoricalData, RealtimeData, init_db
-from repository import Repository
+from sqlalchemy import create_engine, desc, text
+from models import Base, Stock, LatestQuote, HistoricalData, RealtimeData, OhlcvBar, Watermark, init_db
+from repository import Repository, decode_cursor
+from bulk_import import import_files
+from lake_export import export_lake
+from response_cache import ResponseCache
+from tick_archive import decode_ticks, encode_ticks
+from write_buffer import WriteBehindBuffer
+from coverage import is_trading_day, market_holidays
+from partitioning import DEFAULT_PARTITION, PartitionManager, apply_retention, convert_realtime_table, create_partitioned_table, ensure_partitions, is_partitioned, list_partitions
 
 logger = get_logger("data_storage_test")
 
@@ -165,6 +179,1278 @@ def test_repository():
     logger.info("Repository tests completed successfully")
     return True
 
+def test_bulk_upsert():
+    """Test set-based historical upserts."""
+    logger.info("Testing bulk_upsert_historical_data...")
+    
+    # Materialized indicators would replace the ma5 values sent
+    repo = Repository(materialize_indicators=False)
+    symbol = f"BULK_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    
+    historical_data = [
+        {
+            "date": f"2023-01-0{day}T00:00:00",
+            "open": 100.0 + day,
+            "high": 101.0 + day,
+            "low": 99.0 + day,
+            "close": 100.5 + day,
+            "volume": 1000000,
+            "ma5": 100.0
+        }
+        for day in range(1, 4)
+    ]
+    
+    repo.bulk_upsert_historical_data(symbol, historical_data)
+    
+    historical_data[0]["close"] = 42.0
+    del historical_data[0]["ma5"]
+    historical_data.append({**historical_data[1], "date": "2023-01-05T00:00:00"})
+    
+    result = repo.bulk_upsert_historical_data(symbol, historical_data, chunk_size=2)
+    if not result or result["inserted"] != 1 or result["updated"] != 3 or len(result["batches"]) != 2:
+        logger.error(f"Unexpected bulk upsert result: {result}")
+        return False
+    
+    retrieved = {item["date"]: item for item in repo.get_historical_data(symbol)}
+    first = retrieved.get("2023-01-01T00:00:00")
+    if len(retrieved) != 4 or not first or first["close"] != 42.0 or first["ma5"] != 100.0:
+        logger.error(f"Unexpected historical data after bulk upsert: {retrieved}")
+        return False
+    
+    logger.info("Bulk upsert tests completed successfully")
+    return True
+
+def test_bulk_import():
+    """Test importing CSV and Parquet files of historical data."""
+    logger.info("Testing bulk import...")
+    
+    repo = Repository()
+    suffix = datetime.now().strftime('%H%M%S%f')
+    first, second = f"IMPORT_A_{suffix}", f"IMPORT_B_{suffix}"
+    directory = tempfile.mkdtemp()
+    
+    try:
+        csv_path = os.path.join(directory, "bars.csv")
+        with open(csv_path, "w") as file:
+            file.write("Symbol,Date,Open,High,Low,Close,Volume\n")
+            for day in range(1, 6):
+                for symbol in (first, second):
+                    file.write(f"{symbol},2023-01-{day:02d},{day},{day},{day},{day},{day * 100}\n")
+            # Duplicate of an earlier row, which replaces it, and an invalid row
+            file.write(f"{first},2023-01-01,1,1,1,42,100\n")
+            file.write(f"{first},2023-01-06,1,1,1,,100\n")
+        
+        result = import_files(repo, [csv_path], chunk_size=3)
+        if not result or result["read"] != 12 or result["rejected"] != 1 or result["symbols"] != 2:
+            logger.error(f"Unexpected CSV import result: {result}")
+            return False
+        
+        retrieved = {item["date"]: item for item in repo.get_historical_data(first)}
+        if len(retrieved) != 5 or retrieved["2023-01-01T00:00:00"]["close"] != 42.0 or retrieved["2023-01-05T00:00:00"]["ma5"] is None:
+            logger.error(f"Unexpected historical data after CSV import: {retrieved}")
+            return False
+        
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.warning("pyarrow is not installed, skipping Parquet import")
+        else:
+            parquet_path = os.path.join(directory, "bars.parquet")
+            pq.write_table(pa.table({
+                "date": [date(2023, 1, day) for day in range(5, 8)],
+                "open": [5.0, 6.0, 7.0],
+                "high": [5.0, 6.0, 7.0],
+                "low": [5.0, 6.0, 7.0],
+                "close": [50.0, 6.0, 7.0],
+                "volume": [500, 600, 700]
+            }), parquet_path)
+            
+            result = import_files(repo, [parquet_path], chunk_size=2, symbol=second)
+            if not result or result["read"] != 3 or result["rejected"] != 0:
+                logger.error(f"Unexpected Parquet import result: {result}")
+                return False
+            
+            closes = [item["close"] for item in repo.get_historical_data(second, order="asc")]
+            if closes != [1.0, 2.0, 3.0, 4.0, 50.0, 6.0, 7.0]:
+                logger.error(f"Unexpected historical data after Parquet import: {closes}")
+                return False
+        
+        coverage = repo.get_coverage(first)
+        if not coverage or coverage["rows"] != 5:
+            logger.error(f"Unexpected coverage after import: {coverage}")
+            return False
+    finally:
+        shutil.rmtree(directory)
+    
+    logger.info("Bulk import tests completed successfully")
+    return True
+
+def test_historical_pagination():
+    """Test time-range and keyset-paginated historical reads."""
+    logger.info("Testing historical pagination...")
+    
+    repo = Repository()
+    symbol = f"PAGE_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    
+    repo.bulk_upsert_historical_data(symbol, [
+        {"date": f"2023-01-{day:02d}T00:00:00", "open": day, "high": day, "low": day, "close": day, "volume": day}
+        for day in range(1, 31)
+    ])
+    
+    for order in ("asc", "desc"):
+        closes = []
+        after = None
+        while True:
+            page = repo.get_historical_page(symbol, limit=7, start=datetime(2023, 1, 5), end=datetime(2023, 1, 25), after=after, order=order)
+            closes.extend(item["close"] for item in page["data"])
+            if not page["next_cursor"]:
+                break
+            after = decode_cursor(page["next_cursor"])
+        
+        expected = list(range(5, 25)) if order == "asc" else list(range(24, 4, -1))
+        if closes != expected:
+            logger.error(f"Unexpected {order} pages: {closes}")
+            return False
+    
+    projected = repo.get_historical_data(symbol, limit=2, fields=["close", "volume"])
+    streamed = list(repo.iter_historical_data(symbol, limit=2, fields=["close", "volume"]))
+    expected = [
+        {"symbol": symbol, "date": f"2023-01-{day}T00:00:00", "close": day, "volume": day}
+        for day in (30, 29)
+    ]
+    if projected != expected or streamed != expected:
+        logger.error(f"Unexpected projected historical data: {projected}, {streamed}")
+        return False
+    
+    logger.info("Historical pagination tests completed successfully")
+    return True
+
+def test_historical_multi():
+    """Test multi-symbol historical reads."""
+    logger.info("Testing get_historical_data_multi...")
+    
+    repo = Repository()
+    suffix = datetime.now().strftime('%H%M%S%f')
+    symbols = [f"MULTI_A_{suffix}", f"MULTI_B_{suffix}"]
+    
+    for offset, symbol in enumerate(symbols):
+        repo.bulk_upsert_historical_data(symbol, [
+            {"date": f"2023-01-{day:02d}T00:00:00", "open": day, "high": day, "low": day, "close": day + offset * 100, "volume": day}
+            for day in range(1, 11)
+        ])
+    
+    def closes(data):
+        return {symbol: [item["close"] for item in items] for symbol, items in data.items()}
+    
+    data = repo.get_historical_data_multi(symbols + ["UNKNOWN_SYMBOL"], start=datetime(2023, 1, 8))
+    if closes(data) != {symbols[0]: [10, 9, 8], symbols[1]: [110, 109, 108], "UNKNOWN_SYMBOL": []}:
+        logger.error(f"Unexpected multi-symbol data: {closes(data)}")
+        return False
+    
+    data = repo.get_historical_data_multi(symbols, limit=2, order="asc")
+    if closes(data) != {symbols[0]: [1, 2], symbols[1]: [101, 102]}:
+        logger.error(f"Unexpected multi-symbol data with limit per symbol: {closes(data)}")
+        return False
+    
+    logger.info("Multi-symbol historical tests completed successfully")
+    return True
+
+def test_computed_indicators():
+    """Test indicators computed with window functions."""
+    logger.info("Testing get_indicator_page and materialized indicators...")
+    
+    repo = Repository()
+    symbol = f"INDICATORS_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    closes = [100 + 10 * math.sin(day / 3) + day / 2 for day in range(60)]
+    
+    rows = [
+        {"date": datetime(2023, 1, 1).replace(day=1 + day % 28, month=1 + day // 28).isoformat(), "open": close, "high": close, "low": close, "close": close, "volume": 1000}
+        for day, close in enumerate(closes)
+    ]
+    # Appended in two writes, so that the second one carries over the rolling
+    # state of the first when materializing indicators
+    repo.bulk_upsert_historical_data(symbol, rows[:40])
+    repo.store_historical_data(symbol, rows[40:])
+    
+    returns = [None] + [closes[i] / closes[i - 1] - 1 for i in range(1, len(closes))]
+    changes = [None] + [closes[i] - closes[i - 1] for i in range(1, len(closes))]
+    
+    def rsi(i):
+        gain = sum(max(change, 0) for change in changes[i - 13:i + 1])
+        loss = sum(max(-change, 0) for change in changes[i - 13:i + 1])
+        return 100 - 100 / (1 + gain / loss)
+    
+    def expected(i):
+        return {
+            "ma5": statistics.mean(closes[i - 4:i + 1]) if i >= 4 else None,
+            "ma20": statistics.mean(closes[i - 19:i + 1]) if i >= 19 else None,
+            "daily_return": returns[i],
+            "volatility": statistics.stdev(returns[i - 19:i + 1]) if i >= 20 else None,
+            "rsi": rsi(i) if i >= 14 else None
+        }
+    
+    def matches(data, indexes):
+        if len(data) != len(indexes):
+            return False
+        for item, i in zip(data, indexes):
+            for name, value in expected(i).items():
+                if (value is None) != (item[name] is None) or (value is not None and not math.isclose(value, item[name], rel_tol=1e-6)):
+                    logger.error(f"Unexpected {name} on {item['date']}: {item[name]} instead of {value}")
+                    return False
+        return True
+    
+    if not matches(repo.get_indicator_page(symbol, limit=100, order="asc")["data"], range(60)):
+        return False
+    if not matches(repo.get_historical_page(symbol, limit=100, order="asc")["data"], range(60)):
+        logger.error("Materialized indicators differ from the computed ones")
+        return False
+    
+    # Windows reaching before the requested rows must still be full
+    page = repo.get_indicator_page(symbol, limit=5)
+    if not matches(page["data"], range(59, 54, -1)):
+        return False
+    if not matches(repo.get_indicator_page(symbol, limit=5, after=decode_cursor(page["next_cursor"]))["data"], range(54, 49, -1)):
+        return False
+    
+    page = repo.get_indicator_page(symbol, limit=3, start=datetime(2023, 2, 3), order="asc")
+    if not matches(page["data"], range(30, 33)):
+        return False
+    if not matches(repo.get_indicator_page(symbol, limit=3, after=decode_cursor(page["next_cursor"]), order="asc")["data"], range(33, 36)):
+        return False
+    
+    if not matches(repo.get_indicator_page(symbol, start=datetime(2023, 1, 25), end=datetime(2023, 1, 28))["data"], range(26, 23, -1)):
+        return False
+    
+    logger.info("Computed indicators tests completed successfully")
+    return True
+
+def test_coverage():
+    """Test the historical coverage index and backfill planner."""
+    logger.info("Testing coverage...")
+    
+    holidays = market_holidays(2023)
+    for day in (date(2023, 1, 2), date(2023, 1, 16), date(2023, 4, 7), date(2023, 6, 19), date(2023, 11, 23), date(2023, 12, 25)):
+        if day not in holidays:
+            logger.error(f"{day} should be a market holiday")
+            return False
+    if not is_trading_day(date(2021, 12, 31)) or is_trading_day(date(2023, 1, 7)):
+        logger.error("Unexpected trading days")
+        return False
+    
+    repo = Repository()
+    symbol = f"COVERAGE_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    missing = {10, 11, 20}
+    
+    repo.bulk_upsert_historical_data(symbol, [
+        {"date": f"2023-01-{day:02d}T00:00:00", "open": day, "high": day, "low": day, "close": day, "volume": day}
+        for day in range(3, 32) if is_trading_day(date(2023, 1, day)) and day not in missing
+    ])
+    
+    coverage = repo.get_coverage(symbol, end=date(2023, 1, 31))
+    expected_gaps = [
+        {"start": "2023-01-10", "end": "2023-01-11", "missing_days": 2},
+        {"start": "2023-01-20", "end": "2023-01-20", "missing_days": 1}
+    ]
+    if (coverage["first_date"], coverage["last_date"], coverage["missing_days"]) != ("2023-01-03", "2023-01-31", 3) or coverage["gaps"] != expected_gaps:
+        logger.error(f"Unexpected coverage: {coverage}")
+        return False
+    
+    # Five stored trading days separate the gaps (January 16 is a holiday)
+    if coverage["fetch_plan"] != [{"start": "2023-01-10", "end": "2023-01-21", "missing_days": 3}]:
+        logger.error(f"Close gaps should be fetched together: {coverage['fetch_plan']}")
+        return False
+    
+    plan = repo.get_coverage(symbol, start=date(2022, 12, 27), end=date(2023, 2, 2), merge_gap_days=4)["fetch_plan"]
+    expected_plan = [
+        {"start": "2022-12-27", "end": "2022-12-31", "missing_days": 4},
+        {"start": "2023-01-10", "end": "2023-01-12", "missing_days": 2},
+        {"start": "2023-01-20", "end": "2023-01-21", "missing_days": 1},
+        {"start": "2023-02-01", "end": "2023-02-03", "missing_days": 2}
+    ]
+    if plan != expected_plan:
+        logger.error(f"Unexpected fetch plan: {plan}")
+        return False
+    
+    repo.store_historical_data(symbol, [
+        {"date": f"2023-01-{day:02d}T00:00:00", "open": day, "high": day, "low": day, "close": day, "volume": day}
+        for day in missing
+    ])
+    coverage = repo.get_coverage(symbol, end=date(2023, 1, 31))
+    if coverage["missing_days"] != 0 or coverage["gaps"] or coverage["fetch_plan"]:
+        logger.error(f"Filled gaps should leave the coverage complete: {coverage}")
+        return False
+    
+    # Without an end the plan fetches up to the last trading day before today
+    if repo.get_coverage(symbol)["fetch_plan"][0]["start"] != "2023-02-01":
+        logger.error("Days after the last stored date should be planned")
+        return False
+    
+    # Incremental refreshes after writes match a full rebuild
+    writes = [
+        ["2023-02-10", "2023-02-13"],
+        ["2023-02-06"],
+        ["2023-01-25", "2023-02-15"],
+        ["2023-02-01", "2023-02-02", "2023-02-03"]
+    ]
+    for days in writes:
+        repo.bulk_upsert_historical_data(symbol, [
+            {"date": f"{day}T00:00:00", "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1}
+            for day in days
+        ])
+        incremental = repo.get_coverage(symbol, end=date(2023, 2, 15))
+        repo.refresh_coverage([symbol])
+        rebuilt = repo.get_coverage(symbol, end=date(2023, 2, 15))
+        if {**incremental, "updated_at": None} != {**rebuilt, "updated_at": None}:
+            logger.error(f"Incremental coverage after writing {days} differs from a rebuild: {incremental} {rebuilt}")
+            return False
+    if rebuilt["missing_days"] != 4 or rebuilt["rows"] != 27:
+        logger.error(f"Unexpected coverage after incremental writes: {rebuilt}")
+        return False
+    
+    if repo.get_coverage("UNKNOWN_SYMBOL") != {}:
+        logger.error("Unknown symbols should have no coverage")
+        return False
+    
+    logger.info("Coverage tests completed successfully")
+    return True
+
+def test_historical_streaming():
+    """Test streaming historical reads."""
+    logger.info("Testing iter_historical_data...")
+    
+    repo = Repository()
+    symbol = f"STREAM_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    
+    repo.bulk_upsert_historical_data(symbol, [
+        {"date": f"2023-01-{day:02d}T00:00:00", "open": day, "high": day, "low": day, "close": day, "volume": day}
+        for day in range(1, 31)
+    ])
+    
+    streamed = [item["close"] for item in repo.iter_historical_data(symbol, order="asc", batch_size=7)]
+    if streamed != list(range(1, 31)):
+        logger.error(f"Unexpected streamed data: {streamed}")
+        return False
+    
+    logger.info("Historical streaming tests completed successfully")
+    return True
+
+def test_historical_table():
+    """Test columnar historical reads."""
+    logger.info("Testing get_historical_table...")
+    
+    repo = Repository()
+    symbol = f"ARROW_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    
+    repo.bulk_upsert_historical_data(symbol, [
+        {"date": f"2023-01-{day:02d}T00:00:00", "open": day, "high": day, "low": day, "close": day, "volume": day}
+        for day in range(1, 31)
+    ])
+    
+    table = repo.get_historical_table(symbol, start=datetime(2023, 1, 11), order="asc", batch_size=7)
+    if table is None or table.column("close").to_pylist() != list(range(11, 31)) or table.schema.metadata[b"symbol"] != symbol.encode():
+        logger.error(f"Unexpected historical table: {table}")
+        return False
+    
+    logger.info("Historical table tests completed successfully")
+    return True
+
+def test_stock_registry():
+    """Test the symbol to stock id registry."""
+    logger.info("Testing stock registry...")
+    
+    repo = Repository()
+    symbol = f"REGISTRY_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    
+    if repo.get_stock_id(symbol, create=False) is not None:
+        logger.error("Unknown symbol should not resolve without create")
+        return False
+    
+    stock_id = repo.get_stock_id(symbol)
+    stats = repo.get_stock_registry_stats()
+    
+    if repo.get_stock_id(symbol) != stock_id or repo.get_stock_registry_stats()["hits"] != stats["hits"] + 1:
+        logger.error("Second lookup should be served from the registry")
+        return False
+    
+    other = Repository()
+    if other.get_stock_id(symbol) != stock_id or other.get_stock_registry_stats()["misses"] != 0:
+        logger.error("Registry should be preloaded from the stocks table")
+        return False
+    
+    logger.info("Stock registry tests completed successfully")
+    return True
+
+def test_connection_pool():
+    """Test the shared engine and its pool statistics."""
+    logger.info("Testing connection pool...")
+    
+    repo = Repository()
+    
+    if Repository().engine is not repo.engine:
+        logger.error("Repositories should share one engine")
+        return False
+    
+    pool = repo.engine.pool
+    Repository().close()
+    if repo.engine.pool is not pool:
+        logger.error("Closing a repository should not dispose the shared engine")
+        return False
+    
+    before = repo.get_pool_stats()
+    repo.get_latest_quotes([])
+    stats = repo.get_pool_stats()
+    
+    if stats["checkouts"] <= before["checkouts"] or stats["checked_out"] != before["checked_out"]:
+        logger.error(f"Unexpected pool stats: {stats}")
+        return False
+    
+    if stats["wait_ms_buckets"]["+Inf"] != stats["checkouts"] + stats["timeouts"]:
+        logger.error(f"Wait histogram does not cover every checkout: {stats}")
+        return False
+    
+    logger.info("Connection pool tests completed successfully")
+    return True
+
+def test_stocks():
+    """Test the cached stock universe and its ETag."""
+    logger.info("Testing get_stocks...")
+    
+    repo = Repository()
+    suffix = datetime.now().strftime('%H%M%S%f')
+    sector = f"Sector {suffix}"
+    
+    first = repo.get_stocks()
+    if repo.get_stocks()["etag"] != first["etag"]:
+        logger.error("ETag should not change while the universe is unchanged")
+        return False
+    
+    repo.get_or_create_stock(f"STOCKS_B_{suffix}", name="B Corp", sector=sector, industry="Widgets")
+    repo.get_or_create_stock(f"STOCKS_A_{suffix}", name="A Corp", sector=sector, industry="Gadgets")
+    
+    second = repo.get_stocks()
+    if second["etag"] == first["etag"] or len(second["data"]) != len(first["data"]) + 2:
+        logger.error("Inserting a stock should invalidate the cached universe")
+        return False
+    
+    filtered = repo.get_stocks(sector=sector.upper())["data"]
+    if [stock["symbol"] for stock in filtered] != [f"STOCKS_A_{suffix}", f"STOCKS_B_{suffix}"]:
+        logger.error(f"Unexpected stocks in sector: {filtered}")
+        return False
+    
+    if [stock["name"] for stock in repo.get_stocks(sector=sector, industry="widgets")["data"]] != ["B Corp"]:
+        logger.error("Industry filter should narrow the sector")
+        return False
+    
+    import api
+    client = api.app.test_client()
+    
+    response = client.get("/api/v1/stocks", query_string={"sector": sector})
+    etag = response.headers.get("ETag")
+    if response.status_code != 200 or response.json["count"] != 2 or not etag:
+        logger.error(f"Unexpected stocks response: {response.status_code} {response.json}")
+        return False
+    
+    response = client.get("/api/v1/stocks", query_string={"sector": sector}, headers={"If-None-Match": etag})
+    if response.status_code != 304 or response.data:
+        logger.error(f"Matching If-None-Match should get an empty 304, got {response.status_code}")
+        return False
+    
+    logger.info("Stocks tests completed successfully")
+    return True
+
+def test_response_cache():
+    """Test the read response cache and conditional requests."""
+    logger.info("Testing response cache...")
+    
+    cache = ResponseCache(max_entries=2, ttl_s=60)
+    for key in ("a", "b", "c"):
+        cache.put(key, key.upper())
+    if cache.get("a") is not None or cache.get("c") != "C" or cache.get_stats()["evictions"] != 1:
+        logger.error(f"Least recently used entry should be evicted: {cache.get_stats()}")
+        return False
+    
+    cache.ttl_s = 0
+    if cache.get("c") is not None or cache.get_stats()["expirations"] != 1:
+        logger.error("Expired entries should not be served")
+        return False
+    
+    import api
+    client = api.app.test_client()
+    symbol = f"CACHE_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    url = f"/api/v1/historical/{symbol}"
+    
+    api.repository.bulk_upsert_historical_data(symbol, [
+        {"date": f"2023-01-{day:02d}T00:00:00", "open": day, "high": day, "low": day, "close": day, "volume": day}
+        for day in range(1, 4)
+    ])
+    
+    first = client.get(url)
+    hits = api.response_cache.get_stats()["hits"]
+    second = client.get(url)
+    if second.data != first.data or api.response_cache.get_stats()["hits"] != hits + 1:
+        logger.error("Repeated read should be served from the cache")
+        return False
+    
+    etag = first.headers["ETag"]
+    if client.get(url, headers={"If-None-Match": etag}).status_code != 304:
+        logger.error("Matching If-None-Match should get a 304")
+        return False
+    # Writes by other processes are not seen here, so no modification time is claimed
+    if "Last-Modified" in first.headers or client.get(url, headers={"If-Modified-Since": "Sun, 17 Oct 2100 00:00:00 GMT"}).status_code != 200:
+        logger.error("Responses should be validated by ETag only")
+        return False
+    
+    # Ticks do not change historical data
+    api.repository.store_realtime_data({"symbol": symbol, "timestamp": "2023-01-04T12:00:00", "price": 4.0})
+    if client.get(url, headers={"If-None-Match": etag}).status_code != 304:
+        logger.error("Real-time writes should not invalidate historical responses")
+        return False
+    
+    api.repository.store_historical_data(symbol, [
+        {"date": "2023-01-04T00:00:00", "open": 4, "high": 4, "low": 4, "close": 4, "volume": 4}
+    ])
+    response = client.get(url, headers={"If-None-Match": etag})
+    if response.status_code != 200 or len(response.json["data"]) != 4:
+        logger.error("Historical writes should invalidate cached responses")
+        return False
+    
+    logger.info("Response cache tests completed successfully")
+    return True
+
+def test_realtime_batch():
+    """Test batch real-time ingestion with per-item rejects."""
+    logger.info("Testing store_realtime_batch...")
+    
+    repo = Repository()
+    suffix = datetime.now().strftime('%H%M%S%f')
+    symbols = [f"BATCH_A_{suffix}", f"BATCH_B_{suffix}"]
+    
+    ticks = [
+        {"symbol": symbols[i % 2], "timestamp": f"2023-01-03T12:00:{i:02d}", "price": 100.0 + i, "volume": 1000 * i, "sentiment": "neutral"}
+        for i in range(10)
+    ]
+    ticks.insert(3, {"symbol": symbols[0], "timestamp": "not a timestamp", "price": 1.0})
+    ticks.insert(6, {"timestamp": "2023-01-03T12:00:00", "price": 1.0})
+    ticks.insert(8, {"symbol": symbols[1], "timestamp": "2023-01-03T12:00:00", "price": "abc"})
+    
+    result = repo.store_realtime_batch(ticks)
+    if not result or result["stored"] != 10 or [item["index"] for item in result["rejected"]] != [3, 6, 8]:
+        logger.error(f"Unexpected batch result: {result}")
+        return False
+    
+    latest = repo.get_realtime_data(symbols[1])
+    if not latest or latest["price"] != 109.0 or latest["volume"] != 9000:
+        logger.error(f"Unexpected latest tick after batch: {latest}")
+        return False
+    
+    logger.info("Real-time batch tests completed successfully")
+    return True
+
+def test_write_behind():
+    """Test buffered real-time writes with group commit."""
+    logger.info("Testing write-behind buffer...")
+    
+    repo = Repository(write_behind={"enabled": True, "flush_interval_ms": 50, "flush_rows": 100, "max_rows": 250})
+    symbol = f"BUFFER_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    
+    stored = 0
+    for i in range(300):
+        stored += repo.store_realtime_data({"symbol": symbol, "timestamp": f"2023-01-03T12:{i // 60:02d}:{i % 60:02d}", "price": 100.0 + i})
+    
+    repo.close()
+    stats = repo.get_write_buffer_stats()
+    
+    if stats["depth"] != 0 or stats["flushed"] != stored or stats["dropped"] != 300 - stored or stats["failed"]:
+        logger.error(f"Unexpected write buffer stats: {stats}")
+        return False
+    
+    if not Repository(write_behind={}).get_realtime_data(symbol):
+        logger.error("Buffered real-time data was not flushed")
+        return False
+    
+    # Groups that fail to flush are retried in order before newer rows
+    written = []
+    failures = [2]
+    
+    def flaky_flush(rows):
+        if failures[0]:
+            failures[0] -= 1
+            raise RuntimeError("database unavailable")
+        written.extend(rows)
+    
+    buffer = WriteBehindBuffer(flaky_flush, flush_interval_ms=10, flush_rows=10, max_rows=100, retry_backoff_ms=10)
+    for i in range(50):
+        buffer.put(i)
+    buffer.close()
+    stats = buffer.get_stats()
+    if written != list(range(50)) or stats["failed"] or stats["retried"] != 20:
+        logger.error(f"Failed flushes should be retried in order: {written} {stats}")
+        return False
+    
+    # A group that keeps failing is dropped after the retries
+    buffer = WriteBehindBuffer(lambda rows: 1 / 0, flush_interval_ms=10, max_retries=2, retry_backoff_ms=10)
+    buffer.put(1)
+    buffer.close()
+    stats = buffer.get_stats()
+    if stats["failed"] != 1 or stats["retried"] != 2 or stats["depth"] != 0:
+        logger.error(f"A group that keeps failing should be dropped after the retries: {stats}")
+        return False
+    
+    logger.info("Write-behind tests completed successfully")
+    return True
+
+def test_latest_quotes():
+    """Test the latest quote snapshot maintained on write."""
+    logger.info("Testing latest quotes...")
+    
+    repo = Repository()
+    suffix = datetime.now().strftime('%H%M%S%f')
+    symbols = [f"QUOTE_A_{suffix}", f"QUOTE_B_{suffix}"]
+    
+    repo.store_realtime_data({"symbol": symbols[0], "timestamp": "2023-01-03T12:00:05", "price": 105.0})
+    repo.store_realtime_data({"symbol": symbols[0], "timestamp": "2023-01-03T12:00:01", "price": 101.0})
+    repo.store_realtime_batch([
+        {"symbol": symbols[1], "timestamp": f"2023-01-03T12:00:{i:02d}", "price": 200.0 + i}
+        for i in (3, 9, 1)
+    ])
+    
+    if repo.get_realtime_data(symbols[0]).get("price") != 105.0:
+        logger.error("Out-of-order tick moved the latest quote back")
+        return False
+    
+    quotes = repo.get_latest_quotes(symbols + ["UNKNOWN_SYMBOL"])
+    if [(quote["symbol"], quote["price"]) for quote in quotes or []] != [(symbols[0], 105.0), (symbols[1], 209.0)]:
+        logger.error(f"Unexpected latest quotes: {quotes}")
+        return False
+    
+    logger.info("Latest quotes tests completed successfully")
+    return True
+
+def test_bars():
+    """Test OHLCV bars rolled up on write and by the catch-up rollup."""
+    logger.info("Testing bars...")
+    
+    repo = Repository(bars={"mode": "write", "intervals": ["1m", "5m"]})
+    symbol = f"BARS_{datetime.now().strftime('%H%M%S%f')}"
+    
+    ticks = [
+        ("2023-01-03T12:00:10", 100.0, 1000),
+        ("2023-01-03T12:00:50", 103.0, 1600),
+        ("2023-01-03T12:01:30", 99.0, 2000),
+        ("2023-01-03T12:00:20", 104.0, 1200),
+        ("2023-01-03T12:05:00", 101.0, 2500)
+    ]
+    repo.store_realtime_batch([
+        {"symbol": symbol, "timestamp": timestamp, "price": price, "volume": volume}
+        for timestamp, price, volume in ticks[:3]
+    ])
+    for timestamp, price, volume in ticks[3:]:
+        repo.store_realtime_data({"symbol": symbol, "timestamp": timestamp, "price": price, "volume": volume})
+    
+    expected = {
+        "1m": [
+            ("2023-01-03T12:00:00", 100.0, 104.0, 100.0, 103.0, 600, 3),
+            ("2023-01-03T12:01:00", 99.0, 99.0, 99.0, 99.0, 400, 1),
+            ("2023-01-03T12:05:00", 101.0, 101.0, 101.0, 101.0, 500, 1)
+        ],
+        "5m": [
+            ("2023-01-03T12:00:00", 100.0, 104.0, 99.0, 99.0, 1000, 4),
+            ("2023-01-03T12:05:00", 101.0, 101.0, 101.0, 101.0, 500, 1)
+        ]
+    }
+    
+    def get_bars(interval):
+        page = repo.get_bars_page(symbol, interval, order="asc")
+        return [
+            (bar["timestamp"], bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"], bar["ticks"])
+            for bar in page["data"]
+        ]
+    
+    for interval, bars in expected.items():
+        if get_bars(interval) != bars:
+            logger.error(f"Unexpected {interval} bars rolled up on write: {get_bars(interval)}")
+            return False
+    
+    # Volume traded between buckets is not lost
+    volumes = {interval: sum(bar[5] for bar in get_bars(interval)) for interval in expected}
+    if set(volumes.values()) != {ticks[-1][2] - ticks[0][2]}:
+        logger.error(f"Unexpected total bar volumes: {volumes}")
+        return False
+    
+    page = repo.get_bars_page(symbol, "1m", limit=2)
+    if [bar["timestamp"] for bar in page["data"]] != ["2023-01-03T12:05:00", "2023-01-03T12:01:00"] or not page["next_cursor"]:
+        logger.error(f"Unexpected first page of bars: {page}")
+        return False
+    
+    # Catch-up rollup rebuilds the same bars from realtime_data
+    stock_id = repo.get_stock_id(symbol)
+    with repo.engine.begin() as conn:
+        conn.execute(OhlcvBar.__table__.delete().where(OhlcvBar.__table__.c.stock_id == stock_id))
+        conn.execute(Watermark.__table__.delete().where(Watermark.__table__.c.name == "ohlcv_bars"))
+    
+    result = repo.rollup_realtime_data()
+    if not result or result["ticks"] < len(ticks):
+        logger.error(f"Unexpected rollup result: {result}")
+        return False
+    
+    for interval, bars in expected.items():
+        if get_bars(interval) != bars:
+            logger.error(f"Unexpected {interval} bars after catch-up: {get_bars(interval)}")
+            return False
+    
+    repo.close()
+    
+    logger.info("Bars tests completed successfully")
+    return True
+
+def test_bars_archived():
+    """Test late ticks of archived days rolled up into bars."""
+    logger.info("Testing bars of archived days...")
+    
+    repo = Repository(bars={"mode": "write", "intervals": ["1m", "5m"]})
+    symbol = f"BARS_ARCHIVE_{datetime.now().strftime('%H%M%S%f')}"
+    
+    repo.store_realtime_batch([
+        {"symbol": symbol, "timestamp": timestamp, "price": price, "volume": volume}
+        for timestamp, price, volume in [
+            ("2023-01-03T12:00:10", 100.0, 1000),
+            ("2023-01-03T12:00:50", 103.0, 1600),
+            ("2023-01-03T12:01:30", 99.0, 2000),
+            ("2023-01-04T09:30:00", 50.0, 300)
+        ]
+    ])
+    
+    def get_bars():
+        return {
+            interval: [(bar["timestamp"], bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"], bar["ticks"]) for bar in repo.get_bars_page(symbol, interval, order="asc")["data"]]
+            for interval in ("1m", "5m")
+        }
+    
+    before = get_bars()
+    result = repo.archive_realtime_data(before=datetime(2023, 1, 4), symbols=[symbol])
+    if not result or result["ticks"] != 3:
+        logger.error(f"Unexpected archive result: {result}")
+        return False
+    
+    # Late for the stock, so its bars are rebuilt from the archived day on
+    repo.store_realtime_data({"symbol": symbol, "timestamp": "2023-01-03T12:00:20", "price": 104.0, "volume": 1200})
+    
+    # Only the bars of the late tick change, and its volume lies within theirs
+    expected = {
+        "1m": [("2023-01-03T12:00:00", 100.0, 104.0, 100.0, 103.0, 600, 3)] + before["1m"][1:],
+        "5m": [("2023-01-03T12:00:00", 100.0, 104.0, 99.0, 99.0, 1000, 4)] + before["5m"][1:]
+    }
+    if before["1m"][0] != ("2023-01-03T12:00:00", 100.0, 103.0, 100.0, 103.0, 600, 2) or get_bars() != expected:
+        logger.error(f"Unexpected bars after a late tick of an archived day: {get_bars()} before {before}")
+        return False
+    
+    # A writer of a stock waits for another's open transaction, so both do
+    # not count the volume since the same stored tick
+    if repo.engine.dialect.name == "postgresql":
+        symbol = f"BARS_CONCURRENT_{datetime.now().strftime('%H%M%S%f')}"
+        repo.store_realtime_data({"symbol": symbol, "timestamp": "2023-01-05T10:00:00", "price": 1.0, "volume": 1000})
+        
+        first = repo._parse_realtime_tick({"symbol": symbol, "timestamp": "2023-01-05T10:00:10", "price": 1.0, "volume": 1100})
+        first["stock_id"] = repo.get_stock_id(symbol)
+        second = threading.Thread(target=repo.store_realtime_batch, args=([
+            {"symbol": symbol, "timestamp": "2023-01-05T10:00:20", "price": 1.0, "volume": 1300}
+        ],))
+        with repo.engine.begin() as conn:
+            repo._write_realtime_rows(conn, [first])
+            second.start()
+            second.join(0.5)
+        second.join()
+        
+        volume = sum(bar["volume"] for bar in repo.get_bars_page(symbol, "1m")["data"])
+        if volume != 300:
+            logger.error(f"Unexpected bar volume after concurrent writes: {volume}")
+            return False
+    
+    repo.close()
+    
+    logger.info("Bars of archived days tests completed successfully")
+    return True
+
+def test_bars_api():
+    """Test the bars endpoint."""
+    logger.info("Testing bars API...")
+    
+    import api
+    client = api.app.test_client()
+    symbol = f"BARS_API_{datetime.now().strftime('%H%M%S%f')}"
+    url = f"/api/v1/bars/{symbol}"
+    
+    api.repository.store_realtime_batch([
+        {"symbol": symbol, "timestamp": f"2023-01-03T12:0{minute}:10", "price": 100.0 + minute, "volume": 1000 * (minute + 1)}
+        for minute in range(3)
+    ])
+    
+    response = client.get(url, query_string={"interval": "1m", "order": "asc", "limit": 2})
+    if response.status_code != 200:
+        logger.error(f"Unexpected bars response: {response.status_code} {response.json}")
+        return False
+    
+    page = response.json
+    if [bar["timestamp"] for bar in page["data"]] != ["2023-01-03T12:00:00", "2023-01-03T12:01:00"] or not page["next_cursor"]:
+        logger.error(f"Unexpected first page of bars: {page}")
+        return False
+    
+    response = client.get(url, query_string={"interval": "1m", "order": "asc", "after": page["next_cursor"]})
+    if response.status_code != 200 or [bar["close"] for bar in response.json["data"]] != [102.0]:
+        logger.error(f"Unexpected second page of bars: {response.status_code} {response.json}")
+        return False
+    
+    response = client.get(url, query_string={"start": "2023-01-03T12:01:00", "end": "2023-01-03T12:02:00"})
+    if response.status_code != 200 or [bar["close"] for bar in response.json["data"]] != [101.0]:
+        logger.error(f"Unexpected bars in a time range: {response.status_code} {response.json}")
+        return False
+    
+    for query_string in ({"interval": "2m"}, {"fields": "close"}, {"limit": 0}, {"start": "yesterday"}):
+        response = client.get(url, query_string=query_string)
+        if response.status_code != 400:
+            logger.error(f"Invalid bars request {query_string} should get a 400, got {response.status_code}")
+            return False
+    
+    logger.info("Bars API tests completed successfully")
+    return True
+
+def test_partitioning():
+    """Test creating, expiring and converting realtime_data partitions."""
+    logger.info("Testing realtime_data partitioning...")
+    
+    if not get_db_url().startswith("postgresql"):
+        logger.warning("Partitioning needs PostgreSQL, skipping partitioning tests")
+        return True
+    
+    suffix = datetime.now().strftime('%H%M%S%f')
+    schemas = [f"partition_test_{suffix}", f"partition_convert_{suffix}"]
+    admin = create_engine(get_db_url())
+    with admin.begin() as conn:
+        for schema in schemas:
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+    
+    def schema_engine(schema):
+        return create_engine(get_db_url(), connect_args={"options": f"-csearch_path={schema}"})
+    
+    def insert_ticks(conn, timestamps):
+        stock_id = conn.execute(text("SELECT id FROM stocks WHERE symbol = 'PART'")).scalar()
+        if stock_id is None:
+            stock_id = conn.execute(text("INSERT INTO stocks (symbol) VALUES ('PART') RETURNING id")).scalar()
+        for timestamp in timestamps:
+            conn.execute(text("INSERT INTO realtime_data (stock_id, timestamp, price) VALUES (:id, :ts, 1)"), {"id": stock_id, "ts": timestamp})
+    
+    def count(conn, table):
+        return conn.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+    
+    engines = []
+    try:
+        engine = schema_engine(schemas[0])
+        engines.append(engine)
+        now = datetime(2024, 5, 15)
+        
+        if not create_partitioned_table(engine):
+            logger.error("realtime_data should be created partitioned")
+            return False
+        
+        # Ticks of periods without partitions yet land in the default partition
+        with engine.begin() as conn:
+            insert_ticks(conn, [datetime(2022, 3, 10), datetime(2024, 5, 1), datetime(2024, 6, 2, 12)])
+            created = ensure_partitions(conn, "month", premake=1, now=now)
+        
+        with engine.connect() as conn:
+            if created != ["realtime_data_p20240501", "realtime_data_p20240601"]:
+                logger.error(f"Unexpected partitions created: {created}")
+                return False
+            if [count(conn, table) for table in (DEFAULT_PARTITION, *created, "realtime_data")] != [1, 1, 1, 3]:
+                logger.error("Ticks in the range of new partitions should move out of the default partition")
+                return False
+        
+        with engine.begin() as conn:
+            ensure_partitions(conn, "month", premake=0, now=datetime(2022, 1, 15))
+            insert_ticks(conn, [datetime(2022, 1, 20)])
+            dropped = apply_retention(conn, 30, now=now)
+        
+        with engine.connect() as conn:
+            if dropped != ["realtime_data_p20220101"] or count(conn, DEFAULT_PARTITION) != 0 or count(conn, "realtime_data") != 2:
+                logger.error(f"Retention should drop old partitions and expire old default rows: {dropped}")
+                return False
+        
+        # A partition another process creates after the listing counts as created
+        results = []
+        with engine.begin() as conn:
+            ensure_partitions(conn, "month", premake=0, now=datetime(2024, 8, 15))
+            
+            def concurrent_maintenance():
+                try:
+                    with engine.begin() as other:
+                        results.append(ensure_partitions(other, "month", premake=0, now=datetime(2024, 8, 15)))
+                except Exception as e:
+                    results.append(e)
+            
+            thread = threading.Thread(target=concurrent_maintenance)
+            thread.start()
+            time.sleep(0.5)
+        thread.join()
+        
+        if results != [[]]:
+            logger.error(f"A partition created concurrently should not fail maintenance: {results}")
+            return False
+        
+        # A failure creating partitions does not stop retention
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE realtime_data_p20240701 (id integer)"))
+            insert_ticks(conn, [datetime(2022, 3, 11)])
+        
+        manager = PartitionManager(engine, interval="month", premake=2, retention_days=30)
+        if manager.run_maintenance(now=now) is not None:
+            logger.error("Maintenance should report the failure to create a partition")
+            return False
+        with engine.connect() as conn:
+            if count(conn, DEFAULT_PARTITION) != 0:
+                logger.error("Retention should run after a failure to create partitions")
+                return False
+        
+        # An existing regular table is converted without copying its rows
+        engine = schema_engine(schemas[1])
+        engines.append(engine)
+        Base.metadata.create_all(engine, tables=[Stock.__table__, RealtimeData.__table__])
+        with engine.begin() as conn:
+            insert_ticks(conn, [datetime(2022, 3, 10), datetime(2022, 4, 10)])
+        
+        if not convert_realtime_table(engine, "month"):
+            logger.error("Converting realtime_data failed")
+            return False
+        
+        with engine.begin() as conn:
+            partitions = list_partitions(conn)
+            if not is_partitioned(conn) or [name for name, _, _ in partitions] != ["realtime_data_legacy"] or partitions[0][1] is not None:
+                logger.error(f"realtime_data should be partitioned with the old table as its first partition: {partitions}")
+                return False
+            
+            insert_ticks(conn, [datetime.now()])
+            ids = conn.execute(text("SELECT id FROM realtime_data ORDER BY id")).scalars().all()
+            if ids != [1, 2, 3] or count(conn, "realtime_data_legacy") != 2:
+                logger.error(f"Converted table should keep its rows and id sequence: {ids}")
+                return False
+        
+        if not convert_realtime_table(engine, "month"):
+            logger.error("Converting a partitioned table again should do nothing")
+            return False
+    finally:
+        for engine in engines:
+            engine.dispose()
+        with admin.begin() as conn:
+            for schema in schemas:
+                conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+    
+    logger.info("Partitioning tests completed successfully")
+    return True
+
+def test_read_replicas():
+    """Test routing reads to read replicas with fallback to the primary."""
+    logger.info("Testing read replicas...")
+    
+    primary = Repository(replicas=[])
+    symbol = f"REPLICA_{datetime.now().strftime('%H%M%S%f')}"
+    primary.store_realtime_data({"symbol": symbol, "timestamp": "2023-01-03T12:00:00", "price": 1.0})
+    stock_id = primary.get_stock_id(symbol)
+    
+    # Two SQLite replicas with diverging quotes show where each read went
+    directory = tempfile.mkdtemp()
+    urls = [f"sqlite:///{os.path.join(directory, f'replica_{i}.db')}" for i in range(2)]
+    for i, url in enumerate(urls):
+        engine = create_engine(url)
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(Stock.__table__.insert(), {"id": stock_id, "symbol": symbol})
+            conn.execute(LatestQuote.__table__.insert(), {"stock_id": stock_id, "timestamp": datetime(2023, 1, 3, 12), "price": 10.0 + i})
+        engine.dispose()
+    unreachable = f"sqlite:///{os.path.join(directory, 'missing', 'replica.db')}"
+    
+    try:
+        repo = Repository(replicas=urls + [unreachable])
+        
+        prices = [repo.get_realtime_data(symbol).get("price") for _ in range(6)]
+        if set(prices) != {10.0, 11.0}:
+            logger.error(f"Reads should alternate between the healthy replicas: {prices}")
+            return False
+        
+        repo.store_realtime_data({"symbol": symbol, "timestamp": "2023-01-03T12:00:01", "price": 2.0})
+        if primary.get_realtime_data(symbol).get("price") != 2.0:
+            logger.error("Writes should go to the primary")
+            return False
+        
+        stats = repo.get_pool_stats()["read_replicas"]
+        if [replica["healthy"] for replica in stats["replicas"]] != [True, True, False] or stats["fallbacks"] != 0:
+            logger.error(f"Unexpected replica stats: {stats}")
+            return False
+        
+        fallback = Repository(replicas=[unreachable])
+        if fallback.get_realtime_data(symbol).get("price") != 2.0 or fallback.get_pool_stats()["read_replicas"]["fallbacks"] != 1:
+            logger.error("Reads should fall back to the primary without a healthy replica")
+            return False
+        
+        repo.close()
+        fallback.close()
+    finally:
+        shutil.rmtree(directory)
+    
+    logger.info("Read replicas tests completed successfully")
+    return True
+
+def test_tick_archive():
+    """Test archiving real-time data into compressed blobs."""
+    logger.info("Testing tick archive...")
+    
+    repo = Repository()
+    symbol = f"ARCHIVE_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    
+    repo.store_realtime_batch([
+        {
+            "symbol": symbol,
+            "timestamp": (datetime(2022, 3, 1 + day) + timedelta(hours=12, seconds=10 * i)).isoformat(),
+            "price": 100 + day + (i % 7) * 0.01,
+            "volume": None if i % 11 == 0 else 1000 * i,
+            "bid": 99.99 + day,
+            "sentiment": ["positive", "neutral", None][i % 3]
+        }
+        for day in range(3) for i in range(100)
+    ])
+    ticks = list(repo.iter_ticks(symbol))
+    
+    result = repo.archive_realtime_data(before=datetime(2022, 3, 3), symbols=[symbol])
+    if not result or (result["days"], result["ticks"]) != (2, 200):
+        logger.error(f"Unexpected archive result: {result}")
+        return False
+    
+    stock_id = repo.get_stock_id(symbol)
+    with repo.engine.connect() as conn:
+        hot = conn.execute(text("SELECT count(*) FROM realtime_data WHERE stock_id = :id"), {"id": stock_id}).scalar()
+    if hot != 100:
+        logger.error(f"Archived ticks should leave realtime_data, {hot} rows left")
+        return False
+    
+    if list(repo.iter_ticks(symbol)) != ticks:
+        logger.error("Archived ticks should read back unchanged")
+        return False
+    
+    start, end = datetime(2022, 3, 1, 12, 15), datetime(2022, 3, 3, 12, 1)
+    expected = [tick for tick in ticks if start.isoformat() <= tick["timestamp"] < end.isoformat()]
+    if list(repo.iter_ticks(symbol, start=start, end=end)) != expected:
+        logger.error("Unexpected archived ticks in a time range")
+        return False
+    
+    quotes = repo.get_quotes_asof([
+        (symbol, datetime(2022, 3, 2, 12, 0, 15)),
+        (symbol, datetime(2022, 3, 3)),
+        (symbol, datetime(2022, 3, 3, 12, 0, 5)),
+        (symbol, datetime(2022, 3, 1))
+    ])
+    timestamps = [quote and quote["timestamp"] for quote in quotes]
+    if timestamps != ["2022-03-02T12:00:10", "2022-03-02T12:16:30", "2022-03-03T12:00:00", None] or quotes[0] != ticks[101]:
+        logger.error(f"Unexpected as-of quotes with archived ticks: {quotes}")
+        return False
+    
+    # A late tick of an archived day is merged into its blob
+    repo.store_realtime_batch([{"symbol": symbol, "timestamp": "2022-03-01T23:59:59", "price": 42.0}])
+    result = repo.archive_realtime_data(before=datetime(2022, 3, 3), symbols=[symbol])
+    timestamps = [tick["timestamp"] for tick in repo.iter_ticks(symbol)]
+    if result["ticks"] != 1 or len(timestamps) != 301 or timestamps[100] != "2022-03-01T23:59:59" or timestamps != sorted(timestamps):
+        logger.error(f"Unexpected ticks after archiving a late tick: {result}")
+        return False
+    
+    # Blobs of the first, bit-packed format still read back
+    legacy = bytes.fromhex(
+        "5441310000004f0005d926e78830007b22636f756e74223a20332c2022756e6974223a20313030303030302c20227461626c6573223a207b"
+        "2273656e74696d656e74223a205b226e65757472616c222c2022706f736974697665225d7d7d0000000000000000405900000000000014"
+        "058ff5c28f5c28f20000000000000001603e28a3d70a3d71108ef2f91e4791e4479f4300"
+    )
+    expected = [
+        {
+            "timestamp": datetime(2022, 3, 1, 12, 0, second), "price": 100 + second / 100, "change": None, "change_percent": None,
+            "volume": None if second == 1 else 1000 * second, "market_cap": None, "bid": 99.99, "ask": None,
+            "shares_outstanding": None, "sentiment": ["neutral", None, "positive"][second]
+        }
+        for second in range(3)
+    ]
+    if decode_ticks(legacy) != expected or decode_ticks(encode_ticks(expected)) != expected:
+        logger.error(f"Unexpected decoded legacy ticks: {decode_ticks(legacy)}")
+        return False
+    
+    logger.info("Tick archive tests completed successfully")
+    return True
+
+def test_quotes_asof():
+    """Test point-in-time quote lookups."""
+    logger.info("Testing as-of quotes...")
+    
+    repo = Repository()
+    suffix = datetime.now().strftime('%H%M%S%f')
+    symbols = [f"ASOF_A_{suffix}", f"ASOF_B_{suffix}"]
+    
+    repo.store_realtime_batch([
+        {"symbol": symbols[i % 2], "timestamp": f"2023-01-03T14:31:{i * 5:02d}", "price": 100.0 + i}
+        for i in range(10)
+    ])
+    
+    if repo.get_quote_asof(symbols[0], datetime(2023, 1, 3, 14, 31, 17)).get("price") != 102.0:
+        logger.error("As-of lookup should return the last quote at or before the time")
+        return False
+    if repo.get_quote_asof(symbols[0], datetime(2023, 1, 3, 14, 31, 20)).get("price") != 104.0:
+        logger.error("As-of lookup should include a quote at exactly the time")
+        return False
+    
+    queries = [
+        (symbols[1], datetime(2023, 1, 3, 14, 31, 4)),
+        (symbols[0], datetime(2023, 1, 3, 14, 30, 59)),
+        ("UNKNOWN_SYMBOL", datetime(2023, 1, 3, 14, 31)),
+        (symbols[1], datetime(2023, 1, 3, 15, 0)),
+        (symbols[0], datetime(2023, 1, 3, 14, 31, 0))
+    ]
+    prices = [quote and quote["price"] for quote in repo.get_quotes_asof(queries)]
+    if prices != [None, None, None, 109.0, 100.0]:
+        logger.error(f"Unexpected batch as-of prices: {prices}")
+        return False
+    
+    logger.info("As-of quotes tests completed successfully")
+    return True
+
+def test_lake_export():
+    """Test incremental exports to the Parquet data lake."""
+    logger.info("Testing data lake export...")
+    
+    try:
+        import pyarrow.dataset as ds
+    except ImportError:
+        logger.warning("pyarrow is not installed, skipping data lake export tests")
+        return True
+    
+    repo = Repository()
+    symbol = f"LAKE_TEST_{datetime.now().strftime('%H%M%S%f')}"
+    directory = tempfile.mkdtemp()
+    
+    def read(table):
+        dataset = ds.dataset(os.path.join(directory, table), format="parquet", partitioning="hive")
+        return dataset.to_table(filter=ds.field("symbol") == symbol).to_pylist()
+    
+    try:
+        repo.bulk_upsert_historical_data(symbol, [
+            {"date": f"2023-01-{day:02d}T00:00:00", "open": day, "high": day, "low": day, "close": day, "volume": day}
+            for day in range(30, 32)
+        ] + [{"date": "2023-02-01T00:00:00", "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1}])
+        repo.store_realtime_data({"symbol": symbol, "timestamp": "2023-02-01T12:00:00", "price": 1.0, "sentiment": "neutral"})
+        
+        if export_lake(repo, directory, lag_s=0) is None:
+            logger.error("Data lake export failed")
+            return False
+        
+        if not os.path.isdir(os.path.join(directory, "historical_data", f"symbol={symbol}", "year=2023", "month=2")):
+            logger.error("Historical data should be partitioned by symbol, year and month")
+            return False
+        
+        historical, realtime = read("historical_data"), read("realtime_data")
+        if [row["close"] for row in historical] != [30.0, 31.0, 1.0] or [row["sentiment"] for row in realtime] != ["neutral"]:
+            logger.error(f"Unexpected exported data: {historical} {realtime}")
+            return False
+        
+        # A new day and a correction of an exported one
+        repo.bulk_upsert_historical_data(symbol, [
+            {"date": "2023-02-02T00:00:00", "open": 2, "high": 2, "low": 2, "close": 2, "volume": 2},
+            {"date": "2023-01-31T00:00:00", "open": 31, "high": 31, "low": 31, "close": 42, "volume": 31}
+        ])
+        
+        # The day after the correction has a new daily return, so it is exported again too
+        result = export_lake(repo, directory, lag_s=0)
+        if not result or result["historical_data"]["rows"] != 3 or result["realtime_data"]["rows"] != 0:
+            logger.error(f"Only rows written since the last export should be exported: {result}")
+            return False
+        
+        newest = {}
+        for row in sorted(read("historical_data"), key=lambda row: row["updated_at"]):
+            newest[row["date"]] = row["close"]
+        if newest != {datetime(2023, 1, 30): 30.0, datetime(2023, 1, 31): 42.0, datetime(2023, 2, 1): 1.0, datetime(2023, 2, 2): 2.0}:
+            logger.error(f"Unexpected newest exported rows after an incremental export: {newest}")
+            return False
+        
+        # A volume correction leaves the indicators of the later days unchanged
+        repo.bulk_upsert_historical_data(symbol, [
+            {"date": "2023-01-30T00:00:00", "open": 30, "high": 30, "low": 30, "close": 30, "volume": 60}
+        ])
+        result = export_lake(repo, directory, lag_s=0)
+        if not result or result["historical_data"]["rows"] != 1:
+            logger.error(f"Rows with unchanged indicators should not be exported again: {result}")
+            return False
+    finally:
+        shutil.rmtree(directory)
+    
+    logger.info("Data lake export tests completed successfully")
+    return True
+
+def explain_index_scans(session, query):
+    """
+    Get the index scans PostgreSQL plans for a query.
+    
+    Sequential and bitmap scans are disabled for the check so that tiny
+    test tables still show whether an index can serve the query in order.
+    """
+    statement = query.statement.compile(session.bind, compile_kwargs={"literal_binds": True})
+    
+    session.execute(text("SET LOCAL enable_seqscan = off"))
+    session.execute(text("SET LOCAL enable_bitmapscan = off"))
+    plan = session.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()
+    session.rollback()
+    
+    scans = []
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] in ("Index Scan", "Index Only Scan"):
+            scans.append(node["Index Name"])
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+def test_query_plans():
+    """Test that the hot read queries are served by index scans."""
+    logger.info("Testing query plans...")
+    
+    session = init_db()
+    
+    if not session:
+        logger.error("Failed to initialize database")
+        return False
+    
+    try:
+        if session.bind.dialect.name != "postgresql":
+            logger.warning("Query plan tests require PostgreSQL - skipping")
+            return True
+        
+        queries = {
+            "uq_historical_data_stock_id_date": session.query(HistoricalData).filter_by(stock_id=1).order_by(desc(HistoricalData.date)).limit(100),
+            "ix_realtime_data_stock_id_timestamp": session.query(RealtimeData).filter_by(stock_id=1).order_by(desc(RealtimeData.timestamp)).limit(1)
+        }
+        
+        for index_name, query in queries.items():
+            # Partitioned tables are scanned through the partitions' copies of the index
+            expected = {index_name} | set(session.execute(
+                text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:name)"),
+                {"name": index_name}
+            ).scalars())
+            
+            scans = explain_index_scans(session, query)
+            if not scans or not set(scans) <= expected:
+                logger.error(f"Expected an index scan on {index_name}, got {scans}")
+                return False
+        
+        logger.info("Query plan tests completed successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Error testing query plans: {e}")
+        return False
+    finally:
+        session.close()
+
 def run_tests():
     """Run all tests."""
     logger.info("Starting Data Storage Service tests...")
@@ -177,6 +1463,102 @@ def run_tests():
         logger.error("Repository tests failed")
         return False
     
+    if not test_bulk_upsert():
+        logger.error("Bulk upsert tests failed")
+        return False
+    
+    if not test_bulk_import():
+        logger.error("Bulk import tests failed")
+        return False
+    
+    if not test_historical_pagination():
+        logger.error("Historical pagination tests failed")
+        return False
+    
+    if not test_computed_indicators():
+        logger.error("Computed indicators tests failed")
+        return False
+    
+    if not test_historical_multi():
+        logger.error("Multi-symbol historical tests failed")
+        return False
+    
+    if not test_coverage():
+        logger.error("Coverage tests failed")
+        return False
+    
+    if not test_historical_streaming():
+        logger.error("Historical streaming tests failed")
+        return False
+    
+    if not test_historical_table():
+        logger.error("Historical table tests failed")
+        return False
+    
+    if not test_stock_registry():
+        logger.error("Stock registry tests failed")
+        return False
+    
+    if not test_connection_pool():
+        logger.error("Connection pool tests failed")
+        return False
+    
+    if not test_stocks():
+        logger.error("Stocks tests failed")
+        return False
+    
+    if not test_response_cache():
+        logger.error("Response cache tests failed")
+        return False
+    
+    if not test_realtime_batch():
+        logger.error("Real-time batch tests failed")
+        return False
+    
+    if not test_write_behind():
+        logger.error("Write-behind tests failed")
+        return False
+    
+    if not test_latest_quotes():
+        logger.error("Latest quotes tests failed")
+        return False
+    
+    if not test_bars():
+        logger.error("Bars tests failed")
+        return False
+    
+    if not test_bars_archived():
+        logger.error("Bars of archived days tests failed")
+        return False
+    
+    if not test_bars_api():
+        logger.error("Bars API tests failed")
+        return False
+    
+    if not test_partitioning():
+        logger.error("Partitioning tests failed")
+        return False
+    
+    if not test_tick_archive():
+        logger.error("Tick archive tests failed")
+        return False
+    
+    if not test_quotes_asof():
+        logger.error("As-of quotes tests failed")
+        return False
+    
+    if not test_lake_export():
+        logger.error("Data lake export tests failed")
+        return False
+    
+    if not test_read_replicas():
+        logger.error("Read replicas tests failed")
+        return False
+    
+    if not test_query_plans():
+        logger.error("Query plan tests failed")
+        return False
+    
     logger.info("All tests completed successfully")
     return True
 
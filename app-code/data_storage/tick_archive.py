@@ -0,0 +1,311 @@
+import sys
+import os
+import json
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger
+
+
+logger = get_logger("data_storage_tick_archive")
+
+# Format version written at the start of every blob. TA1 blobs, written
+# bit by bit, are still read.
+ARCHIVE_FORMAT = b"TA2"
+LEGACY_FORMAT = b"TA1"
+
+# Compressed columns of realtime_data, in blob order after the timestamp.
+FLOAT_COLUMNS = ["price", "change", "change_percent", "market_cap", "bid", "ask", "shares_outstanding"]
+INT_COLUMNS = ["volume"]
+STRING_COLUMNS = ["sentiment"]
+
+# Columns of decoded ticks, in realtime_data order
+TICK_COLUMNS = ["timestamp", "price", "change", "change_percent", "volume", "market_cap", "bid", "ask", "shares_outstanding", "sentiment"]
+
+# Columns that are never NULL and so carry no presence bits
+REQUIRED_COLUMNS = {"timestamp", "price"}
+
+# Decimal places tried for storing a float column as scaled integers
+MAX_DECIMALS = 8
+
+# Value widths of the delta-of-delta buckets of TA1 blobs after the zero
+# one. Bucket i is marked by i + 1 one bits and a zero bit; five one bits
+# mark 64 bits.
+DOD_WIDTHS = [7, 9, 12, 32]
+
+EPOCH = datetime(1970, 1, 1)
+
+def _smallest_int(values):
+    """Cast integers to the narrowest signed type that holds them."""
+    import numpy as np
+    
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if not len(values) or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    return values.astype(np.int64)
+
+def _encode_deltas(values):
+    """Encode int64 values as zlib-compressed deltas of the narrowest type."""
+    import numpy as np
+    
+    deltas = _smallest_int(np.diff(values, prepend=np.int64(0)))
+    return {"dtype": deltas.dtype.str}, zlib.compress(deltas.tobytes(), 9)
+
+def _decode_deltas(meta, data):
+    """Decode values written by _encode_deltas."""
+    import numpy as np
+    
+    return np.cumsum(np.frombuffer(zlib.decompress(data), dtype=meta["dtype"]), dtype=np.int64)
+
+def _encode_floats(values):
+    """
+    Encode float64 values.
+    
+    Values with at most MAX_DECIMALS decimal places, such as prices, are
+    stored as deltas of the scaled integers; any others as the XOR of each
+    value's bits with the previous value's, so unchanged values are zero
+    bytes. Both are zlib-compressed.
+    """
+    import numpy as np
+    
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        scaled = np.round(values * scale)
+        if np.all(np.abs(scaled) < 2 ** 53) and np.array_equal(scaled / scale, values):
+            meta, data = _encode_deltas(scaled.astype(np.int64))
+            return {"decimals": decimals, **meta}, data
+    
+    bits = values.view(np.uint64)
+    return {"decimals": None}, zlib.compress((bits ^ np.concatenate(([np.uint64(0)], bits[:-1]))).tobytes(), 9)
+
+def _decode_floats(meta, data):
+    """Decode values written by _encode_floats."""
+    import numpy as np
+    
+    if meta["decimals"] is not None:
+        return _decode_deltas(meta, data) / 10.0 ** meta["decimals"]
+    return np.bitwise_xor.accumulate(np.frombuffer(zlib.decompress(data), dtype=np.uint64)).view(np.float64)
+
+def encode_ticks(rows):
+    """
+    Compress the ticks of one stock into a blob.
+    
+    Each column is stored as one compressed stream, so reading decodes
+    whole columns with numpy instead of value by value. Timestamps and
+    integers are delta encoded, so ticks at a steady rate compress to
+    almost nothing; see _encode_floats for floats. Strings are stored as
+    indexes into a per-blob table and NULLs as a presence bitmap.
+    
+    Args:
+        rows (list): Ticks with timestamp and the QUOTE_COLUMNS values,
+            sorted by timestamp
+    
+    Returns:
+        bytes: Compressed ticks
+    """
+    import numpy as np
+    
+    columns = []
+    streams = []
+    
+    def add(name, meta, data, present=None):
+        meta = {"name": name, **meta, "length": len(data)}
+        streams.append(data)
+        if present is not None:
+            meta["present_length"] = len(present)
+            streams.append(present)
+        columns.append(meta)
+    
+    times = np.array([row["timestamp"] for row in rows], dtype="datetime64[us]").astype(np.int64)
+    add("timestamp", *_encode_deltas(times))
+    
+    for name in FLOAT_COLUMNS + INT_COLUMNS:
+        values = [row[name] for row in rows]
+        present = None
+        if name not in REQUIRED_COLUMNS and None in values:
+            mask = np.array([value is not None for value in values])
+            present = zlib.compress(np.packbits(mask).tobytes(), 9)
+            values = [value for value in values if value is not None]
+        if name in INT_COLUMNS:
+            add(name, *_encode_deltas(np.array(values, dtype=np.int64)), present)
+        else:
+            add(name, *_encode_floats(np.array(values, dtype=np.float64)), present)
+    
+    tables = {}
+    for name in STRING_COLUMNS:
+        tables[name] = sorted({row[name] for row in rows} - {None})
+        indexes = {value: index for index, value in enumerate(tables[name], 1)}
+        codes = np.array([indexes.get(row[name], 0) for row in rows], dtype=np.uint8 if len(tables[name]) < 256 else np.uint32)
+        add(name, {"dtype": codes.dtype.str}, zlib.compress(codes.tobytes(), 9))
+    
+    header = json.dumps({"count": len(rows), "columns": columns, "tables": tables}).encode()
+    return ARCHIVE_FORMAT + struct.pack(">I", len(header)) + header + b"".join(streams)
+
+def decode_ticks(blob):
+    """
+    Decompress ticks written by encode_ticks.
+    
+    Args:
+        blob (bytes): Compressed ticks
+    
+    Returns:
+        list: Ticks with timestamp and the QUOTE_COLUMNS values, sorted by timestamp
+    """
+    import numpy as np
+    
+    if blob[:len(LEGACY_FORMAT)] == LEGACY_FORMAT:
+        return _decode_legacy_ticks(blob)
+    if blob[:len(ARCHIVE_FORMAT)] != ARCHIVE_FORMAT:
+        raise ValueError("Unknown tick archive format")
+    
+    offset = len(ARCHIVE_FORMAT)
+    (header_length,) = struct.unpack_from(">I", blob, offset)
+    offset += struct.calcsize(">I")
+    header = json.loads(blob[offset:offset + header_length])
+    offset += header_length
+    count = header["count"]
+    
+    columns = {}
+    for meta in header["columns"]:
+        data = blob[offset:offset + meta["length"]]
+        offset += meta["length"]
+        
+        name = meta["name"]
+        if name == "timestamp":
+            column = _decode_deltas(meta, data).astype("datetime64[us]").tolist()
+        elif name in STRING_COLUMNS:
+            table = [None] + header["tables"][name]
+            column = [table[code] for code in np.frombuffer(zlib.decompress(data), dtype=meta["dtype"]).tolist()]
+        else:
+            decoded = _decode_deltas(meta, data) if name in INT_COLUMNS else _decode_floats(meta, data)
+            if "present_length" in meta:
+                mask = np.unpackbits(np.frombuffer(zlib.decompress(blob[offset:offset + meta["present_length"]]), dtype=np.uint8), count=count)
+                offset += meta["present_length"]
+                full = np.full(count, None, dtype=object)
+                full[mask.astype(bool)] = decoded
+                decoded = full
+            column = decoded.tolist()
+        
+        columns[name] = column
+    
+    return [dict(zip(TICK_COLUMNS, row)) for row in zip(*(columns[name] for name in TICK_COLUMNS))]
+
+class BitReader:
+    """Reads values of any bit width from a byte buffer."""
+    
+    def __init__(self, data, offset=0):
+        self._data = data
+        self._position = offset
+        self._value = 0
+        self._bits = 0
+    
+    def read(self, bits):
+        """Read a non-negative value of the given bit width."""
+        while self._bits < bits:
+            self._value = (self._value << 8) | self._data[self._position]
+            self._position += 1
+            self._bits += 8
+        self._bits -= bits
+        value = self._value >> self._bits
+        self._value &= (1 << self._bits) - 1
+        return value
+
+def _read_dod(reader):
+    """Read a delta of deltas of a TA1 blob."""
+    ones = 0
+    while ones < len(DOD_WIDTHS) + 1 and reader.read(1):
+        ones += 1
+    if ones == 0:
+        return 0
+    
+    bits = DOD_WIDTHS[ones - 1] if ones <= len(DOD_WIDTHS) else 64
+    value = reader.read(bits)
+    return value - (1 << bits) if value >= 1 << (bits - 1) else value
+
+class _IntDecoder:
+    """Delta-of-delta decoder of an integer column of a TA1 blob."""
+    
+    def __init__(self):
+        self.previous = None
+        self.delta = 0
+    
+    def read(self, reader):
+        if self.previous is None:
+            value = reader.read(64)
+            value = value - (1 << 64) if value >= 1 << 63 else value
+        else:
+            self.delta += _read_dod(reader)
+            value = self.previous + self.delta
+        self.previous = value
+        return value
+
+class _FloatDecoder:
+    """Gorilla XOR decoder of a float column of a TA1 blob."""
+    
+    def __init__(self):
+        self.previous = None
+        self.leading = None
+        self.trailing = None
+    
+    def read(self, reader):
+        if self.previous is None:
+            self.previous = reader.read(64)
+        elif reader.read(1):
+            if reader.read(1):
+                self.leading = reader.read(5)
+                self.trailing = 64 - self.leading - (reader.read(6) or 64)
+            self.previous ^= reader.read(64 - self.leading - self.trailing) << self.trailing
+        return struct.unpack(">d", struct.pack(">Q", self.previous))[0]
+
+class _StringDecoder:
+    """Decoder of a string column of a TA1 blob, stored as indexes into a table."""
+    
+    def __init__(self, table):
+        self.table = table
+        self.bits = max(len(table) - 1, 1).bit_length()
+        self.previous = None
+    
+    def read(self, reader):
+        if reader.read(1):
+            self.previous = self.table[reader.read(self.bits)]
+        return self.previous
+
+def _decode_legacy_ticks(blob):
+    """Decompress ticks of a TA1 blob, encoded value by value into a bit stream."""
+    offset = len(LEGACY_FORMAT)
+    header_length, first = struct.unpack_from(">Iq", blob, offset)
+    offset += struct.calcsize(">Iq")
+    header = json.loads(blob[offset:offset + header_length])
+    reader = BitReader(blob, offset + header_length)
+    
+    decoders = {"timestamp": _IntDecoder()}
+    decoders.update({column: _FloatDecoder() for column in FLOAT_COLUMNS})
+    decoders.update({column: _IntDecoder() for column in INT_COLUMNS})
+    decoders.update({column: _StringDecoder([None] + header["tables"][column]) for column in STRING_COLUMNS})
+    
+    start = EPOCH + timedelta(microseconds=first)
+    rows = []
+    for _ in range(header["count"]):
+        row = {"timestamp": start + timedelta(microseconds=decoders["timestamp"].read(reader) * header["unit"])}
+        for column in FLOAT_COLUMNS + INT_COLUMNS:
+            if column not in REQUIRED_COLUMNS and not reader.read(1):
+                row[column] = None
+                continue
+            row[column] = decoders[column].read(reader)
+        for column in STRING_COLUMNS:
+            row[column] = decoders[column].read(reader)
+        rows.append(row)
+    
+    return rows
+
+if __name__ == "__main__":
+    # Archive the ticks of days past the configured age, e.g. from cron
+    from repository import Repository
+    
+    repo = Repository()
+    result = repo.archive_realtime_data()
+    repo.close()
+    sys.exit(0 if result is not None else 1)
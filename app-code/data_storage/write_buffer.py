@@ -0,0 +1,195 @@
+import sys
+import os
+import time
+import threading
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import get_logger
+
+
+logger = get_logger("data_storage_write_buffer")
+
+class WriteBehindBuffer:
+    """Bounded in-memory buffer flushed in groups by a background thread."""
+    
+    def __init__(self, flush, flush_interval_ms=200, flush_rows=1000, max_rows=100000, max_retries=5,
+                 retry_backoff_ms=100, name="write_buffer"):
+        """
+        Initialize the buffer and start its flush thread.
+        
+        Args:
+            flush (callable): Writes a list of rows in one transaction
+            flush_interval_ms (int, optional): Maximum time rows wait before a flush
+            flush_rows (int, optional): Number of buffered rows that triggers a flush
+            max_rows (int, optional): Buffer capacity; rows beyond it are dropped
+            max_retries (int, optional): Times a group that failed to flush is
+                put back at the head of the buffer before it is dropped
+            retry_backoff_ms (int, optional): Wait before the first retry,
+                doubled on every further consecutive failure
+            name (str, optional): Name of the flush thread
+        """
+        self.logger = logger
+        self.flush = flush
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_rows = flush_rows
+        self.max_rows = max_rows
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000.0
+        
+        self._rows = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        # Consecutive failed flushes and rows dropped since they were last logged
+        self._failures = 0
+        self._unlogged_drops = 0
+        
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.retried = 0
+        self.flushes = 0
+        self.last_flush_ms = None
+        self.max_flush_ms = None
+        self._total_flush_ms = 0.0
+        
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+    
+    def put(self, row):
+        """
+        Add a row to the buffer.
+        
+        Args:
+            row: Row to write on the next flush
+        
+        Returns:
+            bool: True if buffered, False if dropped because the buffer is full or closed
+        """
+        with self._condition:
+            if self._closed or len(self._rows) >= self.max_rows:
+                self.dropped += 1
+                self._unlogged_drops += 1
+                return False
+            
+            self._rows.append(row)
+            self.enqueued += 1
+            
+            if len(self._rows) >= self.flush_rows:
+                self._condition.notify()
+            return True
+    
+    def _take(self):
+        """Remove and return up to flush_rows buffered rows."""
+        count = min(len(self._rows), self.flush_rows)
+        return [self._rows.popleft() for _ in range(count)]
+    
+    def _write(self, rows):
+        """
+        Write one group of rows and record flush statistics.
+        
+        A group that fails to flush goes back to the head of the buffer so
+        that it is retried before newer rows, as far as the buffer has room
+        for it. After max_retries consecutive failures it is dropped.
+        
+        Returns:
+            int: Number of consecutive failed flushes, 0 after a success
+        """
+        start = time.perf_counter()
+        try:
+            self.flush(rows)
+            succeeded = True
+        except Exception as e:
+            self.logger.error(f"Error flushing {len(rows)} buffered rows: {e}")
+            succeeded = False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        lost, reason = 0, None
+        with self._condition:
+            self.flushes += 1
+            if succeeded:
+                self.flushed += len(rows)
+                self._failures = 0
+            elif self._failures < self.max_retries:
+                self._failures += 1
+                # Rows that no longer fit are the oldest of the group, so the
+                # buffer stays a contiguous run of the newest rows
+                room = max(self.max_rows - len(self._rows), 0)
+                requeued = rows[max(len(rows) - room, 0):]
+                self._rows.extendleft(reversed(requeued))
+                self.retried += len(requeued)
+                lost, reason = len(rows) - len(requeued), "the buffer had no room to retry them"
+            else:
+                self._failures = 0
+                lost, reason = len(rows), f"{self.max_retries + 1} failed flushes"
+            self.failed += lost
+            failures = self._failures
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms or 0.0, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+        
+        if lost:
+            self.logger.error(f"Dropped {lost} buffered rows that failed to flush: {reason}")
+        return failures
+    
+    def _run(self):
+        """Flush buffered rows every flush interval or once flush_rows are buffered."""
+        failures = 0
+        while True:
+            if failures:
+                time.sleep(self.retry_backoff * 2 ** (failures - 1))
+            
+            with self._condition:
+                if not failures and not self._closed and len(self._rows) < self.flush_rows:
+                    self._condition.wait(self.flush_interval)
+                
+                rows = self._take()
+                closed = self._closed
+                dropped, self._unlogged_drops = self._unlogged_drops, 0
+            
+            if dropped:
+                self.logger.error(f"Dropped {dropped} rows because the write-behind buffer was full")
+            
+            if rows:
+                failures = self._write(rows)
+            elif closed:
+                return
+    
+    def close(self, timeout=None):
+        """
+        Stop accepting rows and flush everything that is still buffered.
+        
+        Args:
+            timeout (float, optional): Seconds to wait for the final flush
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        
+        self._thread.join(timeout)
+        self.logger.info(f"Write-behind buffer closed after flushing {self.flushed} rows")
+    
+    def get_stats(self):
+        """
+        Get buffer statistics.
+        
+        Returns:
+            dict: Depth, row counters and flush latency in milliseconds
+        """
+        with self._condition:
+            return {
+                "depth": len(self._rows),
+                "max_rows": self.max_rows,
+                "enqueued": self.enqueued,
+                "flushed": self.flushed,
+                "failed": self.failed,
+                "retried": self.retried,
+                "dropped": self.dropped,
+                "flushes": self.flushes,
+                "last_flush_ms": self.last_flush_ms,
+                "max_flush_ms": self.max_flush_ms,
+                "avg_flush_ms": self._total_flush_ms / self.flushes if self.flushes else None
+            }
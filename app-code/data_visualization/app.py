@@ -27,6 +27,17 @@ STORAGE_URL = f"http://{config['db']['host']}:{config['services']['data_storage'
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 server = app.server
 
+def get_stored_symbols():
+    """Get the symbols known to the storage service."""
+    try:
+        response = requests.get(f"{STORAGE_URL}/api/v1/stocks", timeout=5)
+        response.raise_for_status()
+        return [{"symbol": stock["symbol"], "name": stock["name"] or stock["symbol"]}
+                for stock in response.json()["data"]]
+    except Exception as e:
+        logger.error(f"Error fetching stored symbols: {e}")
+        return []
+
 def get_sp500_symbols():
     try:
         sp500_url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
@@ -45,7 +56,7 @@ def get_sp500_symbols():
             {"symbol": "META", "name": "Meta Platforms Inc."}
         ]
 
-AVAILABLE_SYMBOLS = get_sp500_symbols()
+AVAILABLE_SYMBOLS = get_stored_symbols() or get_sp500_symbols()
 
 app.layout = dbc.Container([
     dbc.Row([
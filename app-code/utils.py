@@ -20,12 +20,31 @@ def load_config():
     """Load configuration from environment variables."""
     return {
         "yahoo_finance_api_key": os.getenv("YAHOO_FINANCE_API_KEY"),
+        "yahoo_finance": {
+            "base_url": os.getenv("YAHOO_FINANCE_BASE_URL", "https://query2.finance.yahoo.com"),
+            "requests_per_s": float(os.getenv("YAHOO_FINANCE_REQUESTS_PER_S", 2)),
+            "concurrency": int(os.getenv("YAHOO_FINANCE_CONCURRENCY", 4)),
+            "timeout_s": float(os.getenv("YAHOO_FINANCE_TIMEOUT_S", 10)),
+            "retries": int(os.getenv("YAHOO_FINANCE_RETRIES", 3)),
+            "backoff_s": float(os.getenv("YAHOO_FINANCE_BACKOFF_S", 0.5)),
+        },
         "db": {
             "host": os.getenv("DB_HOST", "localhost"),
             "port": int(os.getenv("DB_PORT", 5432)),
             "name": os.getenv("DB_NAME", "financial_data"),
             "user": os.getenv("DB_USER", "postgres"),
             "password": os.getenv("DB_PASSWORD", "postgres"),
+            "pool": {
+                "size": int(os.getenv("DB_POOL_SIZE", 5)),
+                "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+                "timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),
+                "pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+                "recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+            },
+            "statement_timeout_ms": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0)),
+            "replicas": [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()],
+            "replica_max_lag_s": float(os.getenv("DB_REPLICA_MAX_LAG_S", 30)),
+            "replica_check_interval_s": float(os.getenv("DB_REPLICA_CHECK_INTERVAL_S", 5)),
         },
         "rabbitmq": {
             "host": os.getenv("RABBITMQ_HOST", "localhost"),
@@ -33,6 +52,42 @@ def load_config():
             "user": os.getenv("RABBITMQ_USER", "guest"),
             "password": os.getenv("RABBITMQ_PASSWORD", "guest"),
         },
+        "storage": {
+            "write_behind": {
+                "enabled": os.getenv("STORAGE_WRITE_BEHIND", "false").lower() == "true",
+                "flush_interval_ms": int(os.getenv("STORAGE_WRITE_BEHIND_FLUSH_MS", 200)),
+                "flush_rows": int(os.getenv("STORAGE_WRITE_BEHIND_FLUSH_ROWS", 1000)),
+                "max_rows": int(os.getenv("STORAGE_WRITE_BEHIND_MAX_ROWS", 100000)),
+                "max_retries": int(os.getenv("STORAGE_WRITE_BEHIND_MAX_RETRIES", 5)),
+                "retry_backoff_ms": int(os.getenv("STORAGE_WRITE_BEHIND_RETRY_BACKOFF_MS", 100)),
+            },
+            "realtime_partitioning": {
+                "enabled": os.getenv("STORAGE_REALTIME_PARTITIONING", "false").lower() == "true",
+                "interval": os.getenv("STORAGE_REALTIME_PARTITION_INTERVAL", "month"),
+                "premake": int(os.getenv("STORAGE_REALTIME_PARTITION_PREMAKE", 3)),
+                "retention_days": int(os.getenv("STORAGE_REALTIME_RETENTION_DAYS", 0)) or None,
+                "maintenance_interval_s": int(os.getenv("STORAGE_REALTIME_PARTITION_MAINTENANCE_S", 3600)),
+            },
+            "response_cache": {
+                "enabled": os.getenv("STORAGE_RESPONSE_CACHE", "true").lower() == "true",
+                "max_entries": int(os.getenv("STORAGE_RESPONSE_CACHE_MAX_ENTRIES", 1024)),
+                "ttl_s": float(os.getenv("STORAGE_RESPONSE_CACHE_TTL_S", 60)),
+            },
+            "stocks_cache_ttl_s": int(os.getenv("STORAGE_STOCKS_CACHE_TTL_S", 60)),
+            "materialize_indicators": os.getenv("STORAGE_MATERIALIZE_INDICATORS", "true").lower() == "true",
+            "tick_archive_after_days": int(os.getenv("STORAGE_TICK_ARCHIVE_AFTER_DAYS", 7)),
+            "lake": {
+                "path": os.getenv("STORAGE_LAKE_PATH", ""),
+                "export_lag_s": int(os.getenv("STORAGE_LAKE_EXPORT_LAG_S", 60)),
+                "chunk_rows": int(os.getenv("STORAGE_LAKE_CHUNK_ROWS", 100000)),
+            },
+            "bars": {
+                "mode": os.getenv("STORAGE_BAR_ROLLUP", "write").lower(),
+                "intervals": [interval.strip() for interval in os.getenv("STORAGE_BAR_INTERVALS", "1m,5m,1h").split(",") if interval.strip()],
+                "catchup_interval_s": int(os.getenv("STORAGE_BAR_CATCHUP_S", 60)),
+                "catchup_lag_s": int(os.getenv("STORAGE_BAR_CATCHUP_LAG_S", 60)),
+            },
+        },
         "services": {
             "data_ingestion": {
                 "port": int(os.getenv("DATA_INGESTION_PORT", 5001)),